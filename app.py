@@ -1,35 +1,96 @@
 import gradio as gr
 from fastapi import FastAPI, Request as FastRequest
 from starlette.middleware.sessions import SessionMiddleware
-from authlib.integrations.starlette_client import OAuth
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, PlainTextResponse
 import uvicorn
 import os
 import json
+import asyncio
+import time
+import secrets
+import threading
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from datetime import datetime
 
 load_dotenv()
 
-from logic import socratic_agent
+from logic import aguarded_reply, aopening_message, TurnReservation, get_agent, get_llm, BUSY_MESSAGE
+from quota import QueueFull
 from langchain_core.messages import HumanMessage, AIMessage
-from vision import get_vision_tab, calculate_xp, get_xp_html
+from vision import get_vision_tab, xp_from_progress, get_xp_html
+from dashboard import get_dashboard_tab, dashboard_markdown, is_teacher
 # Database imports
-from database import save_progress, ensure_user_exists, get_user_progress
-from sandbox import execute_code_safely
+from database import (asave_progress, aload_user, aget_user_progress, migrate_progress, compact_transcripts,
+                      rebuild_class_stats, aclass_dashboard, asave_conversation, arecord_turn, aload_conversation, aadd_cell, aclear_cells, load_cells)
+from sandbox import astream_cell, areset_session, get_pool, truncate_output, SANDBOX_BUSY_MESSAGE
+from grader import agrade_run
+from curriculum import CURRICULUM, MODULE_GOALS
+from assets import CachedStaticFiles, STATIC_DIR, LAZY_VIDEO_JS, demo_video_html
+import metrics
+from metrics import timed
 
 # --- FASTAPI & OAUTH SETUP ---
-app = FastAPI()
-app.add_middleware(SessionMiddleware, secret_key=os.environ.get("OAUTH_CLIENT_SECRET", "bangalore-secret-key-123"))
-
-oauth = OAuth()
-oauth.register(
-    name='google',
-    client_id=os.environ.get('OAUTH_CLIENT_ID'),
-    client_secret=os.environ.get('OAUTH_CLIENT_SECRET'),
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_kwargs={'scope': 'openid profile email'}
-)
+# Every worker has to sign session cookies with the same key, or a student whose request lands
+# on another worker is logged out
+SESSION_SECRET = os.environ.get("SESSION_SECRET") or os.environ.get("OAUTH_CLIENT_SECRET")
+if not SESSION_SECRET:
+    SESSION_SECRET = secrets.token_urlsafe(32)
+    print("⚠️ SESSION_SECRET is not set: using a random key, so logins won't survive a restart or work across workers.")
+
+# Program output beyond this many characters reaches the tutor as its start and end only
+TUTOR_OUTPUT_CHARS = int(os.environ.get("TUTOR_OUTPUT_CHARS", 2000))
+# A program still running after this many seconds starts queueing for the tutor's reply
+TUTOR_HEADSTART_SECONDS = float(os.environ.get("TUTOR_HEADSTART_SECONDS", 0.5))
+
+# --- STARTUP ---
+# Nothing slow runs at import: the first page is served as soon as the server is up, and
+# warm_up() then builds in the background what the first tutoring turn would otherwise wait for.
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "1") != "0"
+
+def warm_up():
+    """Start the sandbox workers, compile the tutor graph, build the LLM client and compact old transcripts."""
+    start = time.perf_counter()
+    try:
+        get_pool()
+        get_agent()
+        get_llm()
+        # Transcripts of modules nobody has touched for a week are stored compressed
+        compact_transcripts()
+    except Exception as e:
+        print(f"⚠️ Warm-up stopped early, the rest loads on first use: {e}")
+        return
+    print(f"🔥 Warm-up done in {time.perf_counter() - start:.1f}s")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Older databases kept completions in a JSON blob; move them into the completions table once
+    await asyncio.to_thread(migrate_progress, MODULE_GOALS.get)
+    # Databases from before the class dashboard get its aggregates computed once
+    await asyncio.to_thread(rebuild_class_stats)
+    if STARTUP_WARMUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
+
+_oauth = None
+
+def get_oauth():
+    """The Google OAuth client, registered on the first login (authlib isn't needed to serve pages)."""
+    global _oauth
+    if _oauth is None:
+        from authlib.integrations.starlette_client import OAuth
+        _oauth = OAuth()
+        _oauth.register(
+            name='google',
+            client_id=os.environ.get('OAUTH_CLIENT_ID'),
+            client_secret=os.environ.get('OAUTH_CLIENT_SECRET'),
+            server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+            client_kwargs={'scope': 'openid profile email'}
+        )
+    return _oauth
 
 @app.get('/login')
 async def login(request: FastRequest):
@@ -37,12 +98,12 @@ async def login(request: FastRequest):
     redirect_uri_str = str(redirect_uri)
     if "http://" in redirect_uri_str and not "localhost" in redirect_uri_str:
         redirect_uri_str = redirect_uri_str.replace("http://", "https://")
-    return await oauth.google.authorize_redirect(request, redirect_uri_str)
+    return await get_oauth().google.authorize_redirect(request, redirect_uri_str)
 
 @app.get('/auth')
 async def auth(request: FastRequest):
     try:
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_oauth().google.authorize_access_token(request)
         user = token.get('userinfo')
         if user:
             request.session['user'] = user.get('email')
@@ -56,13 +117,20 @@ async def logout(request: FastRequest):
     request.session.pop('user', None)
     return RedirectResponse(url='/')
 
-# --- GRADIO APP ---
+# --- METRICS ---
+# Prometheus scrape target: LLM, database, sandbox and handler timings (see metrics.py)
+HANDLER_SECONDS = metrics.histogram("tutor_handler_seconds", "Gradio event handler duration (streaming handlers until their last update)", ("handler",))
+HANDLER_ERRORS = metrics.counter("tutor_handler_errors_total", "Gradio event handlers that raised", ("handler",))
 
-CURRICULUM = {
-    "Cricket Game": ["The Stadium (I/O)", "The Scoreboard (Variables)", "The Umpire (Conditionals)", "The Over (Loops)", "The Commentary (Functions)", "Match Recap (Git)"],
-    "Food Blog": ["The Menu (Strings)", "The Foodies List (Lists)", "Hotel Cards (Dictionaries)", "The Generator (Loops)", "Go Live (File I/O)", "Cloud Launch (Infra)"],
-    "Expense Tracker": ["The Wallet (Data Types)", "Daily Ledger (CSV)", "App Menu (Flow)", "The Auditor (Logic)", "The Workshop (Infra)", "Portfolio (Final)"]
-}
+@app.get('/metrics')
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# --- STATIC ASSETS ---
+# Demo videos and posters, with ETags, Range requests and long-lived caching (see assets.py)
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+
+# --- GRADIO APP ---
 
 with gr.Blocks(title="Bengaluru AI Tutor", theme=gr.themes.Soft()) as demo:
     with gr.Row():
@@ -70,9 +138,6 @@ with gr.Blocks(title="Bengaluru AI Tutor", theme=gr.themes.Soft()) as demo:
         with gr.Column(scale=0):
             btn_logout = gr.Button("🚪 Logout", size="sm", visible=False)
 
-    selected_goal = gr.State(None)
-    selected_mod = gr.State("Intro")
-
     with gr.Column(visible=False) as main_container:
         with gr.Tabs():
             with gr.TabItem("🎓 Classroom"):
@@ -83,17 +148,17 @@ with gr.Blocks(title="Bengaluru AI Tutor", theme=gr.themes.Soft()) as demo:
                         with gr.Column():
                             gr.Markdown("### 🏏 Gully Cricket Game")
                             btn_cricket = gr.Button("Choose Cricket 🏏", variant="primary")
-                            gr.Video(value="static/demos/cricket_demo.mp4", label="Demo", interactive=False, autoplay=True, loop=True, show_label=False)
+                            gr.HTML(demo_video_html("cricket_demo"), js_on_load=LAZY_VIDEO_JS, padding=False)
                         
                         with gr.Column():
                             gr.Markdown("### 🌐 Food Blog Generator")
                             btn_blog = gr.Button("Choose Food Blog 🌐", variant="primary")
-                            gr.Video(value="static/demos/blog_demo.mp4", label="Demo", interactive=False, autoplay=True, loop=True, show_label=False)
+                            gr.HTML(demo_video_html("blog_demo"), js_on_load=LAZY_VIDEO_JS, padding=False)
                         
                         with gr.Column():
                             gr.Markdown("### 💰 Kharcha Tracker")
                             btn_finance = gr.Button("Choose Expense Tracker 💰", variant="primary")
-                            gr.Video(value="static/demos/tracker_demo.mp4", label="Demo", interactive=False, autoplay=True, loop=True, show_label=False)
+                            gr.HTML(demo_video_html("tracker_demo"), js_on_load=LAZY_VIDEO_JS, padding=False)
 
                 with gr.Column(visible=False) as tutor_screen:
                     with gr.Row():
@@ -118,17 +183,20 @@ with gr.Blocks(title="Bengaluru AI Tutor", theme=gr.themes.Soft()) as demo:
                                 btn_submit = gr.Button("Send ➤", scale=1)
                             gr.Markdown("### 🐍 Python Sandbox")
                             code_input = gr.Code(language="python", label="Write your code here", lines=5)
-                            btn_run = gr.Button("▶️ Run Code", variant="secondary")
+                            with gr.Row():
+                                btn_run = gr.Button("▶️ Run Code", variant="secondary", scale=3)
+                                btn_stop = gr.Button("⏹️ Stop", size="sm", scale=1)
+                                btn_reset = gr.Button("🔄 Reset Sandbox", size="sm", scale=1)
                             code_output = gr.Textbox(label="Terminal Output", interactive=False, max_lines=10)
             
             logic_bar, ui_bar, db_bar = get_vision_tab()
+            dashboard_tab, btn_refresh_dashboard, dashboard_board = get_dashboard_tab()
 
     with gr.Column(visible=True) as login_prompt:
         gr.Markdown("### Please sign in to start your learning journey! 🚀")
         btn_login_trigger = gr.Button("Sign in with Google 🛡️", variant="primary")
 
-    def get_status_markdown(username):
-        progress = get_user_progress(username)
+    def get_status_markdown(progress):
         completed = progress.get("completed", {}) if progress else {}
         status_msg = "### 🏆 Your Level 1 Progress\n"
         all_done = True
@@ -140,79 +208,197 @@ with gr.Blocks(title="Bengaluru AI Tutor", theme=gr.themes.Soft()) as demo:
         status_msg += "\n🌟 **Level 2 Unlocked!**" if all_done else "\n*Complete all 3 projects to unlock Level 2.*"
         return status_msg
 
-    def check_user(request: gr.Request):
-        session = request.request.session
-        user = session.get("user")
+    def signed_in_user(request):
+        user = request.request.session.get("user")
         
         # Local Development Bypass
         host = request.request.client.host if request.request.client else ""
         if not user and (host == "127.0.0.1" or host == "localhost" or not os.environ.get("OAUTH_CLIENT_ID")):
             user = "local-dev"
-            
+        return user
+
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def check_user(request: gr.Request):
+        user = signed_in_user(request)
         if user:
-            try: ensure_user_exists(user)
-            except: pass
-            xp = calculate_xp(user)
+            # One progress snapshot feeds the status card and all three XP bars
+            try: progress = await aload_user(user)
+            except: progress = None
+            xp = xp_from_progress(progress)
             return (gr.update(visible=True), gr.update(visible=False), gr.update(visible=True), 
-                    get_status_markdown(user), 
+                    get_status_markdown(progress), 
                     get_xp_html("Logic", xp["Logic"], "#4a148c"), 
                     get_xp_html("Frontend", xp["Frontend"], "#1b5e20"), 
-                    get_xp_html("Database", xp["Database"], "#e65100"))
-        return gr.update(visible=False), gr.update(visible=True), gr.update(visible=False), gr.update(), gr.update(), gr.update(), gr.update()
+                    get_xp_html("Database", xp["Database"], "#e65100"),
+                    gr.update(visible=is_teacher(user)))
+        return gr.update(visible=False), gr.update(visible=True), gr.update(visible=False), gr.update(), gr.update(), gr.update(), gr.update(), gr.update(visible=False)
+
+    demo.load(check_user, None, [main_container, login_prompt, btn_logout, status_display, logic_bar, ui_bar, db_bar, dashboard_tab], api_name=False)
+
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def load_dashboard(request: gr.Request):
+        # The tab is hidden from students, but the event could still be called directly
+        if not is_teacher(signed_in_user(request)):
+            return "🔒 The class dashboard is for teachers."
+        return dashboard_markdown(await aclass_dashboard())
 
-    demo.load(check_user, None, [main_container, login_prompt, btn_logout, status_display, logic_bar, ui_bar, db_bar], api_name=False)
+    dashboard_tab.select(load_dashboard, None, [dashboard_board], api_name=False)
+    btn_refresh_dashboard.click(load_dashboard, None, [dashboard_board], api_name=False)
 
-    def submit_message(user_text, history, module_name, goal_name, request: gr.Request):
-        if not user_text.strip(): return {txt_input: gr.update()}
+    def visible_reply(text):
+        """Hide the [MODULE_COMPLETE] tag (even half-streamed) while the reply is still arriving."""
+        text = text.replace("[MODULE_COMPLETE]", "")
+        cut = text.rfind("[")
+        if cut != -1 and "[MODULE_COMPLETE]".startswith(text[cut:]):
+            text = text[:cut]
+        return text
+
+    def student_key(request):
+        """Who the conversation, sandbox and rate limits belong to; guests are told apart by browser session."""
+        return request.request.session.get("user") or request.session_hash
+
+    # Handlers keep no per-worker state: the goal, module and chat come from the conversation
+    # store on every event, so consecutive events may be served by different workers.
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def submit_message(user_text, request: gr.Request, conversation=None, reservation=None, local_reply=None):
+        if not user_text.strip():
+            yield {txt_input: gr.update()}
+            return
         user = request.request.session.get("user", "guest")
-        new_history = history + [{"role": "user", "content": user_text}]
+        student = student_key(request)
+        conversation = conversation or await aload_conversation(student)
+        if conversation is None:
+            yield {txt_input: gr.update()}  # no course started yet
+            return
+        goal_name, module_name = conversation["goal"], conversation["module"]
+        new_history = conversation["history"] + [{"role": "user", "content": user_text}]
         formatted_history = [HumanMessage(content=m['content']) if m['role']=='user' else AIMessage(content=m['content']) for m in new_history]
-        result = socratic_agent.invoke({"messages": formatted_history, "module_name": module_name, "goal": goal_name})
-        ai_response = result["messages"][-1].content
+        ai_response = ""
+        duplicate = False
+        async for kind, value in aguarded_reply({"messages": formatted_history, "module_name": module_name, "goal": goal_name}, student, reservation, local_reply):
+            if kind == "duplicate":
+                duplicate = True  # Enter and Send both fired: the first submit saves this turn
+                continue
+            if kind == "queued":
+                waiting = f"⏳ The coach is helping other students. You're #{value} in line..."
+                yield {chatbot_comp: new_history + [{"role": "assistant", "content": waiting}], txt_input: ""}
+                continue
+            ai_response += value
+            yield {chatbot_comp: new_history + [{"role": "assistant", "content": visible_reply(ai_response)}], txt_input: ""}
+        # Completion detection and saving only run once the full reply has arrived
         updated_mod_state = module_name
-        if "[MODULE_COMPLETE]" in ai_response:
+        completed = "[MODULE_COMPLETE]" in ai_response
+        if completed:
             ai_response = ai_response.replace("[MODULE_COMPLETE]", "").strip() + "\n\n🎉 **Module Complete!**"
             modules = CURRICULUM[goal_name]
+            idx = modules.index(module_name) if module_name in modules else len(modules) - 1
+            # The last module is saved as completed too; the student stays on it
+            if idx < len(modules) - 1:
+                updated_mod_state = modules[idx+1]
+        reply = {"role": "assistant", "content": ai_response}
+        if not duplicate:
+            await arecord_turn(student, goal_name, module_name, updated_mod_state, [new_history[-1], reply])
+        if completed and user != "guest" and not duplicate:
+            # Recorded first, so the steps counted from the module's transcript include this turn
             try:
-                idx = modules.index(module_name)
-                if idx < 5: 
-                    updated_mod_state = modules[idx+1]
-                    if user != "guest": save_progress(user, goal_name, updated_mod_state, {"completed_module_name": module_name, "steps": len(new_history)//2})
-            except: pass
-        return {chatbot_comp: new_history + [{"role": "assistant", "content": ai_response}], txt_input: "", selected_mod: updated_mod_state}
-
-    def run_code_and_chat(code, history, module_name, goal_name, request: gr.Request):
-        output = execute_code_safely(code)
-        res = submit_message(f"I ran this code:\n```python\n{code}\n```\nOutput:\n```\n{output}\n```", history, module_name, goal_name, request)
-        res[code_output] = output
-        return res
-
-    txt_input.submit(submit_message, [txt_input, chatbot_comp, selected_mod, selected_goal], [chatbot_comp, txt_input, selected_mod], api_name=False)
-    btn_submit.click(submit_message, [txt_input, chatbot_comp, selected_mod, selected_goal], [chatbot_comp, txt_input, selected_mod], api_name=False)
-    btn_run.click(run_code_and_chat, [code_input, chatbot_comp, selected_mod, selected_goal], [chatbot_comp, txt_input, selected_mod, code_output], api_name=False)
-
-    def start_course(goal, request: gr.Request):
+                await asave_progress(user, goal_name, updated_mod_state, {"completed_module_name": module_name})
+            except Exception as e:
+                print(f"⚠️ Completion of {module_name} for {user} not saved: {e}")
+        yield {chatbot_comp: new_history + [reply], txt_input: ""}
+
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def run_code_and_chat(code, request: gr.Request):
+        student = student_key(request)
+        conversation = await aload_conversation(student)
+        if conversation is None:
+            yield {code_output: gr.update()}
+            return
+        goal_name = conversation["goal"]
+        # Output streams into the terminal as it is printed. A long run starts queueing for the
+        # tutor's turn before it ends, so the reply can start as soon as the output is in.
+        reservation = TurnReservation(student, TUTOR_HEADSTART_SECONDS)
+        try:
+            # Each student keeps one Python session per goal; a worker that doesn't have it replays the stored cells
+            async for output, completed in astream_cell((student, goal_name), code, lambda: load_cells(student, goal_name)):
+                yield {code_output: output}
+            if output == SANDBOX_BUSY_MESSAGE:
+                return  # nothing ran, so there is nothing for the tutor to look at
+            # Only cells that ran to the end are replayed into a new sandbox
+            stored = asyncio.ensure_future(aadd_cell(student, goal_name, code)) if completed else None
+            # Clear passes and failures of the module's exercises are answered without the tutor
+            graded = await agrade_run((student, goal_name), conversation["module"], code, output, conversation["history"]) if completed else None
+            message = f"I ran this code:\n```python\n{code}\n```\nOutput:\n```\n{truncate_output(output, TUTOR_OUTPUT_CHARS)}\n```"
+            async for res in submit_message(message, request, conversation, reservation, graded):
+                res[code_output] = output
+                yield res
+            if stored is not None:
+                await stored
+        finally:
+            reservation.cancel()
+
+    txt_input.submit(submit_message, [txt_input], [chatbot_comp, txt_input], api_name=False)
+    btn_submit.click(submit_message, [txt_input], [chatbot_comp, txt_input], api_name=False)
+    run_event = btn_run.click(run_code_and_chat, [code_input], [chatbot_comp, txt_input, code_output], api_name=False)
+    # Cancelling the event stops the student's program (the sandbox worker is killed and replaced)
+    btn_stop.click(None, None, None, cancels=[run_event], api_name=False)
+
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def reset_sandbox(request: gr.Request):
+        student = student_key(request)
+        conversation = await aload_conversation(student)
+        if conversation is not None:
+            await aclear_cells(student, conversation["goal"])
+            await areset_session((student, conversation["goal"]))
+        return "🔄 Sandbox reset. Your variables are cleared and you can start fresh."
+
+    btn_reset.click(reset_sandbox, None, [code_output], api_name=False)
+
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def start_course(goal, request: gr.Request):
         user = request.request.session.get("user", "guest")
+        student = student_key(request)
         modules = CURRICULUM[goal]
-        saved = get_user_progress(user) if user != "guest" else None
-        active_mod = saved.get("module") if (saved and saved.get("goal") == goal) else modules[0]
-        result = socratic_agent.invoke({"messages": [HumanMessage(content=f"Starting {goal}, module {active_mod}")], "module_name": active_mod, "goal": goal})
-        return {welcome_screen: gr.update(visible=False), tutor_screen: gr.update(visible=True), goal_display: f"### 🎯 Goal: {goal}", selected_goal: goal, selected_mod: active_mod, 
+        conversation = await aload_conversation(student, goal)
+        if conversation and conversation["history"]:
+            # Coming back (or reloading the page): restore the transcript, no new opening from the LLM
+            history = conversation["history"]
+            await asave_conversation(student, goal, conversation["module"])
+        else:
+            saved = await aget_user_progress(user) if user != "guest" else None
+            active_mod = saved.get("module") if (saved and saved.get("goal") == goal) else modules[0]
+            try:
+                opening = {"role": "assistant", "content": await aopening_message(goal, active_mod)}
+            except QueueFull:
+                # Not saved as the opener: the next visit asks the tutor again instead of restoring "busy"
+                history = [{"role": "assistant", "content": BUSY_MESSAGE}]
+                await asave_conversation(student, goal, active_mod)
+            else:
+                history = [opening]
+                await arecord_turn(student, goal, active_mod, active_mod, history)
+        return {welcome_screen: gr.update(visible=False), tutor_screen: gr.update(visible=True), goal_display: f"### 🎯 Goal: {goal}", 
                 m1: gr.update(value=f"1. {modules[0]}"), m2: gr.update(value=f"2. {modules[1]}"), m3: gr.update(value=f"3. {modules[2]}"), 
                 m4: gr.update(value=f"4. {modules[3]}"), m5: gr.update(value=f"5. {modules[4]}"), m6: gr.update(value=f"6. {modules[5]}"), 
-                chatbot_comp: [{"role": "assistant", "content": result["messages"][-1].content}]}
+                chatbot_comp: history}
 
-    btn_cricket.click(start_course, gr.State("Cricket Game"), [welcome_screen, tutor_screen, goal_display, selected_goal, selected_mod, m1, m2, m3, m4, m5, m6, chatbot_comp], api_name=False)
-    btn_blog.click(start_course, gr.State("Food Blog"), [welcome_screen, tutor_screen, goal_display, selected_goal, selected_mod, m1, m2, m3, m4, m5, m6, chatbot_comp], api_name=False)
-    btn_finance.click(start_course, gr.State("Expense Tracker"), [welcome_screen, tutor_screen, goal_display, selected_goal, selected_mod, m1, m2, m3, m4, m5, m6, chatbot_comp], api_name=False)
+    btn_cricket.click(start_course, gr.State("Cricket Game"), [welcome_screen, tutor_screen, goal_display, m1, m2, m3, m4, m5, m6, chatbot_comp], api_name=False)
+    btn_blog.click(start_course, gr.State("Food Blog"), [welcome_screen, tutor_screen, goal_display, m1, m2, m3, m4, m5, m6, chatbot_comp], api_name=False)
+    btn_finance.click(start_course, gr.State("Expense Tracker"), [welcome_screen, tutor_screen, goal_display, m1, m2, m3, m4, m5, m6, chatbot_comp], api_name=False)
     
-    btn_back.click(lambda request: {welcome_screen: gr.update(visible=True), tutor_screen: gr.update(visible=False), selected_goal: None, chatbot_comp: [], 
-                                    status_display: get_status_markdown(request.request.session.get("user", "guest"))}, 
-                   None, [welcome_screen, tutor_screen, selected_goal, chatbot_comp, status_display], api_name=False)
+    @timed(HANDLER_SECONDS, label="handler", errors=HANDLER_ERRORS)
+    async def go_back(request: gr.Request):
+        user = request.request.session.get("user", "guest")
+        progress = await aget_user_progress(user) if user != "guest" else None
+        return {welcome_screen: gr.update(visible=True), tutor_screen: gr.update(visible=False), chatbot_comp: [], 
+                status_display: get_status_markdown(progress)}
+
+    btn_back.click(go_back, None, [welcome_screen, tutor_screen, chatbot_comp, status_display], api_name=False)
 
     btn_login_trigger.click(None, None, None, js="() => { window.location.href = '/login'; }")
     btn_logout.click(None, None, None, js="() => { window.location.href = '/logout'; }")
 
+# Async handlers don't hold a thread while they wait, so let many tutoring turns run at once
+demo.queue(default_concurrency_limit=int(os.environ.get("GRADIO_CONCURRENCY", 256)))
+
 app = gr.mount_gradio_app(app, demo, path="/")
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 7860)))
\ No newline at end of file
@@ -0,0 +1,85 @@
+import os
+import hashlib
+from starlette.staticfiles import StaticFiles
+
+# --- STATIC ASSETS ---
+# Files under static/ are served by StaticFiles (ETag, If-None-Match -> 304, Range requests for
+# video seeking) with Cache-Control on top. URLs built by asset_url() carry a content hash
+# (?v=...), so they can be cached for a year: a changed file gets a new URL.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", 3600))  # unversioned URLs
+VERSIONED_CACHE = "public, max-age=31536000, immutable"
+
+# Demo videos on the welcome screen: transcode_demos.py writes a small rendition
+# (<name>.small.mp4) and a poster (<name>.jpg) next to each original
+DEMO_DIR = "demos"
+DEMO_RENDITION = ".small.mp4"
+DEMO_POSTER = ".jpg"
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with long-lived Cache-Control for fingerprinted URLs."""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 206, 304):
+            versioned = b"v=" in scope.get("query_string", b"")
+            response.headers["Cache-Control"] = VERSIONED_CACHE if versioned else f"public, max-age={STATIC_MAX_AGE}"
+        return response
+
+_fingerprints = {}
+
+def fingerprint(path):
+    """Short content hash of a static file, recomputed only when its size or mtime changes."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _fingerprints:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _fingerprints[key] = digest.hexdigest()[:12]
+    return _fingerprints[key]
+
+def asset_url(relative):
+    """/static/<relative>?v=<hash>, or None if the file doesn't exist."""
+    path = os.path.join(STATIC_DIR, relative)
+    if not os.path.isfile(path):
+        return None
+    return f"/static/{relative}?v={fingerprint(path)}"
+
+def demo_sources(name):
+    """(video URL, poster URL) for a demo: the small rendition if it was transcoded, else the original."""
+    video = asset_url(f"{DEMO_DIR}/{name}{DEMO_RENDITION}") or asset_url(f"{DEMO_DIR}/{name}.mp4")
+    return video, asset_url(f"{DEMO_DIR}/{name}{DEMO_POSTER}")
+
+def demo_video_html(name, label="Demo"):
+    """A muted looping <video> that downloads nothing but its poster until LAZY_VIDEO_JS starts it."""
+    video, poster = demo_sources(name)
+    if video is None:
+        return ""
+    poster_attr = f' poster="{poster}"' if poster else ""
+    return (f'<video class="demo-video" data-src="{video}"{poster_attr} aria-label="{label}" preload="none" '
+            'muted loop playsinline style="width:100%;border-radius:8px;cursor:pointer"></video>')
+
+# Runs for each demo (gr.HTML js_on_load): the video loads once half of it is on screen, or
+# when it is clicked. On Save-Data or 2G connections it only ever loads on click.
+LAZY_VIDEO_JS = """
+const video = element.querySelector("video.demo-video");
+if (video) {
+    const start = () => {
+        if (!video.getAttribute("src")) video.src = video.dataset.src;
+        video.play().catch(() => {});
+    };
+    video.addEventListener("click", () => (video.paused ? start() : video.pause()));
+    const link = navigator.connection || {};
+    if (!link.saveData && !/2g/.test(link.effectiveType || "") && "IntersectionObserver" in window) {
+        const observer = new IntersectionObserver((entries) => {
+            if (entries.some((entry) => entry.isIntersecting)) {
+                observer.disconnect();
+                start();
+            }
+        }, {threshold: 0.5});
+        observer.observe(video);
+    }
+}
+"""
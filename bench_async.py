@@ -0,0 +1,59 @@
+"""
+Load benchmark: blocking handlers on a thread pool vs the async path, against a stubbed LLM.
+
+Each simulated tutoring turn reads progress, asks the tutor graph for a reply
+and saves progress, like submit_message does. The sync run uses a 40-thread
+pool (Gradio's default worker count); the async run uses one event loop.
+Usage: python bench_async.py [concurrent_turns] [token_delay_seconds]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+os.environ["MOCK_LLM"] = "1"
+os.environ["MOCK_TOKEN_DELAY"] = sys.argv[2] if len(sys.argv) > 2 else "0.05"
+os.environ["TUTOR_DB"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+
+from logic import socratic_agent
+from database import get_user_progress, save_progress, aget_user_progress, asave_progress
+from langchain_core.messages import HumanMessage
+
+GOAL, MODULE = "Cricket Game", "The Stadium (I/O)"
+
+def make_inputs():
+    return {"messages": [HumanMessage(content="How do I print?")], "module_name": MODULE, "goal": GOAL}
+
+def sync_turn(i):
+    user = f"student-{i}"
+    get_user_progress(user)
+    socratic_agent.invoke(make_inputs())
+    save_progress(user, GOAL, MODULE, {"completed_module_name": MODULE, "steps": 3})
+
+async def async_turn(i):
+    user = f"student-{i}"
+    await aget_user_progress(user)
+    await socratic_agent.ainvoke(make_inputs())
+    await asave_progress(user, GOAL, MODULE, {"completed_module_name": MODULE, "steps": 3})
+
+def bench_sync():
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        list(pool.map(sync_turn, range(TURNS)))
+    return time.perf_counter() - start
+
+async def bench_async():
+    start = time.perf_counter()
+    await asyncio.gather(*(async_turn(i) for i in range(TURNS)))
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    print(f"--- {TURNS} concurrent turns, stub LLM at {os.environ['MOCK_TOKEN_DELAY']}s per token ---")
+    sync_time = bench_sync()
+    async_time = asyncio.run(bench_async())
+    print(f"sync  (40 threads): {sync_time:6.2f} s | {TURNS / sync_time:7.1f} turns/s")
+    print(f"async (event loop): {async_time:6.2f} s | {TURNS / async_time:7.1f} turns/s")
+    print(f"throughput gain   : {sync_time / async_time:.1f}x")
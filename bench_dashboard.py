@@ -0,0 +1,81 @@
+"""
+Teacher dashboard cost by class size: the naive view (get_user_progress per student, then the
+per-module counts and medians in Python) vs class_dashboard(), which reads the aggregate tables
+that save_progress and record_turn keep up to date.
+
+Each class is seeded through the real write path (record_turn for every turn, save_progress
+for every completion) into its own temporary database, so the write-side cost of keeping the
+aggregates is included in the seeding time.
+Usage: python bench_dashboard.py [max_students]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import statistics
+
+MAX_STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+os.environ["TUTOR_DB"] = os.path.join(tempfile.mkdtemp(prefix="bench_dashboard_"), "bench.sqlite")
+os.environ["PROGRESS_CACHE_SIZE"] = "0"  # a teacher's view would not find the whole class cached
+
+import database  # noqa: E402  (reads TUTOR_DB at import)
+from curriculum import CURRICULUM  # noqa: E402
+
+GOAL = "Cricket Game"
+MODULES = CURRICULUM[GOAL]
+TURN = [{"role": "user", "content": "print('hi')"}, {"role": "assistant", "content": "What do you see?"}]
+REPEATS = 5
+
+def seed(students, start):
+    """Give students start..students-1 a random amount of progress through GOAL."""
+    rng = random.Random(start)
+    futures = []
+    for i in range(start, students):
+        user = f"student{i}"
+        futures.append(database.writer.submit(database._insert_user, user, "x"))
+        for n, module in enumerate(MODULES[:rng.randint(0, len(MODULES))]):
+            steps = rng.randint(2, 20)
+            next_module = MODULES[n + 1] if n + 1 < len(MODULES) else module
+            for _ in range(steps - 1):
+                futures.append(database.writer.submit(database._record_turn, user, GOAL, module, module, TURN))
+            futures.append(database._submit_save(user, GOAL, next_module, {"completed_module_name": module, "steps": steps}))
+            futures.append(database.writer.submit(database._record_turn, user, GOAL, module, next_module, TURN))
+    for future in futures:
+        future.result()
+
+def naive(students):
+    """What a dashboard would cost without aggregates: every student's progress, reduced in Python."""
+    steps = {module: [] for module in MODULES}
+    for i in range(students):
+        progress = database.get_user_progress(f"student{i}") or {"completed": {}}
+        for module, stats in progress["completed"].items():
+            steps[module].append(stats["steps"])
+    return {module: (len(s), statistics.median(s) if s else None) for module, s in steps.items()}
+
+def best_of(fn, *args):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def main():
+    sizes = [n for n in (100, 1000, 5000, 20000) if n <= MAX_STUDENTS] or [MAX_STUDENTS]
+    print(f"{'students':>8} | {'seed s':>7} | {'naive ms':>9} | {'aggregates ms':>13}")
+    seeded = 0
+    for size in sizes:
+        start = time.perf_counter()
+        seed(size, seeded)
+        seeded = size
+        seconds = time.perf_counter() - start
+        database.progress_cache.clear()
+        print(f"{size:8d} | {seconds:7.1f} | {best_of(naive, size):9.1f} | {best_of(database.class_dashboard):13.2f}")
+    stats = database.class_dashboard()["modules"]
+    first = stats.get((GOAL, MODULES[0]))
+    if first:
+        print(f"\n{MODULES[0]}: {first['completed']}/{first['reached']} completed, median {first['median_steps']:g} steps")
+
+if __name__ == "__main__":
+    main()
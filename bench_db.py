@@ -0,0 +1,100 @@
+"""
+Page-load latency against SQLite: the old connect-per-call functions vs the pooled
+WAL reader + single-writer layer in database.py.
+
+A page load is ensure_user_exists + get_user_progress twice (status bar and XP tab);
+about one in ten also saves progress, as happens when a module is completed.
+Each side gets its own temporary database. The old side spends most of its time
+in SQLite's 5 s busy timeout, so a full run takes a few minutes.
+Usage: python bench_db.py [page_loads_per_user]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_db_")
+os.environ["TUTOR_DB"] = os.path.join(WORKDIR, "pooled.sqlite")
+import database  # noqa: E402  (reads TUTOR_DB at import)
+
+LOADS = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+USERS = [1, 50, 500]
+OLD_DB = os.path.join(WORKDIR, "old.sqlite")
+
+# --- The previous implementation, verbatim apart from the DB path ---
+def old_init():
+    conn = sqlite3.connect(OLD_DB)
+    conn.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password_hash TEXT, created_at TEXT)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS progress (username TEXT PRIMARY KEY, current_goal TEXT,
+                    current_module TEXT, completed_modules TEXT, last_updated TEXT)''')
+    conn.commit()
+    conn.close()
+
+def old_ensure_user_exists(username):
+    conn = sqlite3.connect(OLD_DB)
+    c = conn.cursor()
+    c.execute("SELECT username FROM users WHERE username=?", (username,))
+    if not c.fetchone():
+        c.execute("INSERT INTO users VALUES (?, ?, ?)", (username, hashlib.sha256(b"oauth_user").hexdigest(), datetime.now().isoformat()))
+        conn.commit()
+    conn.close()
+
+def old_get_user_progress(username):
+    conn = sqlite3.connect(OLD_DB)
+    c = conn.cursor()
+    c.execute("SELECT current_goal, current_module, completed_modules FROM progress WHERE username=?", (username,))
+    row = c.fetchone()
+    conn.close()
+    return {"goal": row[0], "module": row[1], "completed": json.loads(row[2])} if row else None
+
+def old_save_progress(username, goal, module, metrics=None):
+    conn = sqlite3.connect(OLD_DB)
+    c = conn.cursor()
+    c.execute("SELECT completed_modules FROM progress WHERE username=?", (username,))
+    row = c.fetchone()
+    completed = json.loads(row[0]) if row else {}
+    completed[metrics["completed_module_name"]] = {"steps": metrics["steps"]}
+    c.execute("INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?, ?)", (username, goal, module, json.dumps(completed), datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+
+OLD = (old_ensure_user_exists, old_get_user_progress, old_save_progress)
+NEW = (database.ensure_user_exists, database.get_user_progress, database.save_progress)
+
+def page_load(impl, user, i):
+    ensure, get_progress, save = impl
+    start = time.perf_counter()
+    try:
+        ensure(user)
+        get_progress(user)
+        if i % 10 == 9:
+            save(user, "Cricket Game", f"Module {i}", {"completed_module_name": f"Module {i - 1}", "steps": i})
+        get_progress(user)
+    except (sqlite3.OperationalError, sqlite3.IntegrityError):  # "database is locked", check-then-insert races
+        return None
+    return time.perf_counter() - start
+
+def run(impl, users):
+    jobs = [(f"user{u}", i) for i in range(LOADS) for u in range(users)]
+    with ThreadPoolExecutor(max_workers=min(users, 40)) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda job: page_load(impl, *job), jobs))
+        wall = time.perf_counter() - start
+    ok = sorted(r for r in results if r is not None)
+    p99 = ok[min(len(ok) - 1, int(len(ok) * 0.99))] if ok else 0
+    return len(jobs) / wall, statistics.median(ok) * 1000, p99 * 1000, len(results) - len(ok)
+
+if __name__ == "__main__":
+    old_init()
+    print(f"--- {LOADS} page loads per user, databases in {WORKDIR} ---")
+    print(f"{'users':>5} | {'impl':>6} | {'loads/s':>8} | {'p50 ms':>7} | {'p99 ms':>7} | {'errors':>6}")
+    for users in USERS:
+        for name, impl in (("old", OLD), ("pooled", NEW)):
+            rate, p50, p99, errors = run(impl, users)
+            print(f"{users:5d} | {name:>6} | {rate:8.0f} | {p50:7.2f} | {p99:7.2f} | {errors:6d}")
@@ -0,0 +1,87 @@
+"""
+Shared-client benchmark: per-call setup vs generation time, against a local fake Gemini server.
+
+The fake server speaks the generateContent REST API over HTTP/1.1 keep-alive
+and counts the TCP connections it accepts. "fresh" rebuilds the client every
+turn (the old behaviour); "shared" reuses get_llm()'s pooled client.
+Usage: python bench_llm_client.py [turns] [concurrency] [server_latency_seconds]
+"""
+import os
+import sys
+import json
+import time
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+LATENCY = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+
+class FakeGemini(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeGemini.lock:
+            FakeGemini.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(LATENCY)
+        candidate = {"content": {"parts": [{"text": "Shabash! What does print() show?"}], "role": "model"},
+                     "finishReason": "STOP", "index": 0}
+        payload = {"candidates": [candidate],
+                   "usageMetadata": {"promptTokenCount": 200, "candidatesTokenCount": 8, "totalTokenCount": 208}}
+        body = json.dumps(payload).encode()
+        if "alt=sse" in self.path:
+            body = b"data: " + body + b"\r\n\r\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if "alt=sse" in self.path else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGemini)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+os.environ.pop("MOCK_LLM", None)
+
+import logic
+from langchain_core.messages import HumanMessage
+
+STATE = {"messages": [HumanMessage(content="How do I print?")], "module_name": "The Stadium (I/O)", "goal": "Cricket Game"}
+
+def run(mode):
+    logic.set_llm(None)
+    logic.LLM_TIMINGS.clear()
+    FakeGemini.connections = 0
+
+    def turn(_):
+        if mode == "fresh":
+            # Old behaviour: a brand new client (and connection pool) for every message
+            logic._llm_clients.clear()
+        logic.call_model(STATE)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        list(pool.map(turn, range(TURNS)))
+    elapsed = time.perf_counter() - start
+    setup = [t[0] * 1000 for t in logic.LLM_TIMINGS]
+    generation = [t[1] * 1000 for t in logic.LLM_TIMINGS]
+    print(f"{mode:6} | setup p50 {statistics.median(setup):6.2f} ms | generation p50 {statistics.median(generation):6.2f} ms"
+          f" | {FakeGemini.connections:4d} connections | {TURNS / elapsed:6.1f} turns/s")
+
+if __name__ == "__main__":
+    print(f"--- {TURNS} turns, {CONCURRENCY} concurrent, fake server latency {LATENCY * 1000:.0f} ms ---")
+    run("fresh")
+    run("shared")
+    server.shutdown()
@@ -0,0 +1,51 @@
+"""
+Prompt size and latency vs conversation length, with and without the memory window.
+
+Uses a stub LLM whose latency grows with prompt size (simulated prefill cost)
+so the effect of the window is visible offline.
+Usage: python bench_memory.py [prefill_ms_per_1k_tokens]
+"""
+import sys
+import time
+
+import logic
+from logic import socratic_agent, MockTutorLLM, estimate_tokens, content_text
+from langchain_core.messages import HumanMessage, AIMessage
+
+PREFILL_MS_PER_1K = float(sys.argv[1]) if len(sys.argv) > 1 else 50.0
+LENGTHS = [5, 10, 25, 50, 100, 200]
+
+class PrefillStubLLM(MockTutorLLM):
+    """Mock tutor that records prompt tokens and sleeps in proportion to them."""
+    last_prompt_tokens: int = 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.last_prompt_tokens = sum(estimate_tokens(content_text(m.content)) for m in messages)
+        time.sleep(self.last_prompt_tokens / 1000 * PREFILL_MS_PER_1K / 1000)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+def conversation(turns):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"Turn {i}: I tried print('score', {i}) and got a NameError, what now? " * 2))
+        messages.append(AIMessage(content=f"Good try! Think about the Chinnaswamy scoreboard in turn {i}. What should hold the runs before we print them? " * 2))
+    messages.append(HumanMessage(content="Should I use a variable?"))
+    return messages
+
+def measure(turns, window):
+    logic.MEMORY_WINDOW_TURNS = window
+    llm = PrefillStubLLM()
+    logic.set_llm(llm)
+    start = time.perf_counter()
+    socratic_agent.invoke({"messages": conversation(turns), "module_name": "The Scoreboard (Variables)", "goal": "Cricket Game"})
+    return llm.last_prompt_tokens, (time.perf_counter() - start) * 1000
+
+if __name__ == "__main__":
+    window = logic.MEMORY_WINDOW_TURNS or 6
+    print(f"--- window {window} turns, budget {logic.MEMORY_TOKEN_BUDGET} tokens, prefill {PREFILL_MS_PER_1K} ms/1k tokens ---")
+    print(f"{'turns':>6} | {'full tokens':>11} | {'full ms':>8} | {'window tokens':>13} | {'window ms':>9}")
+    for turns in LENGTHS:
+        full_tokens, full_ms = measure(turns, 0)
+        win_tokens, win_ms = measure(turns, window)
+        print(f"{turns:6d} | {full_tokens:11d} | {full_ms:8.1f} | {win_tokens:13d} | {win_ms:9.1f}")
+    logic.set_llm(None)
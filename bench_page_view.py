@@ -0,0 +1,62 @@
+"""
+Counts database round trips per page view using database.DB_STATS.
+
+Drives the real Gradio handlers (check_user on page load, start_course, go_back)
+for a batch of students against a temporary database with the mock tutor.
+Usage: python bench_page_view.py [students]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+os.environ.setdefault("MOCK_LLM", "1")
+os.environ["TUTOR_DB"] = os.path.join(tempfile.mkdtemp(prefix="bench_page_"), "tutor.sqlite")
+
+import app  # noqa: E402  (reads TUTOR_DB / MOCK_LLM at import)
+import database  # noqa: E402
+from database import DB_STATS  # noqa: E402
+
+STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+class Request:
+    """Just enough of gr.Request for the handlers."""
+    def __init__(self, user):
+        self.request = type("R", (), {"session": {"user": user}, "client": None})()
+        self.session_hash = user
+
+def handler(name):
+    return next(f.fn for f in app.demo.fns.values() if f.fn is not None and f.fn.__name__ == name)
+
+async def view(name, *args):
+    before = DB_STATS.copy()
+    start = time.perf_counter()
+    await handler(name)(*args)
+    return (time.perf_counter() - start) * 1000, DB_STATS["read"] - before["read"], DB_STATS["write"] - before["write"]
+
+async def measure(label, name, args_for):
+    results = [await view(name, *args_for(i)) for i in range(STUDENTS)]
+    ms = sum(r[0] for r in results) / len(results)
+    reads = sum(r[1] for r in results) / len(results)
+    writes = sum(r[2] for r in results) / len(results)
+    print(f"{label:<28} | {reads:5.2f} | {writes:6.2f} | {ms:6.2f}")
+
+async def main():
+    requests = [Request(f"student{i}@example.com") for i in range(STUDENTS)]
+    print(f"--- {STUDENTS} students, round trips per page view ---")
+    print(f"{'view':<28} | {'reads':>5} | {'writes':>6} | {'ms':>6}")
+    await measure("page load, new student", "check_user", lambda i: (requests[i],))
+    database.progress_cache.clear()
+    await measure("page load, cold cache", "check_user", lambda i: (requests[i],))
+    await measure("page load, warm", "check_user", lambda i: (requests[i],))
+    await measure("open course", "start_course", lambda i: ("Cricket Game", requests[i]))
+    for i, req in enumerate(requests):
+        await database.asave_progress(req.request.session["user"], "Cricket Game", "The Scoreboard (Variables)",
+                                      {"completed_module_name": "The Stadium (I/O)", "steps": 3})
+    await measure("back to goals, after a save", "go_back", lambda i: (requests[i],))
+    await measure("back to goals, warm", "go_back", lambda i: (requests[i],))
+    print(f"progress cache: {DB_STATS['hit']} hits / {DB_STATS['miss']} misses")
+
+if __name__ == "__main__":
+    asyncio.run(main())
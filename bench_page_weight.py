@@ -0,0 +1,93 @@
+"""
+Welcome-screen weight: how many bytes a student's browser pulls before the goal buttons are usable,
+and an estimate of how long that takes on a slow classroom link.
+
+Loads the app in-process with the mock tutor and a temporary database, fetches / and the
+scripts and stylesheets it links, then walks /config for the demo media:
+  on load        gr.Video values (autoplay downloads the whole file) and <video> posters
+  when visible   data-src of the lazy demo videos (assets.LAZY_VIDEO_JS), fetched only once
+                 a demo is scrolled into view or clicked
+There is no browser here, so first usable paint is estimated, not measured:
+ROUND_TRIPS x rtt + bytes on load / bandwidth, with the demo media sharing the link with the
+app bundle as it does when the videos autoplay.
+Usage: python bench_page_weight.py [kbps] [rtt_ms]
+"""
+import os
+import re
+import sys
+import tempfile
+from urllib.parse import urljoin, urlsplit
+
+os.environ.setdefault("TUTOR_DB", os.path.join(tempfile.mkdtemp(prefix="bench_page_"), "tutor.sqlite"))
+os.environ.setdefault("MOCK_LLM", "1")
+os.environ.setdefault("SESSION_SECRET", "bench-page-weight")
+os.environ.setdefault("STARTUP_WARMUP", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+
+# Classroom 3G by default; pass e.g. 10000 60 for a decent 4G link
+KBPS = float(sys.argv[1]) if len(sys.argv) > 1 else 1600
+RTT_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 300
+# DNS + TCP + TLS, the HTML, the app bundle, /config and the first queue join
+ROUND_TRIPS = 6
+LINKED = re.compile(r'<(?:script|link)\b[^>]*\b(?:src|href)="([^"]+\.(?:js|css))"')
+POSTER = re.compile(r'\bposter="([^"]+)"')
+LAZY_SRC = re.compile(r'\bdata-src="([^"]+)"')
+
+def size(client, url):
+    """Bytes of a same-origin URL, 0 if it isn't served."""
+    response = client.get(url)
+    return len(response.content) if response.status_code == 200 else 0
+
+def media(config):
+    """(on-load URLs, when-visible URLs) of the demo media in the Gradio config."""
+    on_load, visible = [], []
+    for component in config["components"]:
+        props = component.get("props", {})
+        value = props.get("value")
+        if component["type"] == "video" and value:
+            video = value.get("video", value) if isinstance(value, dict) else {}
+            if video.get("url") or video.get("path"):
+                on_load.append(video.get("url") or f"/gradio_api/file={video['path']}")
+        elif component["type"] == "html" and isinstance(value, str):
+            on_load += POSTER.findall(value)
+            visible += LAZY_SRC.findall(value)
+    return on_load, visible
+
+def seconds(total_bytes):
+    return ROUND_TRIPS * RTT_MS / 1000 + total_bytes * 8 / (KBPS * 1000)
+
+def main():
+    with TestClient(app.app) as client:
+        page = client.get("/")
+        shell = {"/": len(page.content)}
+        for link in LINKED.findall(page.text):
+            if not link.startswith("http"):
+                url = urljoin("/", link)
+                shell[url] = size(client, url)
+        config = client.get("/config")
+        shell["/config"] = len(config.content)
+        on_load, visible = media(config.json())
+        eager = {url: size(client, url) for url in on_load}
+        lazy = {url: size(client, url) for url in visible}
+
+    print(f"--- welcome screen, {KBPS:.0f} kbps / {RTT_MS:.0f} ms RTT ---")
+    print(f"{'resource':<60} | {'KB':>8}")
+    for url, n in list(shell.items()) + list(eager.items()):
+        print(f"{urlsplit(url).path[-60:]:<60} | {n / 1024:8.1f}")
+    for url, n in lazy.items():
+        print(f"{(urlsplit(url).path + ' (when visible)')[-60:]:<60} | {n / 1024:8.1f}")
+    if not (eager or lazy):
+        print("(no demo media found in static/demos: run transcode_demos.py after adding the videos)")
+
+    app_bytes, load_bytes, later_bytes = sum(shell.values()), sum(eager.values()), sum(lazy.values())
+    print(f"\napp shell:          {app_bytes / 1024:8.1f} KB")
+    print(f"demo media on load: {load_bytes / 1024:8.1f} KB")
+    print(f"demo media later:   {later_bytes / 1024:8.1f} KB (only for the demos a student looks at)")
+    print(f"estimated first usable paint: {seconds(app_bytes + load_bytes):.1f}s "
+          f"(app shell alone {seconds(app_bytes):.1f}s)")
+
+if __name__ == "__main__":
+    main()
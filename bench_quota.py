@@ -0,0 +1,110 @@
+"""
+A classroom against a quota-limited tutor backend, with and without the quota guard.
+
+The stub backend allows QUOTA_RPS calls per second and answers anything over that
+with a 429, like Gemini. Every student double-submits each message (Enter + Send).
+Without the guard (the old behaviour) over-quota turns get the canned fallback reply;
+with it they wait their turn, and double submits share one call.
+Time is compressed: the quota is per second instead of per minute.
+Usage: python bench_quota.py [students] [quota_rps]
+"""
+import io
+import os
+import sys
+import contextlib
+import time
+import asyncio
+import statistics
+from collections import deque
+
+STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+QUOTA_RPS = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+MESSAGES = 3
+
+# The guard runs a little under the backend quota
+os.environ["LLM_GLOBAL_RPM"] = str(QUOTA_RPS * 0.9 * 60)
+os.environ["LLM_GLOBAL_BURST"] = "5"
+os.environ["LLM_USER_RPM"] = "600"
+os.environ["LLM_QUEUE_MAX"] = str(STUDENTS * MESSAGES)
+# Measure the guard alone: the unguarded run's 429s would otherwise open the circuit breaker
+os.environ["LLM_BREAKER_MIN_CALLS"] = str(10**9)
+
+import logic  # noqa: E402
+from logic import MockTutorLLM, astream_reply, aguarded_reply  # noqa: E402
+from langchain_core.messages import HumanMessage, AIMessageChunk  # noqa: E402
+from langchain_core.outputs import ChatGenerationChunk  # noqa: E402
+
+REAL_REPLY = "Good thinking! What happens if the score changes?"
+
+class QuotaStubLLM(MockTutorLLM):
+    """Answers after 200 ms, or raises a Gemini-style 429 once the per-second quota is used up."""
+    calls: int = 0
+    rejected: int = 0
+    window: deque = deque()
+
+    def _check_quota(self):
+        now = time.monotonic()
+        while self.window and now - self.window[0] > 1.0:
+            self.window.popleft()
+        self.calls += 1
+        if len(self.window) >= QUOTA_RPS:
+            self.rejected += 1
+            raise RuntimeError("429 RESOURCE_EXHAUSTED: You exceeded your current quota. Please retry in 0.5s.")
+        self.window.append(now)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._check_quota()
+        await asyncio.sleep(0.2)
+        for word in REAL_REPLY.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+async def unguarded(inputs, user):
+    async for text in astream_reply(inputs):
+        yield ("text", text)
+
+async def student(i, reply_fn, results):
+    for m in range(MESSAGES):
+        inputs = {"messages": [HumanMessage(content=f"Student {i}, question {m}")], "module_name": "The Over (Loops)", "goal": "Cricket Game"}
+
+        async def submit():
+            start = time.perf_counter()
+            text = ""
+            async for kind, value in reply_fn(inputs, f"student{i}"):
+                if kind == "text":
+                    text += value
+            results.append((time.perf_counter() - start, text.strip() == REAL_REPLY))
+
+        await asyncio.gather(submit(), submit())  # Enter + Send for the same message
+        await asyncio.sleep(0.5)
+
+async def run(label, reply_fn):
+    llm = QuotaStubLLM()
+    llm.window.clear()
+    logic.set_llm(llm)
+    results = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # one "API ERROR" line per fallback
+        await asyncio.gather(*(student(i, reply_fn, results) for i in range(STUDENTS)))
+    wall = time.perf_counter() - start
+    latencies = sorted(r[0] for r in results)
+    real = sum(r[1] for r in results)
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{label:<10} | {llm.calls:9d} | {llm.rejected:8d} | {real:4d}/{len(results):<4d} | "
+          f"{statistics.median(latencies):6.2f} | {p95:6.2f} | {wall:6.1f}")
+
+async def main():
+    print(f"--- {STUDENTS} students x {MESSAGES} messages (each sent twice), backend quota {QUOTA_RPS:g} req/s ---")
+    print(f"{'mode':<10} | {'API calls':>9} | {'429s':>8} | {'real replies':>9} | {'p50 s':>6} | {'p95 s':>6} | {'wall s':>6}")
+    retries = logic.LLM_QUOTA_RETRIES
+    logic.LLM_QUOTA_RETRIES = 0  # the old behaviour: first quota error -> canned reply
+    await run("unguarded", unguarded)
+    logic.LLM_QUOTA_RETRIES = retries
+    await run("guarded", aguarded_reply)
+    print(f"guard stats: {dict(logic.QUOTA.stats)}")
+    logic.set_llm(None)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Sandbox throughput and tail latency under concurrent submissions.
+
+Runs a mix of typical student programs from many threads at once through the
+worker pool, optionally with some runaway `while True:` submissions mixed in
+to show they no longer stall everyone else.
+Usage: python bench_sandbox.py [submissions] [concurrency] [runaway_percent]
+"""
+import sys
+import time
+import random
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from sandbox import execute_code_safely, get_pool
+
+SUBMISSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+RUNAWAY_PERCENT = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+PROGRAMS = [
+    "print('Welcome to Chinnaswamy')",
+    "runs = 0\nfor ball in range(6):\n    runs += ball\nprint('Over total:', runs)",
+    "score = 187\nif score > 180:\n    print('Big total!')\nelse:\n    print('Chase is on')",
+    "hotels = ['MTR', 'Vidyarthi Bhavan', 'CTR']\nfor h in hotels:\n    print(f'<li>{h}</li>')",
+    "spend = {'metro': 40, 'dosa': 60}\nprint(sum(spend.values()))",
+    "def commentary(runs):\n    return 'SIX!' if runs == 6 else 'Single'\nprint(commentary(6))",
+    "print(total)",
+]
+RUNAWAY = "while True:\n    pass"
+
+def timed_run(code):
+    start = time.perf_counter()
+    execute_code_safely(code)
+    return code, time.perf_counter() - start
+
+if __name__ == "__main__":
+    random.seed(7)
+    jobs = [RUNAWAY if random.random() * 100 < RUNAWAY_PERCENT else random.choice(PROGRAMS) for _ in range(SUBMISSIONS)]
+    pool = get_pool()
+    print(f"--- {SUBMISSIONS} submissions, {CONCURRENCY} concurrent, {pool.size} workers, {RUNAWAY_PERCENT:g}% runaway ---")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        results = list(executor.map(timed_run, jobs))
+    elapsed = time.perf_counter() - start
+    normal = sorted(t * 1000 for code, t in results if code != RUNAWAY)
+    p99 = normal[min(len(normal) - 1, int(len(normal) * 0.99))]
+    print(f"throughput      : {SUBMISSIONS / elapsed:7.1f} runs/s")
+    print(f"normal runs p50 : {statistics.median(normal):7.1f} ms")
+    print(f"normal runs p99 : {p99:7.1f} ms")
+    pool.close()
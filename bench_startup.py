@@ -0,0 +1,116 @@
+"""
+Cold-start benchmark: what a redeploy or scale-up costs before the first student can log in.
+
+1. Import time of app.py per module (python -X importtime in a fresh interpreter), and
+   whether the modules that should load on first use (LangGraph, the Gemini SDK, authlib)
+   were imported anyway.
+2. Time from starting `python app.py` (as in the Procfile) to the first 200 from GET /, and
+   to the end of the background warm-up (sandbox workers, tutor graph, LLM client).
+Runs against a temporary database with the mock tutor.
+Usage: python bench_startup.py [runs]
+"""
+import os
+import sys
+import time
+import socket
+import tempfile
+import statistics
+import subprocess
+import threading
+
+import httpx
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+HERE = os.path.dirname(os.path.abspath(__file__))
+OWN_MODULES = sorted(name[:-3] for name in os.listdir(HERE) if name.endswith(".py"))
+LAZY_MODULES = ["langgraph", "langchain_google_genai", "authlib", "langchain_core.language_models"]
+
+def environment():
+    env = os.environ.copy()
+    env.update({"TUTOR_DB": os.path.join(tempfile.mkdtemp(prefix="bench_startup_"), "tutor.sqlite"),
+                "MOCK_LLM": "1", "SESSION_SECRET": "bench-startup", "PYTHONUNBUFFERED": "1"})
+    return env
+
+def import_times():
+    """{module: (self ms, cumulative ms)} for one `import app`, plus the lazy modules that got loaded."""
+    check = f"import sys, app; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", check], cwd=HERE, env=environment(),
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self [us]" not in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = (int(own) / 1000, int(cumulative) / 1000)
+    loaded = [m for m in result.stdout.strip().splitlines()[-1].split(",") if m] if result.stdout.strip() else []
+    return times, loaded
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_to_first_page(timeout=120):
+    """Seconds from starting the server to the first 200 on / and to the end of its warm-up."""
+    port = free_port()
+    env = environment()
+    env["PORT"] = str(port)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=HERE, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True)
+    warmed = threading.Event()
+    warm_up = []
+
+    def watch():
+        for line in process.stdout:
+            if "Warm-up" in line and not warmed.is_set():
+                warm_up.append(time.perf_counter() - start)
+                warmed.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    first_page = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=5).status_code == 200:
+                    first_page = time.perf_counter() - start
+                    break
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        warmed.wait(30)  # servers without a warm-up never report one
+    finally:
+        process.terminate()
+        process.wait()
+    return first_page, warm_up[0] if warm_up else None
+
+def main():
+    times, loaded = import_times()
+    print(f"--- import app: {times['app'][1]:.0f} ms ---")
+    print(f"{'module':<28} | {'self ms':>8} | {'total ms':>8}")
+    for name in OWN_MODULES:
+        if name in times:
+            print(f"{name:<28} | {times[name][0]:8.1f} | {times[name][1]:8.1f}")
+    print("\nLargest third-party packages:")
+    packages = sorted(((cumulative, name) for name, (_, cumulative) in times.items()
+                       if "." not in name and name not in OWN_MODULES), reverse=True)
+    for cumulative, name in packages[:10]:
+        print(f"{name:<28} | {'':>8} | {cumulative:8.1f}")
+    print(f"\nLoaded at import but only needed on first use: {', '.join(loaded) or 'none'}")
+
+    print(f"\n--- python app.py, {RUNS} cold starts ---")
+    pages, warm_ups = [], []
+    for run in range(RUNS):
+        first_page, warm_up = time_to_first_page()
+        print(f"run {run + 1}: first / after {first_page:.2f}s" if first_page else f"run {run + 1}: / never answered",
+              f"warm-up done after {warm_up:.2f}s" if warm_up else "(no warm-up reported)")
+        if first_page:
+            pages.append(first_page)
+        if warm_up:
+            warm_ups.append(warm_up)
+    if pages:
+        print(f"median time to first /: {statistics.median(pages):.2f}s")
+    if warm_ups:
+        print(f"median time to warm:    {statistics.median(warm_ups):.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Time-to-first-token benchmark for the tutor reply, run in local mock mode.
+
+Compares the old blocking path (socratic_agent.invoke) against stream_reply.
+Usage: python bench_streaming.py [turns] [token_delay_seconds]
+"""
+import os
+import sys
+import time
+import statistics
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+os.environ["MOCK_LLM"] = "1"
+os.environ["MOCK_TOKEN_DELAY"] = sys.argv[2] if len(sys.argv) > 2 else "0.02"
+
+from logic import socratic_agent, stream_reply
+from langchain_core.messages import HumanMessage
+
+def make_inputs(turn):
+    history = [HumanMessage(content=f"Student message {i}") for i in range(turn % 5 + 1)]
+    return {"messages": history, "module_name": "The Stadium (I/O)", "goal": "Cricket Game"}
+
+def bench_invoke():
+    times = []
+    for turn in range(TURNS):
+        start = time.perf_counter()
+        socratic_agent.invoke(make_inputs(turn))
+        times.append(time.perf_counter() - start)
+    return times
+
+def bench_stream():
+    first, total = [], []
+    for turn in range(TURNS):
+        start = time.perf_counter()
+        ttft = None
+        for _ in stream_reply(make_inputs(turn)):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        first.append(ttft)
+        total.append(time.perf_counter() - start)
+    return first, total
+
+def ms(values):
+    return f"p50 {statistics.median(values) * 1000:7.1f} ms | max {max(values) * 1000:7.1f} ms"
+
+if __name__ == "__main__":
+    print(f"--- {TURNS} mock turns, {os.environ['MOCK_TOKEN_DELAY']}s per token ---")
+    blocking = bench_invoke()
+    first, total = bench_stream()
+    print(f"invoke  first text : {ms(blocking)}")
+    print(f"stream  first token: {ms(first)}")
+    print(f"stream  full reply : {ms(total)}")
+    print(f"TTFT speed-up      : {statistics.median(blocking) / statistics.median(first):.1f}x")
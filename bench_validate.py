@@ -0,0 +1,54 @@
+"""
+Micro-benchmark: the old substring scan vs AST validation + compile, cold and cached.
+
+The old scan never compiled (exec did that later), so it is measured with a
+compile() added to keep the comparison like for like.
+Usage: python bench_validate.py [repeats]
+"""
+import sys
+import time
+
+from sandbox import prepare_code
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+# Typical submissions across the three projects
+CORPUS = [
+    "print('Welcome to Chinnaswamy')",
+    "team = 'RCB'\nruns = 187\nprint(f'{team} scored {runs}')",
+    "runs = 0\nwickets = 0\nruns = runs + 4\nprint('Score:', runs, '/', wickets)",
+    "ball = 6\nif ball == 6:\n    print('SIX!')\nelif ball == 4:\n    print('FOUR!')\nelse:\n    print('Run it')",
+    "import random\nover = 0\nwhile over < 6:\n    print('Ball', over + 1, ':', random.randint(0, 6))\n    over += 1",
+    "def commentary(runs):\n    if runs == 6:\n        return 'Into the stands!'\n    return f'{runs} runs'\nprint(commentary(6))",
+    "dish = 'Masala Dosa'\nprint(f'<h1>{dish.upper()}</h1>')",
+    "hotels = ['MTR', 'CTR', 'Vidyarthi Bhavan']\nhotels.append('Brahmin\\'s Coffee Bar')\nprint(len(hotels))",
+    "hotel = {'name': 'MTR', 'rating': 4.5, 'area': 'Lalbagh'}\nfor key, value in hotel.items():\n    print(key, '->', value)",
+    "html = ''\nfor h in ['MTR', 'CTR']:\n    html += f'<li>{h}</li>'\nprint(f'<ul>{html}</ul>')",
+    "amount = float('120.50')\nprint(type(amount), amount * 2)",
+    "rows = ['date,item,amount', '01-01,metro,40', '01-01,dosa,60']\nfor row in rows[1:]:\n    print(row.split(','))",
+    "spend = {'metro': 40, 'dosa': 60, 'auto': 120}\ntotal = sum(spend.values())\nprint('Total:', total, 'Average:', total / len(spend))",
+    "menu = ['1. Add', '2. Report', '3. Quit']\nchoice = '3'\nwhile choice != '3':\n    print(menu)\nprint('Bye')",
+    "try:\n    amount = int('abc')\nexcept ValueError:\n    print('Please enter a number')",
+]
+
+def old_scan(code):
+    forbidden = ["import os", "import sys", "import subprocess", "open(", "exec(", "eval("]
+    for term in forbidden:
+        if term in code:
+            return "Security Alert: This sandbox does not allow file/system operations."
+    compile(code, "<string>", "exec")
+
+def per_snippet_us(fn, clear_cache=False):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        if clear_cache:
+            prepare_code.cache_clear()
+        for code in CORPUS:
+            fn(code)
+    return (time.perf_counter() - start) / (REPEATS * len(CORPUS)) * 1e6
+
+if __name__ == "__main__":
+    print(f"--- {len(CORPUS)} student programs x {REPEATS} ---")
+    print(f"string scan + compile     : {per_snippet_us(old_scan):8.1f} us/snippet")
+    print(f"AST validate + compile    : {per_snippet_us(prepare_code, clear_cache=True):8.1f} us/snippet")
+    print(f"AST validate, cache hit   : {per_snippet_us(prepare_code):8.2f} us/snippet")
@@ -0,0 +1,144 @@
+"""
+Fallback tutor check: can a classroom keep progressing with Gemini down?
+
+1. Scripts: every CURRICULUM module has a script in tutor_scripts.json, and playing each step's
+   example answer through the fallback tutor (coding steps run in the real sandbox, sent the way
+   "Run Code" sends them) completes the module, while a wrong answer gets a hint and the same
+   question again.
+2. Outage: simulated students chat through aguarded_reply against an LLM that fails every call.
+   The circuit breaker should open after a handful of errors (turns already waiting on Gemini
+   still fail over one by one), after which turns are answered by the scripted tutor at local
+   latency and every student still completes their module. Gemini then comes back
+   and the first probe after the cooldown closes the breaker.
+Usage: python check_fallback.py [students]
+"""
+import io
+import os
+import sys
+import time
+import contextlib
+import asyncio
+import statistics
+
+STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+os.environ["MOCK_LLM"] = "1"
+os.environ["LLM_BREAKER_COOLDOWN"] = "1"
+os.environ.setdefault("LLM_GLOBAL_RPM", "0")
+os.environ.setdefault("LLM_USER_RPM", "0")
+
+from langchain_core.messages import HumanMessage, AIMessage  # noqa: E402
+
+import logic  # noqa: E402
+from logic import aguarded_reply, MockTutorLLM  # noqa: E402
+from curriculum import CURRICULUM  # noqa: E402
+from fallback_tutor import get_scripts, scripted_reply  # noqa: E402
+from sandbox import execute_cell  # noqa: E402
+
+FAILURE_DELAY = 0.3  # how long the failing LLM takes to return its error
+ARRIVAL_SPREAD = 2.0  # seconds over which the class starts, as when students log in one by one
+
+class DownLLM(MockTutorLLM):
+    """Gemini during an outage: every call fails after FAILURE_DELAY seconds."""
+    calls: int = 0
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(FAILURE_DELAY)
+        raise RuntimeError("503 UNAVAILABLE: The model is overloaded.")
+        yield  # an async generator that never yields
+
+def run_message(code, key):
+    """The chat message run_code_and_chat sends after running `code` in the sandbox."""
+    output = execute_cell(key, code)
+    return f"I ran this code:\n```python\n{code}\n```\nOutput:\n```\n{output}\n```"
+
+def is_code(step):
+    """Coding steps are answered with a sandbox run; the rest in chat."""
+    return (bool(step.outputs or step.code) and not step.answers) or "\n" in step.example or "print(" in step.example
+
+def play_module(goal, module):
+    """Walk one module with a wrong answer and then the example at every step; returns a problem or None."""
+    intro, steps = get_scripts()[module]
+    messages = [AIMessage(content=scripted_reply([], goal, module))]
+    for number, step in enumerate(steps, 1):
+        if not messages[-1].content.endswith(step.cue):
+            return f"step {number} was never asked"
+        messages += [HumanMessage(content="no idea"), AIMessage(content=scripted_reply(messages + [HumanMessage(content="no idea")], goal, module))]
+        if not messages[-1].content.endswith(step.cue):
+            return f"step {number}: a wrong answer moved the dialogue on"
+        answer = run_message(step.example, ("check_fallback", module)) if is_code(step) else step.example
+        messages.append(HumanMessage(content=answer))
+        messages.append(AIMessage(content=scripted_reply(messages, goal, module)))
+        if messages[-1].content.endswith(step.cue):
+            return f"step {number}: the example answer was not accepted: {answer!r}"
+    if not messages[-1].content.endswith("[MODULE_COMPLETE]"):
+        return "the last step didn't complete the module"
+    return None
+
+def check_scripts():
+    print("--- scripts ---")
+    problems = 0
+    for goal, modules in CURRICULUM.items():
+        for module in modules:
+            if module not in get_scripts():
+                problem = "no script"
+            else:
+                problem = play_module(goal, module)
+            problems += problem is not None
+            print(f"{'✅' if problem is None else '❌'} {module}" + (f": {problem}" if problem else ""))
+    return problems == 0
+
+async def classroom_turn(student, goal, module, messages, latencies):
+    start = time.perf_counter()
+    text = ""
+    async for kind, value in aguarded_reply({"messages": messages, "module_name": module, "goal": goal}, student):
+        if kind == "text":
+            text += value
+    latencies.append(time.perf_counter() - start)
+    return text
+
+async def classroom_student(i, latencies, completed):
+    """One student answering the first module of a goal with the scripted examples."""
+    await asyncio.sleep(ARRIVAL_SPREAD * i / STUDENTS)
+    goal = list(CURRICULUM)[i % len(CURRICULUM)]
+    module = CURRICULUM[goal][0]
+    _, steps = get_scripts()[module]
+    messages = [HumanMessage(content=f"Starting {goal}, module {module}")]
+    messages.append(AIMessage(content=await classroom_turn(f"student{i}", goal, module, messages, latencies)))
+    for step in steps:
+        answer = run_message(step.example, (f"student{i}", goal)) if is_code(step) else step.example
+        messages.append(HumanMessage(content=answer))
+        reply = await classroom_turn(f"student{i}", goal, module, messages, latencies)
+        messages.append(AIMessage(content=reply))
+        if "[MODULE_COMPLETE]" in reply:
+            completed.append(i)
+            return
+
+async def check_outage():
+    print(f"\n--- outage: {STUDENTS} students, every LLM call fails after {FAILURE_DELAY}s ---")
+    down = DownLLM()
+    logic.set_llm(down)
+    latencies, completed = [], []
+    with contextlib.redirect_stdout(io.StringIO()):  # one "API ERROR" line per failed call
+        await asyncio.gather(*(classroom_student(i, latencies, completed) for i in range(STUDENTS)))
+    local = sorted(latencies)[:len(latencies) - down.calls]
+    print(f"{len(latencies)} turns, {down.calls} reached the failing LLM, breaker: {dict(logic.BREAKER.stats)}")
+    print(f"turn latency: median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"without the calls that hit the LLM median {statistics.median(local) * 1000:.1f} ms")
+    print(f"modules completed during the outage: {len(completed)}/{STUDENTS}")
+
+    print("\n--- recovery: Gemini is back ---")
+    logic.set_llm(None)  # MOCK_LLM=1: the mock tutor answers
+    await asyncio.sleep(logic.BREAKER.cooldown)
+    text = await classroom_turn("student0", "Cricket Game", "The Stadium (I/O)", [HumanMessage(content="How do I print?")], [])
+    print(f"breaker {logic.BREAKER.state} after the probe; reply from {'the mock tutor' if text in str(logic.MOCK_RESPONSES) else 'the scripted tutor'}")
+    return len(completed) == STUDENTS and down.calls < len(latencies) / 4 and logic.BREAKER.state == "closed"
+
+def main():
+    scripts_ok = check_scripts()
+    outage_ok = asyncio.run(check_outage())
+    print("\nPASS" if scripts_ok and outage_ok else "\nFAIL")
+    return scripts_ok and outage_ok
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
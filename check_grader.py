@@ -0,0 +1,75 @@
+"""
+Local grader check: does every exercise in exercise_checks.json grade the way it claims?
+
+Each exercise's example and mistakes run in the real sandbox (streamed, as "Run Code" runs
+them) after the tutor asked its question. The example must get the praise and every mistake a
+hint, without the LLM. The same example after an unrelated question, and with a NameError
+appended, must be left to the tutor. Also reports the share of runs graded locally, the LLM
+calls saved and what grading adds to a run.
+Usage: python check_grader.py
+"""
+import sys
+import time
+import asyncio
+import statistics
+
+from grader import agrade_run, get_checks, GRADER_STATS
+from curriculum import CURRICULUM
+from sandbox import astream_cell, areset_session, get_pool
+
+UNRELATED = "What did you find most surprising about that?"
+
+async def run(key, module, code, question, timings):
+    """Run `code` like run_code_and_chat does and return the grader's reply (None: the tutor's turn)."""
+    await areset_session(key)
+    async for output, completed in astream_cell(key, code):
+        pass
+    start = time.perf_counter()
+    reply = await agrade_run(key, module, code, output, [{"role": "assistant", "content": question}]) if completed else None
+    timings.append(time.perf_counter() - start)
+    return reply
+
+async def check_exercise(module, exercise, timings):
+    """Problems found with one exercise, as a list of strings."""
+    key = ("check_grader", module, exercise.name)
+    problems = []
+    reply = await run(key, module, exercise.example, exercise.question, timings)
+    if reply is None or not reply.startswith("✅"):
+        problems.append(f"the example was not passed: {reply!r}")
+    for mistake in exercise.mistakes:
+        reply = await run(key, module, mistake, exercise.question, timings)
+        if reply is None or not reply.startswith("🧪"):
+            problems.append(f"a mistake was not caught: {mistake!r} -> {reply!r}")
+    if exercise.asked and await run(key, module, exercise.example, UNRELATED, timings) is not None:
+        problems.append("graded after an unrelated question")
+    if await run(key, module, exercise.example + "\nprint(undefined_name)", exercise.question, timings) is not None:
+        problems.append("graded a run that ended in a NameError")
+    await areset_session(key)
+    return problems
+
+async def main():
+    checks = get_checks()
+    problems = 0
+    timings = []
+    for goal, modules in CURRICULUM.items():
+        for module in modules:
+            if module not in checks:
+                print(f"❌ {module}: not in exercise_checks.json")
+                problems += 1
+                continue
+            if not checks[module]:
+                print(f"➖ {module}: no exercises, every run goes to the tutor")
+            for exercise in checks[module]:
+                found = await check_exercise(module, exercise, timings)
+                problems += len(found)
+                print(f"{'✅' if not found else '❌'} {module}: {exercise.name}" + "".join(f"\n    {p}" for p in found))
+    runs = sum(GRADER_STATS.values())
+    local = GRADER_STATS["pass"] + GRADER_STATS["fail"]
+    print(f"\n{runs} runs: {dict(GRADER_STATS)}, {local / max(runs, 1):.0%} graded locally, {local} LLM calls saved")
+    print(f"grading time per run: median {statistics.median(timings) * 1000:.2f} ms, max {max(timings) * 1000:.1f} ms")
+    get_pool().close()
+    print("\nPASS" if problems == 0 else f"\nFAIL ({problems} problems)")
+    return problems == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
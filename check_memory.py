@@ -0,0 +1,86 @@
+"""
+Conversation memory check: do facts from early turns survive the memory window?
+
+A student states a few facts in their first turn, then chats on for many turns, one graph
+run per turn the way the app sends them (only the last TRANSCRIPT_PAGE messages when paging).
+Once the first turn has left the window, the teacher's prompt should still carry those facts
+in the running notes, the notes should be condensed about once every MEMORY_FOLD_TURNS turns
+(not on every turn). A failing summarizer falls back to one line per message, counts against
+the circuit breaker like any LLM error and stops being called once it opens.
+Usage: python check_memory.py [turns]
+"""
+import os
+import sys
+import asyncio
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+os.environ["MOCK_LLM"] = "1"
+
+from langchain_core.messages import HumanMessage, AIMessage  # noqa: E402
+
+import logic  # noqa: E402
+from logic import MockTutorLLM, SUMMARY_INSTRUCTIONS  # noqa: E402
+
+FACTS = ["Bangalore Blasters", "47"]
+FIRST_TURN = "Hi! My team is called the Bangalore Blasters and my lucky number is 47, can we use them in the game?"
+TRANSCRIPT_PAGE = 40  # what the app restores of a student's history
+
+class RecordingLLM(MockTutorLLM):
+    """Mock tutor that remembers the teacher's last system prompt and counts summarizer calls."""
+    summaries: int = 0
+    fail_summaries: bool = False
+    last_system: str = ""
+
+    def _reply(self, messages):
+        system_text = messages[0].content
+        if system_text.startswith(SUMMARY_INSTRUCTIONS[:40]):
+            self.summaries += 1
+            if self.fail_summaries:
+                raise RuntimeError("503 UNAVAILABLE: The model is overloaded.")
+        else:
+            self.last_system = system_text
+        return super()._reply(messages)
+
+def play(student, turns, page=None, run=None, **llm):
+    """Chat `turns` turns as `student`; returns the LLM with the last teacher prompt."""
+    logic.SUMMARY_CACHE.clear()
+    llm = RecordingLLM(**llm)
+    logic.set_llm(llm)
+    history = []
+    for i in range(turns):
+        text = FIRST_TURN if i == 0 else f"Turn {i}: I tried print('score', {i}) and it printed the wrong total, why?"
+        history.append(HumanMessage(content=text))
+        inputs = {"messages": history[-page:] if page else list(history), "student": student,
+                  "module_name": "The Scoreboard (Variables)", "goal": "Cricket Game"}
+        result = (run or logic.socratic_agent.invoke)(inputs)
+        history.append(AIMessage(content=result["messages"][-1].content))
+    return llm
+
+def check(name, llm, max_summaries):
+    problems = []
+    if not all(fact in llm.last_system.split("EARLIER IN THIS SESSION")[-1] for fact in FACTS):
+        problems.append("facts from turn 0 lost")
+    if llm.summaries > max_summaries:
+        problems.append(f"{llm.summaries} summarizer calls (expected at most {max_summaries})")
+    print(f"{'PASS' if not problems else 'FAIL'}  {name}: {llm.summaries} summarizer calls"
+          + (f" — {'; '.join(problems)}" if problems else ""))
+    return not problems
+
+def main():
+    folds = max(TURNS - logic.MEMORY_WINDOW_TURNS, 0) // logic.MEMORY_FOLD_TURNS
+    ok = check("full history", play("asha", TURNS), max_summaries=folds)
+    ok &= check(f"last {TRANSCRIPT_PAGE} messages per turn", play("ravi", TURNS, page=TRANSCRIPT_PAGE), max_summaries=folds)
+    ok &= check("async graph", play("meera", TURNS, page=TRANSCRIPT_PAGE,
+                                    run=lambda inputs: asyncio.run(logic.socratic_agent.ainvoke(inputs))), max_summaries=folds)
+    # With the summarizer down every turn is still answered (by the scripted tutor once the
+    # breaker opens) and it costs no more calls than a healthy session
+    llm = play("kiran", TURNS, page=TRANSCRIPT_PAGE, fail_summaries=True)
+    failing_ok = llm.summaries <= folds and logic.BREAKER.state != "closed"
+    print(f"{'PASS' if failing_ok else 'FAIL'}  summarizer failing: {llm.summaries} summarizer calls"
+          f" (at most {folds}), breaker {logic.BREAKER.state}")
+    ok &= failing_ok
+    print("\n✅ Early facts survive the memory window" if ok else "\n❌ Memory check failed")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
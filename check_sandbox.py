@@ -0,0 +1,115 @@
+"""
+Sandbox security check: known escapes must be stopped.
+
+Each escape below once reached (or would reach) the worker's own frames, its pipe to the web
+server or the host. The AST check must reject every one of them before it runs. Then code
+that skips the AST check altogether runs in a worker, to show the OS-level limits still hold
+and that a worker it takes over can't run code in the web server, and a few things students do must still work without showing the sandbox's own code.
+Usage: python check_sandbox.py
+"""
+import io
+import sys
+import marshal
+import contextlib
+
+from sandbox import prepare_code, execute_code_safely, get_pool, Worker
+
+# (what it tries, code): all of these must come back as a Security Alert
+REJECTED = [
+    ("str.format reads attributes by name", "print('{0.__class__}'.format(1))"),
+    ("string.Formatter.get_field reads attributes by name",
+     "import string\nprint(string.Formatter().get_field('0.__class__', [1], {}))"),
+    ("get_field without importing string", "f = None\nprint(f.get_field('0.__class__', [1], {}))"),
+    ("case pattern reads __traceback__",
+     "try:\n    1/0\nexcept Exception as e:\n    match e:\n        case object(__traceback__=tb):\n            print(tb)"),
+    ("case pattern walks frames",
+     "match x:\n    case object(tb_frame=f):\n        match f:\n            case object(f_back=b):\n                print(b)"),
+]
+
+# Runs unvalidated in a worker, as if it had got past the AST check: every attempt must be refused
+CONFINED = """
+b = print.__self__
+os = b.__import__("os")
+for name, attempt in [("open() of a new file", lambda: b.open("new_file.txt", "w")),
+                      ("a new file descriptor", lambda: os.dup(0)), ("a pipe", lambda: os.pipe()),
+                      ("a new process", lambda: os.fork())]:
+    try:
+        attempt()
+        print("ALLOWED", name)
+    except b.OSError as e:
+        print("refused", name, e.errno)
+"""
+
+# A worker taken over by student code writes to its pipe directly. None of these may reach the
+# web server: a pickle that calls print() there, nesting too deep to decode, a reply too long to
+# read, and JSON of the wrong shape
+HIJACK = """
+sys = print.__self__.__import__("sys")
+conn = sys._getframe(2).f_locals["conn"]
+class Payload:
+    def __reduce__(self):
+        return (print, ("HIJACKED the web server",))
+"""
+HIJACK_SENDS = [("a pickle", "conn.send(Payload())"), ("deep nesting", "conn.send_bytes(b'[' * 100000)"),
+                ("a huge reply", "conn.send_bytes(b' ' * 10**7)"), ("a reply of the wrong shape", "conn.send_bytes(b'{}')")]
+
+def check_hijacked():
+    """Problems found when a worker sends the web server things no honest worker sends."""
+    problems = 0
+    for name, send in HIJACK_SENDS:
+        worker = Worker()
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            output = worker.call("exec", marshal.dumps(compile(HIJACK + send, "<string>", "exec")))
+        if worker.alive:
+            worker.kill()
+        ok = output.startswith("💥") and not printed.getvalue()
+        problems += not ok
+        print(f"{'✅' if ok else '❌'} hijacked worker sends {name}: {'dropped' if ok else repr(printed.getvalue() or output)}")
+    return problems
+
+# (what a student does, code, text the output must contain)
+ALLOWED = [
+    ("datetime.strptime", "import datetime\nprint(datetime.datetime.strptime('2024-01-02', '%Y-%m-%d').day)", "2"),
+    ("time.strptime", "import time\nprint(time.strptime('2024', '%Y').tm_year)", "2024"),
+    ("an error traceback", "import datetime\ndatetime.datetime.strptime('soon', '%Y')", "ValueError: time data 'soon'"),
+]
+
+def check_allowed():
+    """Problems found running ALLOWED through the pool."""
+    problems = 0
+    for name, code, expected in ALLOWED:
+        output = execute_code_safely(code)
+        ok = expected in output and "sandbox.py" not in output
+        problems += not ok
+        print(f"{'✅' if ok else '❌'} works: {name}" + ("" if ok else f"\n    got {output!r}"))
+    get_pool().close()
+    return problems
+
+def check_confined():
+    """Problems found running CONFINED in a real worker."""
+    worker = Worker()
+    try:
+        output = worker.call("exec", marshal.dumps(compile(CONFINED, "<string>", "exec")))
+    finally:
+        worker.kill()
+    lines = output.strip().splitlines()
+    for line in lines:
+        print(f"{'✅' if line.startswith('refused') else '❌'} worker: {line}")
+    return sum(not line.startswith("refused") for line in lines) + (len(lines) != 4)
+
+def main():
+    problems = 0
+    for name, code in REJECTED:
+        _, error = prepare_code(code)
+        ok = bool(error) and error.startswith("Security Alert")
+        problems += not ok
+        print(f"{'✅' if ok else '❌'} rejected: {name}" + ("" if ok else f"\n    got {error!r}"))
+    problems += check_confined()
+    problems += check_hijacked()
+    problems += check_allowed()
+    print("\nPASS" if problems == 0 else f"\nFAIL ({problems} problems)")
+    return problems == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
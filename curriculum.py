@@ -0,0 +1,39 @@
+# --- CURRICULUM ---
+# Each goal is six modules; each module declares the XP it earns towards the skill bars
+# on the Vision tab (a bar is full at 100). The weights are the ones the old keyword scan
+# gave, except Hotel Cards, whose "Dictionaries" never matched the "dictionary" keyword.
+SKILLS = ("Logic", "Frontend", "Database")
+
+COURSES = {
+    "Cricket Game": [
+        ("The Stadium (I/O)", {"Frontend": 20}),
+        ("The Scoreboard (Variables)", {"Database": 20}),
+        ("The Umpire (Conditionals)", {"Logic": 20}),
+        ("The Over (Loops)", {"Logic": 20}),
+        ("The Commentary (Functions)", {}),
+        ("Match Recap (Git)", {}),
+    ],
+    "Food Blog": [
+        ("The Menu (Strings)", {"Frontend": 20}),
+        ("The Foodies List (Lists)", {"Database": 20}),
+        ("Hotel Cards (Dictionaries)", {"Database": 20}),
+        ("The Generator (Loops)", {"Logic": 20}),
+        ("Go Live (File I/O)", {}),
+        ("Cloud Launch (Infra)", {}),
+    ],
+    "Expense Tracker": [
+        ("The Wallet (Data Types)", {"Database": 20}),
+        ("Daily Ledger (CSV)", {"Database": 20}),
+        ("App Menu (Flow)", {"Frontend": 20}),
+        ("The Auditor (Logic)", {"Logic": 20}),
+        ("The Workshop (Infra)", {}),
+        ("Portfolio (Final)", {}),
+    ],
+}
+
+CURRICULUM = {goal: [name for name, _ in modules] for goal, modules in COURSES.items()}
+MODULE_GOALS = {name: goal for goal, modules in CURRICULUM.items() for name in modules}
+
+# Skill index: module name -> XP per skill, in SKILLS order, so scoring is one dict lookup per module
+SKILL_INDEX = {name: tuple(weights.get(skill, 0) for skill in SKILLS)
+               for modules in COURSES.values() for name, weights in modules}
@@ -0,0 +1,53 @@
+import os
+import gradio as gr
+from datetime import datetime
+from curriculum import CURRICULUM
+
+# Signed-in emails (comma-separated) that see the class dashboard, e.g. TEACHERS=asha@school.in,ravi@school.in.
+# Locally, TEACHERS=local-dev shows it to the development login.
+TEACHERS = {email.strip() for email in os.environ.get("TEACHERS", "").split(",") if email.strip()}
+
+def is_teacher(user):
+    return bool(user) and user in TEACHERS
+
+def _rate(completed, reached):
+    return f"{min(completed / reached, 1):.0%}" if reached else "–"
+
+def _number(value):
+    return "–" if value is None else f"{value:g}"
+
+def _since(timestamp):
+    try:
+        hours = (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds() / 3600
+    except (TypeError, ValueError):
+        return "?"
+    return f"{hours * 60:.0f} min" if hours < 1 else f"{hours:.0f} h" if hours < 48 else f"{hours / 24:.0f} days"
+
+def dashboard_markdown(stats):
+    """The class dashboard from database.class_dashboard(): one table row per module, then the stuck students."""
+    lines = ["### 📊 Module Progress",
+             "| Project | Module | Reached | Completed | Completion rate | Median steps | Median efficiency |",
+             "|---|---|---:|---:|---:|---:|---:|"]
+    for goal, modules in CURRICULUM.items():
+        for module in modules:
+            row = stats["modules"].get((goal, module))
+            if row is None:
+                lines.append(f"| {goal} | {module} | 0 | 0 | – | – | – |")
+                continue
+            lines.append(f"| {goal} | {module} | {row['reached']} | {row['completed']} | {_rate(row['completed'], row['reached'])} "
+                         f"| {_number(row['median_steps'])} | {_number(row['median_efficiency'])} |")
+    lines.append("\n### 🆘 Students Who May Be Stuck")
+    if not stats["stuck"]:
+        lines.append("Nobody has spent an unusual number of turns on one module. 🎉")
+    else:
+        lines += ["| Student | Project | Module | Turns on module | On it for |", "|---|---|---|---:|---:|"]
+        for s in stats["stuck"]:
+            lines.append(f"| {s['student']} | {s['goal']} | {s['module']} | {s['turns']} | {_since(s['since'])} |")
+    return "\n".join(lines)
+
+def get_dashboard_tab():
+    with gr.TabItem("📊 Class Dashboard", visible=False) as tab:
+        gr.Markdown("Completion and effort per module across the whole class. Steps are the turns a student took to finish a module; efficiency is the score they earned for it.")
+        btn_refresh = gr.Button("🔄 Refresh", size="sm")
+        board = gr.Markdown("Loading...")
+    return tab, btn_refresh, board
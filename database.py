@@ -1,149 +1,922 @@
 import sqlite3
 import hashlib
 import os
+import sys
 import json
-from datetime import datetime
+import time
+import zlib
+import queue
+import asyncio
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import metrics
+from metrics import timed
 
 # Determine DB Path (Hugging Face Spaces often needs /tmp or a specific data dir)
-DB_NAME = "tutor_db.sqlite"
-if not os.access(".", os.W_OK):
+DB_NAME = os.environ.get("TUTOR_DB", "tutor_db.sqlite")
+if "TUTOR_DB" not in os.environ and not os.access(".", os.W_OK):
     DB_NAME = "/tmp/tutor_db.sqlite"
 
+# DATABASE_URL=postgresql://... keeps users, progress and conversations in a Postgres shared by
+# every worker and node; without it everything lives in the SQLite file DB_NAME (one machine)
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+POSTGRES = DATABASE_URL.startswith(("postgres://", "postgresql://"))
+if POSTGRES:
+    try:
+        import psycopg2
+        import psycopg2.pool
+    except ImportError as e:
+        # psycopg2-binary is in requirements.txt, but SQLite-only installs may leave it out
+        raise ImportError("DATABASE_URL points at Postgres, which needs psycopg2: pip install psycopg2-binary") from e
+    IntegrityError = psycopg2.IntegrityError
+else:
+    IntegrityError = sqlite3.IntegrityError
+
+DB_READERS = int(os.environ.get("DB_READERS", 8))
+DB_WRITE_BATCH = int(os.environ.get("DB_WRITE_BATCH", 64))
+PROGRESS_CACHE_SIZE = int(os.environ.get("PROGRESS_CACHE_SIZE", 4096))
+# Another worker may save progress behind this process's back, so cached snapshots expire
+# when the app is scaled out (0 = keep until this process invalidates them)
+SCALED_OUT = POSTGRES or int(os.environ.get("WEB_CONCURRENCY", 1)) > 1
+PROGRESS_CACHE_TTL = float(os.environ.get("PROGRESS_CACHE_TTL", 5 if SCALED_OUT else 0))
+SANDBOX_REPLAY_CELLS = int(os.environ.get("SANDBOX_REPLAY_CELLS", 20))  # cells kept per student and goal
+TRANSCRIPT_PAGE = int(os.environ.get("TRANSCRIPT_PAGE", 40))                # messages restored into the chat
+TRANSCRIPT_COMPACT_DAYS = float(os.environ.get("TRANSCRIPT_COMPACT_DAYS", 7))  # idle modules older than this get compressed
+STUCK_TURNS = int(os.environ.get("STUCK_TURNS", 15))  # turns on one module before the dashboard lists a student as stuck
+STUCK_LIMIT = int(os.environ.get("STUCK_LIMIT", 20))  # stuck students listed, most turns first
+BLOB = "BYTEA" if POSTGRES else "BLOB"
+
+# Round trips by kind ("read", "write") plus progress cache "hit"/"miss", for benchmarks and checks.
+# Contention: "read_waits" (all pooled readers busy), "write_wait_ms" (time queued behind the writer),
+# "locked" (SQLite busy errors).
+DB_STATS = Counter()
+DB_SECONDS = metrics.histogram("tutor_db_seconds", "Duration of database.py calls, by function", ("fn",))
+DB_ERRORS = metrics.counter("tutor_db_errors_total", "database.py calls that raised, by function", ("fn",))
+metrics.gauge("tutor_db_events_total", "Round trips, cache hits/misses and contention counters (write_wait_ms is cumulative ms)",
+              lambda: dict(DB_STATS), label="kind", kind="counter")
+
+# Statements are module constants so each pooled connection's statement cache reuses them.
+# They stick to SQL that SQLite and Postgres both accept (ON CONFLICT, not INSERT OR ...).
+SELECT_PASSWORD = "SELECT password_hash FROM users WHERE username=?"
+INSERT_USER = "INSERT INTO users VALUES (?, ?, ?)"
+INSERT_USER_IF_MISSING = "INSERT INTO users VALUES (?, ?, ?) ON CONFLICT (username) DO NOTHING"
+# One round trip answers "does this user exist?" and "where are they?" for a page load
+SELECT_SNAPSHOT = '''SELECT EXISTS(SELECT 1 FROM users WHERE username = k.username),
+                            p.current_goal, p.current_module, c.goal, c.module, c.steps, c.completed_at, c.efficiency_score
+                     FROM (SELECT CAST(? AS TEXT) AS username) k
+                     LEFT JOIN progress p ON p.username = k.username
+                     LEFT JOIN completions c ON c.username = k.username'''
+UPSERT_PROGRESS = '''INSERT INTO progress (username, current_goal, current_module, last_updated)
+                     VALUES (?, ?, ?, ?)
+                     ON CONFLICT(username) DO UPDATE SET current_goal=excluded.current_goal,
+                         current_module=excluded.current_module, last_updated=excluded.last_updated'''
+INSERT_COMPLETION = '''INSERT INTO completions (username, goal, module, steps, completed_at, efficiency_score)
+                       VALUES (?, ?, ?, ?, ?, ?)'''
+UPSERT_COMPLETION = INSERT_COMPLETION + '''
+                       ON CONFLICT (username, goal, module) DO UPDATE SET steps=excluded.steps,
+                           completed_at=excluded.completed_at, efficiency_score=excluded.efficiency_score'''
+INSERT_LEGACY_COMPLETION = INSERT_COMPLETION + " ON CONFLICT (username, goal, module) DO NOTHING"
+# The chat a student is in is whichever conversation they touched last
+UPSERT_CONVERSATION = '''INSERT INTO conversations (student, goal, module, updated_at)
+                         VALUES (?, ?, ?, ?)
+                         ON CONFLICT (student, goal) DO UPDATE SET module=excluded.module,
+                             updated_at=excluded.updated_at'''
+SELECT_CONVERSATION = '''SELECT goal, module FROM conversations WHERE student=?
+                         ORDER BY updated_at DESC LIMIT 1'''
+SELECT_GOAL_CONVERSATION = "SELECT goal, module FROM conversations WHERE student=? AND goal=?"
+# Transcript rows are appended with the next sequence number for the student's goal. Concurrent
+# writers (the Postgres pool) must hold the conversation row first: see _record_turn.
+APPEND_TRANSCRIPT = '''INSERT INTO transcripts (student, goal, module, seq, first_seq, created_at, codec, body)
+                       SELECT ?, ?, ?, COALESCE(MAX(seq), 0) + 1, COALESCE(MAX(seq), 0) + 1, ?, 'json', ?
+                       FROM transcripts WHERE student=? AND goal=?'''
+SELECT_TRANSCRIPT = '''SELECT seq, codec, body FROM transcripts WHERE student=? AND goal=? AND seq < ?
+                       ORDER BY seq DESC LIMIT ?'''
+SELECT_MODULE_TRANSCRIPT = '''SELECT seq, codec, body FROM transcripts WHERE student=? AND goal=? AND module=? AND seq < ?
+                              ORDER BY seq DESC LIMIT ?'''
+SELECT_MODULE_BODIES = "SELECT codec, body FROM transcripts WHERE student=? AND goal=? AND module=?"
+SELECT_IDLE_MODULES = '''SELECT student, goal, module FROM transcripts WHERE codec='json'
+                         GROUP BY student, goal, module HAVING MAX(created_at) < ? AND COUNT(*) > 1 LIMIT ?'''
+SELECT_TURNS = '''SELECT seq, created_at, body FROM transcripts
+                  WHERE student=? AND goal=? AND module=? AND codec='json' AND created_at < ? ORDER BY seq'''
+DELETE_TURNS = '''DELETE FROM transcripts WHERE student=? AND goal=? AND module=? AND codec='json'
+                  AND seq BETWEEN ? AND ?'''
+INSERT_COMPACTED = '''INSERT INTO transcripts (student, goal, module, seq, first_seq, created_at, codec, body)
+                      VALUES (?, ?, ?, ?, ?, ?, 'zlib', ?)'''
+INSERT_CELL = "INSERT INTO sandbox_cells (student, goal, ran_at, code) VALUES (?, ?, ?, ?)"
+# Keep only the newest SANDBOX_REPLAY_CELLS (the subquery is NULL, deleting nothing, until there are more)
+PRUNE_CELLS = '''DELETE FROM sandbox_cells WHERE student=? AND goal=? AND ran_at <
+                     (SELECT ran_at FROM sandbox_cells WHERE student=? AND goal=? ORDER BY ran_at DESC LIMIT 1 OFFSET ?)'''
+SELECT_CELLS = "SELECT code FROM sandbox_cells WHERE student=? AND goal=? ORDER BY ran_at"
+DELETE_CELLS = "DELETE FROM sandbox_cells WHERE student=? AND goal=?"
+# Class aggregates, updated in the same transaction as the completion or turn that changes them
+SELECT_COMPLETION = "SELECT steps, efficiency_score FROM completions WHERE username=? AND goal=? AND module=?"
+COUNT_REACHED = '''INSERT INTO module_stats (goal, module, reached, completed) VALUES (?, ?, 1, 0)
+                   ON CONFLICT (goal, module) DO UPDATE SET reached = module_stats.reached + 1'''
+COUNT_COMPLETED = '''INSERT INTO module_stats (goal, module, reached, completed) VALUES (?, ?, 0, 1)
+                     ON CONFLICT (goal, module) DO UPDATE SET completed = module_stats.completed + 1'''
+ADD_STEPS = '''INSERT INTO module_steps (goal, module, steps, efficiency_score, students) VALUES (?, ?, ?, ?, 1)
+               ON CONFLICT (goal, module, steps, efficiency_score) DO UPDATE SET students = module_steps.students + 1'''
+REMOVE_STEPS = '''UPDATE module_steps SET students = students - 1
+                  WHERE goal=? AND module=? AND steps=? AND efficiency_score=?'''
+# Only signed-in students are tracked (guests never save completions). The row only changes
+# when the student arrives on another module, so rowcount tells whether they just reached it.
+MOVE_STUDENT = '''INSERT INTO student_modules (student, goal, module, since, turns)
+                  SELECT ?, ?, ?, ?, 0 WHERE EXISTS (SELECT 1 FROM users WHERE username=?)
+                  ON CONFLICT (student, goal) DO UPDATE SET module=excluded.module, since=excluded.since, turns=0
+                      WHERE student_modules.module <> excluded.module'''
+COUNT_TURN = "UPDATE student_modules SET turns = turns + 1 WHERE student=? AND goal=? AND module=?"
+SELECT_MODULE_STATS = "SELECT goal, module, reached, completed FROM module_stats"
+SELECT_MODULE_STEPS = "SELECT goal, module, steps, efficiency_score, students FROM module_steps WHERE students > 0"
+SELECT_STUCK = '''SELECT s.student, s.goal, s.module, s.since, s.turns FROM student_modules s
+                  WHERE s.turns >= ? AND NOT EXISTS (SELECT 1 FROM completions c
+                      WHERE c.username = s.student AND c.goal = s.goal AND c.module = s.module)
+                  ORDER BY s.turns DESC LIMIT ?'''
+
+def connect(**kwargs):
+    conn = sqlite3.connect(DB_NAME, timeout=30, cached_statements=256, check_same_thread=False, **kwargs)
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, far fewer fsyncs
+    return conn
+
 def init_db():
-    """Initialize the database with users and progress tables."""
-    conn = sqlite3.connect(DB_NAME)
+    """Initialize the database with users, progress and conversation tables."""
+    if POSTGRES:
+        conn = psycopg2.connect(DATABASE_URL)
+    else:
+        conn = connect()
+        # WAL lets page loads keep reading while the writer commits
+        conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
-    
+
     # User Table
     c.execute('''CREATE TABLE IF NOT EXISTS users
                  (username TEXT PRIMARY KEY, password_hash TEXT, created_at TEXT)''')
-    
+
     # Progress Table
     c.execute('''CREATE TABLE IF NOT EXISTS progress
-                 (username TEXT PRIMARY KEY, 
-                  current_goal TEXT, 
-                  current_module TEXT, 
+                 (username TEXT PRIMARY KEY,
+                  current_goal TEXT,
+                  current_module TEXT,
                   completed_modules TEXT,
                   last_updated TEXT)''')
-    
+
+    # Completions Table: one row per finished module (completed_modules above is legacy, see migrate_progress)
+    c.execute('''CREATE TABLE IF NOT EXISTS completions
+                 (username TEXT,
+                  goal TEXT,
+                  module TEXT,
+                  steps INTEGER,
+                  completed_at TEXT,
+                  efficiency_score INTEGER,
+                  PRIMARY KEY (username, goal, module))''')
+    # The primary key already serves lookups by username; analytics group by goal
+    c.execute("CREATE INDEX IF NOT EXISTS idx_completions_goal ON completions (goal, module)")
+
+    # Conversations Table: the current module per student (username, or browser session for
+    # guests) and goal, so any worker can pick up the next message
+    c.execute('''CREATE TABLE IF NOT EXISTS conversations
+                 (student TEXT,
+                  goal TEXT,
+                  module TEXT,
+                  updated_at TEXT,
+                  PRIMARY KEY (student, goal))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_conversations_recent ON conversations (student, updated_at)")
+
+    # Transcripts Table: append-only chat, one row per turn ('json'), until an idle module's
+    # turns are compacted into a single compressed row ('zlib') covering seqs first_seq..seq
+    c.execute(f'''CREATE TABLE IF NOT EXISTS transcripts
+                  (student TEXT,
+                   goal TEXT,
+                   module TEXT,
+                   seq INTEGER,
+                   first_seq INTEGER,
+                   created_at TEXT,
+                   codec TEXT,
+                   body {BLOB},
+                   PRIMARY KEY (student, goal, seq))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_module ON transcripts (student, goal, module, seq)")
+
+    # Sandbox Cells Table: recent "Run Code" cells, replayed when a student's REPL moves to another worker
+    c.execute('''CREATE TABLE IF NOT EXISTS sandbox_cells
+                 (student TEXT,
+                  goal TEXT,
+                  ran_at TEXT,
+                  code TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sandbox_cells ON sandbox_cells (student, goal, ran_at)")
+
+    # Class aggregates for the teacher dashboard, kept up to date with every completion and turn
+    # so the dashboard reads a few rows per module whatever the class size.
+    # Module Stats: students who reached and who completed each module
+    c.execute('''CREATE TABLE IF NOT EXISTS module_stats
+                 (goal TEXT,
+                  module TEXT,
+                  reached INTEGER,
+                  completed INTEGER,
+                  PRIMARY KEY (goal, module))''')
+    # Module Steps: completions per (steps, efficiency_score), enough to read off the medians
+    c.execute('''CREATE TABLE IF NOT EXISTS module_steps
+                 (goal TEXT,
+                  module TEXT,
+                  steps INTEGER,
+                  efficiency_score INTEGER,
+                  students INTEGER,
+                  PRIMARY KEY (goal, module, steps, efficiency_score))''')
+    # Student Modules: the module each signed-in student is on per goal, since when, and their turns there
+    c.execute('''CREATE TABLE IF NOT EXISTS student_modules
+                 (student TEXT,
+                  goal TEXT,
+                  module TEXT,
+                  since TEXT,
+                  turns INTEGER,
+                  PRIMARY KEY (student, goal))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_student_modules_turns ON student_modules (turns)")
+
     conn.commit()
     conn.close()
-    print(f"✅ Database {DB_NAME} initialized.")
+    print(f"✅ Database {'Postgres' if POSTGRES else DB_NAME} initialized.")
+
+_db_ready = False
+_db_ready_lock = threading.Lock()
+
+def ensure_db():
+    """Run init_db once per process, before the first connection instead of at import."""
+    global _db_ready
+    if not _db_ready:
+        with _db_ready_lock:
+            if not _db_ready:
+                init_db()
+                _db_ready = True
+
+# --- READ POOL ---
+class ReaderPool:
+    """A fixed set of long-lived read-only connections, borrowed one query at a time."""
+
+    def __init__(self, size=DB_READERS):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        DB_STATS["read"] += 1
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    ensure_db()
+                    self._created += 1
+                    conn = connect()
+                    conn.execute("PRAGMA query_only=1")
+            if conn is None:
+                DB_STATS["read_waits"] += 1
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+# --- SINGLE WRITER ---
+class Writer:
+    """
+    Every write goes through one thread and one connection, so concurrent logins never
+    fight over the write lock ("database is locked"). Queued writes are group-committed:
+    one transaction per batch, with a savepoint per job so one failure doesn't undo the rest.
+    """
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Queue fn(conn, *args) for the writer thread; returns a concurrent.futures.Future."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="tutor-db-writer", daemon=True)
+                    self._thread.start()
+        DB_STATS["write"] += 1
+        future = Future()
+        self._jobs.put((fn, args, future, time.perf_counter()))
+        return future
+
+    def _run(self):
+        ensure_db()
+        conn = connect(isolation_level=None)  # explicit BEGIN/COMMIT below
+        while True:
+            batch = [self._jobs.get()]
+            while len(batch) < DB_WRITE_BATCH:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            # A job whose caller was cancelled while it queued (Stop button, closed tab) is dropped;
+            # the rest can no longer be cancelled, so delivering their results below can't fail
+            batch = [job for job in batch if job[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            outcomes = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, args, future, queued in batch:
+                    DB_STATS["write_wait_ms"] += (time.perf_counter() - queued) * 1000
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        outcomes.append((future, fn(conn, *args), None))
+                        conn.execute("RELEASE job")
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        conn.execute("RELEASE job")
+                        outcomes.append((future, None, e))
+                conn.execute("COMMIT")
+            except Exception as e:
+                print(f"❌ [DB WRITE ERROR]: {e}")
+                if "locked" in str(e):
+                    DB_STATS["locked"] += 1
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                outcomes = [(future, None, e) for _, _, future, _ in batch]
+            for future, result, error in outcomes:
+                try:
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+                except Exception as e:  # the writer thread must outlive any one job
+                    print(f"❌ [DB WRITE ERROR]: result not delivered: {e}")
+
+# --- POSTGRES ---
+class PostgresConnection:
+    """sqlite3's conn.execute(sql, params) over a psycopg2 connection, so the statements above keep their ? placeholders."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def execute(self, sql, params=()):
+        cursor = self.raw.cursor()
+        cursor.execute(sql.replace("?", "%s"), tuple(params))
+        return cursor
+
+    def executemany(self, sql, rows):
+        cursor = self.raw.cursor()
+        cursor.executemany(sql.replace("?", "%s"), list(rows))
+        return cursor
+
+class PostgresBackend:
+    """
+    Same interface as ReaderPool + Writer (connection() and submit()) against a shared Postgres.
+    Postgres handles concurrent writers itself, so each write job is its own transaction on
+    a small thread pool instead of queueing behind one connection.
+    """
+
+    def __init__(self, url, size=DB_READERS):
+        self.url = url
+        self.size = size
+        self._pool = None  # connected on first use
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)  # getconn() raises instead of waiting when all are out
+        self._executor = ThreadPoolExecutor(max_workers=max(1, size // 2), thread_name_prefix="tutor-db-writer")
+
+    @contextmanager
+    def _borrow(self):
+        if not self._slots.acquire(blocking=False):
+            DB_STATS["read_waits"] += 1
+            self._slots.acquire()
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    ensure_db()
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(1, self.size, self.url)
+        raw = self._pool.getconn()
+        try:
+            yield raw
+        finally:
+            self._pool.putconn(raw)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        DB_STATS["read"] += 1
+        with self._borrow() as raw:
+            raw.autocommit = True
+            yield PostgresConnection(raw)
+
+    def submit(self, fn, *args):
+        """Run fn(conn, *args) in its own transaction; returns a concurrent.futures.Future."""
+        DB_STATS["write"] += 1
+        return self._executor.submit(self._write, fn, args, time.perf_counter())
+
+    def _write(self, fn, args, queued):
+        DB_STATS["write_wait_ms"] += (time.perf_counter() - queued) * 1000
+        with self._borrow() as raw:
+            raw.autocommit = False
+            try:
+                result = fn(PostgresConnection(raw), *args)
+                raw.commit()
+                return result
+            except Exception as e:
+                raw.rollback()
+                if not isinstance(e, IntegrityError):
+                    print(f"❌ [DB WRITE ERROR]: {e}")
+                raise
+
+if POSTGRES:
+    readers = writer = PostgresBackend(DATABASE_URL)
+else:
+    readers = ReaderPool()
+    writer = Writer()
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
+def _insert_user(conn, username, hashed):
+    conn.execute(INSERT_USER, (username, hashed, datetime.now().isoformat()))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
 def add_user(username, password):
     """Register a new user."""
     if not username or not password:
         return False, "Username and password cannot be empty."
-    
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
+
     try:
-        hashed = hash_password(password)
-        c.execute("INSERT INTO users VALUES (?, ?, ?)", 
-                  (username, hashed, datetime.now().isoformat()))
-        conn.commit()
+        writer.submit(_insert_user, username, hash_password(password)).result()
         return True, "User registered successfully!"
-    except sqlite3.IntegrityError:
+    except IntegrityError:
         return False, "Username already exists."
-    finally:
-        conn.close()
 
+@timed(DB_SECONDS, errors=DB_ERRORS)
 def verify_login(username, password):
     """Verify user credentials."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
     hashed = hash_password(password)
-    c.execute("SELECT password_hash FROM users WHERE username=?", (username,))
-    result = c.fetchone()
-    conn.close()
-    
+    with readers.connection() as conn:
+        result = conn.execute(SELECT_PASSWORD, (username,)).fetchone()
+
     if result and result[0] == hashed:
         return True
     return False
 
+def efficiency_score(steps):
+    return max(100 - (steps * 2), 10) # Simple heuristic
+
+def _save_progress(conn, username, goal, module, metrics):
+    now = datetime.now().isoformat()
+    conn.execute(UPSERT_PROGRESS, (username, goal, module, now))
+
+    # 'module' is the NEXT module we are moving TO; the metrics are for the module we just FINISHED
+    if metrics and "completed_module_name" in metrics:
+        completed = metrics["completed_module_name"]
+        steps = metrics["steps"] if "steps" in metrics else _module_turns(conn, username, goal, completed)
+        _count_completion(conn, username, goal, completed, steps, efficiency_score(steps))
+        conn.execute(UPSERT_COMPLETION, (username, goal, completed, steps, now, efficiency_score(steps)))
+
+def _module_turns(conn, student, goal, module):
+    """The student's turns on one module, every visit and compacted rows included, from the transcript."""
+    rows = conn.execute(SELECT_MODULE_BODIES, (student, goal, module)).fetchall()
+    return sum(m["role"] == "user" for codec, body in rows for m in decode_messages(codec, body))
+
+def _count_completion(conn, username, goal, module, steps, score):
+    """Update the class aggregates for a completion about to be saved (a repeat replaces the earlier steps)."""
+    previous = conn.execute(SELECT_COMPLETION, (username, goal, module)).fetchone()
+    if previous is None:
+        conn.execute(COUNT_COMPLETED, (goal, module))
+    else:
+        conn.execute(REMOVE_STEPS, (goal, module, previous[0], previous[1]))
+    conn.execute(ADD_STEPS, (goal, module, steps, score))
+
+def _submit_save(username, goal, module, metrics):
+    future = writer.submit(_save_progress, username, goal, module, metrics)
+    # Runs on the writer thread after the commit, so the next read sees the new row
+    future.add_done_callback(lambda _: progress_cache.invalidate(username))
+    return future
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
 def save_progress(username, goal, module, metrics=None):
     """Update the user's current progress and save metrics."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Check if entry exists
-    c.execute("SELECT completed_modules FROM progress WHERE username=?", (username,))
-    row = c.fetchone()
-    
-    completed_data = {}
-    if row:
-        try:
-            loaded = json.loads(row[0])
-            # Migration: If it was a list (old format), convert to dict
-            if isinstance(loaded, list):
-                completed_data = {m: {"steps": 0, "score": 0} for m in loaded}
-            else:
-                completed_data = loaded
-        except:
-            completed_data = {}
-    
-    # Save the metrics for the *completed* module
-    # Note: 'module' here is usually the NEXT module we are moving TO.
-    # The metrics provided are for the module we just FINISHED.
-    # We might need to adjust logic in app.py to pass the correct finished module name.
-    # For now, let's assume 'metrics' contains the name of the finished module too if needed,
-    # or we handle it by passing the *finished* module as an argument.
-    
-    # Actually, simpler: The app calls this when a module is done.
-    # Let's assume 'module' passed here is the NEW state, but we want to record metrics for the PREVIOUS state?
-    # No, usually we save "I just finished Module X, here are its stats".
-    
-    if metrics and "completed_module_name" in metrics:
-        mod_name = metrics["completed_module_name"]
-        completed_data[mod_name] = {
-            "steps": metrics.get("steps", 0),
-            "timestamp": datetime.now().isoformat(),
-            "efficiency_score": max(100 - (metrics.get("steps", 0) * 2), 10) # Simple heuristic
-        }
-    
-    c.execute('''INSERT OR REPLACE INTO progress 
-                 (username, current_goal, current_module, completed_modules, last_updated) 
-                 VALUES (?, ?, ?, ?, ?)''',
-              (username, goal, module, json.dumps(completed_data), datetime.now().isoformat()))
-    
-    conn.commit()
-    conn.close()
+    _submit_save(username, goal, module, metrics).result()
+
+def _insert_oauth_user(conn, username):
+    # Create user with a dummy password since they use OAuth
+    conn.execute(INSERT_USER_IF_MISSING, (username, hash_password("oauth_user"), datetime.now().isoformat()))
 
+# --- PROGRESS SNAPSHOTS ---
+class ProgressCache:
+    """
+    LRU of per-user progress snapshots. A page load builds the status card, XP bars and
+    active module from one snapshot; save_progress invalidates it after committing.
+    Saves made by other workers can't invalidate it, so entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize=PROGRESS_CACHE_SIZE, ttl=PROGRESS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0  # bumped on every invalidation
+        self._entries = OrderedDict()  # username -> (snapshot, time cached)
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[username]
+                entry = None
+            if entry is None:
+                DB_STATS["miss"] += 1
+                return False, None
+            DB_STATS["hit"] += 1
+            self._entries.move_to_end(username)
+            return True, entry[0]
+
+    def put(self, username, snapshot, generation):
+        with self._lock:
+            # A save committed while we were reading: our row may be stale, don't keep it
+            if generation != self.generation:
+                return
+            self._entries[username] = (snapshot, time.monotonic())
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+progress_cache = ProgressCache()
+
+def _read_snapshot(username):
+    """Returns (user exists, progress dict or None) from a single query, caching known users."""
+    hit, snapshot = progress_cache.get(username)
+    if hit:
+        return True, snapshot
+    generation = progress_cache.generation
+    with readers.connection() as conn:
+        rows = conn.execute(SELECT_SNAPSHOT, (username,)).fetchall()
+
+    exists = bool(rows[0][0])
+    snapshot = None
+    if rows[0][1] is not None or rows[0][4] is not None:
+        completed = {}
+        for _, _, _, goal, module, steps, completed_at, score in rows:
+            if module is not None:
+                completed[module] = {"goal": goal, "steps": steps, "timestamp": completed_at, "efficiency_score": score}
+        snapshot = {"goal": rows[0][1], "module": rows[0][2], "completed": completed}
+    if exists:
+        progress_cache.put(username, snapshot, generation)
+    return exists, snapshot
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def load_user(username):
+    """Ensure an (OAuth) user exists and return their progress: one read per page view, none when cached."""
+    exists, snapshot = _read_snapshot(username)
+    if not exists:
+        writer.submit(_insert_oauth_user, username).result()
+    return snapshot
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
 def ensure_user_exists(username):
     """Ensure a user exists in the DB (for OAuth users)."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT username FROM users WHERE username=?", (username,))
-    if not c.fetchone():
-        # Create user with a dummy password since they use OAuth
-        hashed = hash_password("oauth_user") 
-        c.execute("INSERT INTO users VALUES (?, ?, ?)", 
-                  (username, hashed, datetime.now().isoformat()))
-        conn.commit()
-    conn.close()
+    load_user(username)
 
+@timed(DB_SECONDS, errors=DB_ERRORS)
 def get_user_progress(username):
     """Retrieve user's last known state and completion history."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    c.execute("SELECT current_goal, current_module, completed_modules FROM progress WHERE username=?", (username,))
-    row = c.fetchone()
+    return _read_snapshot(username)[1]
+
+# --- CONVERSATIONS ---
+# A student's current module, chat and sandbox cells live here rather than in the worker that
+# served them last, so the next message or "Run Code" can land on any worker.
+ROLES = {"user": "u", "assistant": "a"}
+ROLE_NAMES = {v: k for k, v in ROLES.items()}
+
+def encode_messages(messages):
+    """Gradio messages as compact JSON bytes: [["u", text], ["a", text], ...]."""
+    return json.dumps([[ROLES[m["role"]], m["content"]] for m in messages], separators=(",", ":"), ensure_ascii=False).encode()
+
+def decode_messages(codec, body):
+    body = bytes(body)  # psycopg2 returns bytea as a memoryview
+    return [{"role": ROLE_NAMES[role], "content": content}
+            for role, content in json.loads(zlib.decompress(body) if codec == "zlib" else body)]
+
+def _save_conversation(conn, student, goal, module):
+    conn.execute(UPSERT_CONVERSATION, (student, goal, module, datetime.now().isoformat()))
+
+def _record_turn(conn, student, goal, module, next_module, messages):
+    now = datetime.now().isoformat()
+    # The upsert locks the conversation row until commit, so a second worker appending to the same
+    # conversation waits here and then reads the new MAX(seq) instead of reusing it (IntegrityError)
+    conn.execute(UPSERT_CONVERSATION, (student, goal, next_module, now))
+    conn.execute(APPEND_TRANSCRIPT, (student, goal, module, now, encode_messages(messages), student, goal))
+    _track_turn(conn, student, goal, module, next_module, now, any(m["role"] == "user" for m in messages))
+
+def _move_student(conn, student, goal, module, now):
+    if conn.execute(MOVE_STUDENT, (student, goal, module, now, student)).rowcount > 0:
+        conn.execute(COUNT_REACHED, (goal, module))
+
+def _track_turn(conn, student, goal, module, next_module, now, answered):
+    """Count a student's turn on `module`, and their arrival on a module they weren't on yet."""
+    _move_student(conn, student, goal, module, now)
+    if answered:
+        conn.execute(COUNT_TURN, (student, goal, module))
+    if next_module != module:
+        _move_student(conn, student, goal, next_module, now)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def save_conversation(student, goal, module):
+    """Make this goal the student's active conversation, at `module`."""
+    writer.submit(_save_conversation, student, goal, module).result()
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def record_turn(student, goal, module, next_module, messages):
+    """Append one turn's messages (taken in `module`) to the transcript and move the conversation to `next_module`."""
+    writer.submit(_record_turn, student, goal, module, next_module, messages).result()
+
+def _read_transcript(conn, student, goal, module, before, limit):
+    if module is None:
+        rows = conn.execute(SELECT_TRANSCRIPT, (student, goal, before, limit)).fetchall()
+    else:
+        rows = conn.execute(SELECT_MODULE_TRANSCRIPT, (student, goal, module, before, limit)).fetchall()
+    # Newest rows first; a compacted row is never split, so a page may run a little over `limit`
+    pages = []
+    count = 0
+    cursor = None
+    for seq, codec, body in rows:
+        if count >= limit:
+            break
+        messages = decode_messages(codec, body)
+        pages.append(messages)
+        count += len(messages)
+        cursor = seq
+    return [m for messages in reversed(pages) for m in messages], cursor
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def load_transcript(student, goal, module=None, before=None, limit=TRANSCRIPT_PAGE):
+    """
+    One page of a transcript, oldest message first, optionally for a single module.
+    Returns (messages, cursor); pass the cursor as `before` for the page before it.
+    """
+    with readers.connection() as conn:
+        return _read_transcript(conn, student, goal, module, sys.maxsize if before is None else before, limit)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def load_conversation(student, goal=None):
+    """
+    The student's conversation for `goal`, or the one they touched last:
+    {"goal", "module", "history"} with the latest TRANSCRIPT_PAGE messages, or None.
+    """
+    with readers.connection() as conn:
+        if goal is None:
+            row = conn.execute(SELECT_CONVERSATION, (student,)).fetchone()
+        else:
+            row = conn.execute(SELECT_GOAL_CONVERSATION, (student, goal)).fetchone()
+        if row is None:
+            return None
+        history, _ = _read_transcript(conn, student, row[0], None, sys.maxsize, TRANSCRIPT_PAGE)
+    return {"goal": row[0], "module": row[1], "history": history}
+
+def _add_cell(conn, student, goal, code):
+    conn.execute(INSERT_CELL, (student, goal, datetime.now().isoformat(), code))
+    conn.execute(PRUNE_CELLS, (student, goal, student, goal, SANDBOX_REPLAY_CELLS - 1))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def add_cell(student, goal, code):
+    """Remember a cell the student ran (only the newest SANDBOX_REPLAY_CELLS are kept)."""
+    writer.submit(_add_cell, student, goal, code).result()
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def load_cells(student, goal):
+    """Source of the student's recent cells for this goal, oldest first."""
+    with readers.connection() as conn:
+        return [row[0] for row in conn.execute(SELECT_CELLS, (student, goal)).fetchall()]
+
+def _clear_cells(conn, student, goal):
+    conn.execute(DELETE_CELLS, (student, goal))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def clear_cells(student, goal):
+    writer.submit(_clear_cells, student, goal).result()
+
+def _compact_module(conn, student, goal, module, cutoff):
+    rows = conn.execute(SELECT_TURNS, (student, goal, module, cutoff)).fetchall()
+    if len(rows) < 2:
+        return 0  # another worker got here first
+    messages = [m for _, _, body in rows for m in decode_messages("json", body)]
+    conn.execute(DELETE_TURNS, (student, goal, module, rows[0][0], rows[-1][0]))
+    conn.execute(INSERT_COMPACTED, (student, goal, module, rows[-1][0], rows[0][0], rows[-1][1],
+                                    zlib.compress(encode_messages(messages), 9)))
+    return len(rows)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def compact_transcripts(days=TRANSCRIPT_COMPACT_DAYS, batch_size=500):
+    """
+    Fold the turns of modules nobody has touched for `days` into one zlib-compressed row each.
+    Pages read the same either way; returns the number of turn rows folded.
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    folded = 0
+    while True:
+        with readers.connection() as conn:
+            idle = conn.execute(SELECT_IDLE_MODULES, (cutoff, batch_size)).fetchall()
+        if not idle:
+            break
+        futures = [writer.submit(_compact_module, student, goal, module, cutoff) for student, goal, module in idle]
+        folded += sum(f.result() for f in futures)
+        if len(idle) < batch_size:
+            break
+    if folded:
+        print(f"✅ Compacted {folded} transcript turns.")
+    return folded
+
+# --- CLASS DASHBOARD ---
+def median(counts):
+    """Median of a histogram given as [(value, how many), ...]."""
+    counts = sorted((value, n) for value, n in counts if n > 0)
+    total = sum(n for _, n in counts)
+    if not total:
+        return None
+    middle = [(total - 1) // 2, total // 2]
+    found = []
+    seen = 0
+    for value, n in counts:
+        while middle and middle[0] < seen + n:
+            found.append(value)
+            middle.pop(0)
+        seen += n
+    return sum(found) / 2
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def class_dashboard(stuck_turns=STUCK_TURNS, stuck_limit=STUCK_LIMIT):
+    """
+    The whole class at a glance, read from the aggregate tables (no per-student reads):
+    {"modules": {(goal, module): {"reached", "completed", "median_steps", "median_efficiency"}},
+     "stuck": [{"student", "goal", "module", "since", "turns"}, ...]}
+    """
+    with readers.connection() as conn:
+        stats = conn.execute(SELECT_MODULE_STATS).fetchall()
+        steps = conn.execute(SELECT_MODULE_STEPS).fetchall()
+        stuck = conn.execute(SELECT_STUCK, (stuck_turns, stuck_limit)).fetchall()
+    histograms = {}
+    for goal, module, n_steps, score, students in steps:
+        histograms.setdefault((goal, module), []).append((n_steps, score, students))
+    modules = {}
+    for goal, module, reached, completed in stats:
+        rows = histograms.get((goal, module), [])
+        modules[(goal, module)] = {"reached": reached, "completed": completed,
+                                   "median_steps": median((n_steps, n) for n_steps, _, n in rows),
+                                   "median_efficiency": median((score, n) for _, score, n in rows)}
+    return {"modules": modules,
+            "stuck": [{"student": s, "goal": g, "module": m, "since": since, "turns": t} for s, g, m, since, t in stuck]}
+
+def _rebuild_class_stats(conn):
+    conn.execute("DELETE FROM module_stats")
+    conn.execute("DELETE FROM module_steps")
+    conn.execute("DELETE FROM student_modules")
+    conn.execute('''INSERT INTO module_steps (goal, module, steps, efficiency_score, students)
+                    SELECT goal, module, steps, efficiency_score, COUNT(*) FROM completions
+                    GROUP BY goal, module, steps, efficiency_score''')
+    conn.execute('''INSERT INTO student_modules (student, goal, module, since, turns)
+                    SELECT v.student, v.goal, v.module, v.updated_at,
+                           (SELECT COUNT(*) FROM transcripts t WHERE t.student = v.student AND t.goal = v.goal
+                                AND t.module = v.module AND t.codec = 'json')
+                    FROM conversations v JOIN users u ON u.username = v.student''')
+    # Reached: everyone who completed a module, plus whoever is on it now without having completed it
+    conn.execute('''INSERT INTO module_stats (goal, module, reached, completed)
+                    SELECT goal, module, SUM(reached), SUM(completed) FROM (
+                        SELECT goal, module, COUNT(*) AS reached, COUNT(*) AS completed FROM completions
+                        GROUP BY goal, module
+                        UNION ALL
+                        SELECT s.goal, s.module, COUNT(*), 0 FROM student_modules s
+                        WHERE NOT EXISTS (SELECT 1 FROM completions c
+                            WHERE c.username = s.student AND c.goal = s.goal AND c.module = s.module)
+                        GROUP BY s.goal, s.module) AS counts
+                    GROUP BY goal, module''')
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def rebuild_class_stats(force=False):
+    """
+    Recompute the class aggregates from completions and conversations in one write, for databases
+    from before they existed (run at startup, a no-op once they are filled unless `force`).
+    Turns are counted from uncompacted transcript rows, so they are approximate.
+    """
+    if not force:
+        with readers.connection() as conn:
+            filled, history = conn.execute('''SELECT EXISTS(SELECT 1 FROM module_stats),
+                                                     EXISTS(SELECT 1 FROM completions) OR EXISTS(SELECT 1 FROM conversations)''').fetchone()
+        if filled or not history:
+            return False
+    writer.submit(_rebuild_class_stats).result()
+    print("✅ Rebuilt the class dashboard aggregates.")
+    return True
+
+# --- MIGRATION ---
+def legacy_completions(username, goal, blob, last_updated, goal_of=None):
+    """Yield completion rows from an old completed_modules JSON blob (list or dict form)."""
+    try:
+        loaded = json.loads(blob)
+    except (TypeError, ValueError):
+        return
+    if isinstance(loaded, list):
+        loaded = {m: {} for m in loaded}
+    if not isinstance(loaded, dict):
+        return
+    for module, stats in loaded.items():
+        stats = stats if isinstance(stats, dict) else {}
+        steps = stats.get("steps", 0)
+        score = stats.get("efficiency_score", stats.get("score", efficiency_score(steps)))
+        # The blob never recorded which goal a module belonged to
+        module_goal = (goal_of(module) if goal_of else None) or goal
+        yield (username, module_goal, module, steps, stats.get("timestamp") or last_updated, score)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+def migrate_progress(goal_of=None, batch_size=500):
+    """
+    Move completed_modules blobs into the completions table, a batch of users per transaction,
+    so a large tutor_db.sqlite never has to fit in memory. Safe to re-run: migrated rows are
+    cleared, and existing completions are never overwritten. Returns the number of users migrated.
+    """
+    if POSTGRES:
+        return 0  # legacy blobs only ever existed in SQLite files
+    ensure_db()
+    conn = connect()
+    migrated = 0
+    last_rowid = 0
+    while True:
+        rows = conn.execute('''SELECT rowid, username, current_goal, completed_modules, last_updated FROM progress
+                                WHERE rowid > ? AND completed_modules IS NOT NULL
+                                ORDER BY rowid LIMIT ?''', (last_rowid, batch_size)).fetchall()
+        if not rows:
+            break
+        with conn:
+            for rowid, username, goal, blob, last_updated in rows:
+                conn.executemany(INSERT_LEGACY_COMPLETION, legacy_completions(username, goal, blob, last_updated, goal_of))
+                conn.execute("UPDATE progress SET completed_modules = NULL WHERE rowid = ?", (rowid,))
+        migrated += len(rows)
+        last_rowid = rows[-1][0]
     conn.close()
-    
-    if row:
-        completed = {}
-        try:
-            completed = json.loads(row[2])
-        except:
-            pass
-        return {"goal": row[0], "module": row[1], "completed": completed}
-    return None
-
-# Auto-initialize on import
-init_db()
+    if migrated:
+        print(f"✅ Migrated completed modules for {migrated} users.")
+        rebuild_class_stats(force=True)  # the aggregates never saw these completions
+    return migrated
+
+# --- ASYNC ACCESS ---
+# Async handlers await these instead of blocking the event loop on sqlite3.
+# Reads run on a small dedicated pool; writes await the single writer's future directly.
+_db_executor = ThreadPoolExecutor(max_workers=DB_READERS, thread_name_prefix="tutor-db")
+
+async def run_db(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, fn, *args)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def asave_progress(username, goal, module, metrics=None):
+    await asyncio.wrap_future(_submit_save(username, goal, module, metrics))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aload_user(username):
+    return await run_db(load_user, username)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aensure_user_exists(username):
+    await run_db(load_user, username)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aget_user_progress(username):
+    return await run_db(get_user_progress, username)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aclass_dashboard():
+    return await run_db(class_dashboard)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def asave_conversation(student, goal, module):
+    await asyncio.wrap_future(writer.submit(_save_conversation, student, goal, module))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def arecord_turn(student, goal, module, next_module, messages):
+    await asyncio.wrap_future(writer.submit(_record_turn, student, goal, module, next_module, messages))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aload_conversation(student, goal=None):
+    return await run_db(load_conversation, student, goal)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aload_transcript(student, goal, module=None, before=None, limit=TRANSCRIPT_PAGE):
+    return await run_db(load_transcript, student, goal, module, before, limit)
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aadd_cell(student, goal, code):
+    await asyncio.wrap_future(writer.submit(_add_cell, student, goal, code))
+
+@timed(DB_SECONDS, errors=DB_ERRORS)
+async def aclear_cells(student, goal):
+    await asyncio.wrap_future(writer.submit(_clear_cells, student, goal))
+
+# Tables are created by ensure_db() on the first query, not at import
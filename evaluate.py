@@ -0,0 +1,250 @@
+"""
+Batch evaluation of the Socratic tutor prompt: runs the scripted student dialogues in
+eval_dialogues.json (a learner and a shortcut-seeker for every CURRICULUM module) through
+socratic_agent and scores each tutor reply against the rules in tutor_instructions:
+  no_full_code     no fenced code block longer than EVAL_MAX_CODE_LINES lines
+  one_question     exactly one question per reply
+  module_complete  [MODULE_COMPLETE] at the end of the reply from the dialogue's
+                   complete_from turn on, and never before
+
+Replies are recorded in EVAL_RECORDINGS (a local SQLite cache) keyed by model and the exact
+prompt, so a rerun only calls the LLM for turns whose prompt changed, e.g. after editing the
+system prompt. "offline" never calls the LLM: it replays the replies committed in EVAL_FIXTURE
+(eval_recordings.json), so it runs on a fresh checkout, and turns without a recording there are
+reported as missing. "record" runs like auto, then rewrites the fixture with this run's replies.
+Dialogues run concurrently, at most [workers] at a time. MOCK_LLM=1 checks the harness itself.
+Usage: python evaluate.py [auto|offline|record] [workers]
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any
+from collections import Counter, defaultdict
+
+MODE = sys.argv[1] if len(sys.argv) > 1 else "auto"
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+DIALOGUES = os.environ.get("EVAL_DIALOGUES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_dialogues.json"))
+RECORDINGS = os.environ.get("EVAL_RECORDINGS", "eval_recordings.sqlite")
+FIXTURE = os.environ.get("EVAL_FIXTURE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_recordings.json"))
+EVAL_MAX_CODE_LINES = int(os.environ.get("EVAL_MAX_CODE_LINES", 3))
+# Summaries would hide which turns a prompt change affected; keep every turn verbatim
+os.environ.setdefault("MEMORY_WINDOW_TURNS", "0")
+# Score the prompt itself, not the template replies of the local router
+os.environ.setdefault("LOCAL_ROUTER", "0")
+
+from langchain_core.language_models.chat_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import HumanMessage, AIMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+
+import logic  # noqa: E402
+from curriculum import CURRICULUM  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+TAG = "[MODULE_COMPLETE]"
+RULES = ("no_full_code", "one_question", "module_complete")
+CODE_BLOCK = re.compile(r"```[^\n]*\n?(.*?)(?:```|$)", re.DOTALL)
+INLINE_CODE = re.compile(r"`[^`\n]*`")
+QUESTION = re.compile(r"\?+(?=[\s\"')\]*_]|$)")
+
+class RecordedLLM(BaseChatModel):
+    """
+    Answers from recorded replies keyed by (model, prompt). On a miss it asks `inner` and records
+    the reply, or, when `offline`, returns an empty reply flagged not_recorded.
+    """
+    inner: Any = None
+    recordings: Any = None
+    model: str = ""
+    offline: bool = False
+    stats: Any = None
+    used: Any = None  # prompt hash -> reply, for every reply this run got (see write_fixture)
+
+    @property
+    def _llm_type(self):
+        return "recorded"
+
+    def _key(self, messages):
+        prompt = [[type(m).__name__, logic.content_text(m.content)] for m in messages]
+        return [self.model, hashlib.sha256(json.dumps(prompt).encode()).hexdigest()]
+
+    def _result(self, text, recorded=True):
+        metadata = {} if recorded else {"not_recorded": True}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, response_metadata=metadata))])
+
+    def _lookup(self, key):
+        text = self.recordings.get(key)
+        if text is not None:
+            self.stats["replayed"] += 1
+            self.used[key[1]] = text
+        elif self.offline:
+            self.stats["missing"] += 1
+        return text
+
+    def _record(self, key, text):
+        self.recordings.put(key, text)
+        self.used[key[1]] = text
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages)
+        text = self._lookup(key)
+        if text is None and not self.offline:
+            self.stats["llm_calls"] += 1
+            text = logic.content_text(self.inner.invoke(messages).content)
+            self._record(key, text)
+        return self._result(text or "", recorded=text is not None)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages)
+        text = self._lookup(key)
+        if text is None and not self.offline:
+            self.stats["llm_calls"] += 1
+            text = logic.content_text((await self.inner.ainvoke(messages)).content)
+            self._record(key, text)
+        return self._result(text or "", recorded=text is not None)
+
+class FixtureRecordings:
+    """The replies committed in eval_recordings.json, behind ResponseCache's get/put; put is a no-op."""
+
+    def __init__(self, path=FIXTURE):
+        with open(path) as f:
+            fixture = json.load(f)
+        self.model = fixture["model"]
+        self.replies = fixture["replies"]
+
+    def get(self, key):
+        model, digest = key
+        return self.replies.get(digest) if model == self.model else None
+
+    def put(self, key, text):
+        pass
+
+def write_fixture(model, replies, path=FIXTURE):
+    """Replace the committed recordings with `replies` ({prompt hash: reply}) from a run against `model`."""
+    fixture = {
+        "_about": "Tutor replies evaluate.py offline replays, keyed by the sha256 of the exact prompt. "
+                  "Rewrite with `python evaluate.py record` after changing the prompt or the dialogues.",
+        "model": model,
+        "prompt_version": logic.PROMPT_VERSION,
+        "replies": dict(sorted(replies.items())),
+    }
+    with open(path, "w") as f:
+        json.dump(fixture, f, indent=1, ensure_ascii=False)
+        f.write("\n")
+
+# --- RULES ---
+def longest_code_block(text):
+    return max((len([line for line in block.splitlines() if line.strip()]) for block in CODE_BLOCK.findall(text)), default=0)
+
+def count_questions(text):
+    prose = INLINE_CODE.sub("", CODE_BLOCK.sub("", text))
+    return len(QUESTION.findall(prose))
+
+def score_reply(text, turn, complete_from):
+    """{rule: (passed, detail)} for one tutor reply at 0-based `turn`."""
+    lines = longest_code_block(text)
+    questions = count_questions(text)
+    tagged = TAG in text
+    earned = complete_from is not None and turn >= complete_from
+    if tagged and not earned:
+        complete = (False, "completed before the module was earned")
+    elif earned and not tagged:
+        complete = (False, "missed the completion")
+    elif tagged and not text.rstrip().endswith(TAG):
+        complete = (False, "tag not at the end")
+    else:
+        complete = (True, "")
+    return {
+        "no_full_code": (lines <= EVAL_MAX_CODE_LINES, f"{lines}-line code block"),
+        "one_question": (questions == 1, f"{questions} questions"),
+        "module_complete": complete,
+    }
+
+# --- RUNNER ---
+async def run_dialogue(dialogue, slots, results, stats):
+    """Play the student's turns in order, each reply feeding the next prompt."""
+    async with slots:
+        messages = []
+        for turn, student in enumerate(dialogue["turns"]):
+            messages.append(HumanMessage(content=student))
+            result = await logic.socratic_agent.ainvoke({"messages": messages, "module_name": dialogue["module"], "goal": dialogue["goal"]})
+            reply = result["messages"][-1]
+            if reply.response_metadata.get("not_recorded"):
+                stats["dialogues_missing"] += 1
+                return
+            if reply.response_metadata.get("fallback"):
+                stats["dialogues_failed"] += 1
+                return
+            text = logic.content_text(reply.content)
+            results.append((dialogue, turn, text, score_reply(text, turn, dialogue.get("complete_from"))))
+            messages.append(AIMessage(content=text))
+
+def load_dialogues(path=DIALOGUES):
+    with open(path) as f:
+        dialogues = json.load(f)["dialogues"]
+    uncovered = [m for modules in CURRICULUM.values() for m in modules if not any(d["module"] == m for d in dialogues)]
+    if uncovered:
+        print(f"⚠️ No dialogues for: {', '.join(uncovered)}")
+    return dialogues
+
+def report(results, stats, wall):
+    print(f"{'rule':<16} | {'pass':>5} | {'fail':>5} | {'rate':>6}")
+    for rule in RULES:
+        passed = sum(1 for *_, scores in results if scores[rule][0])
+        print(f"{rule:<16} | {passed:5d} | {len(results) - passed:5d} | {passed / max(len(results), 1):6.1%}")
+
+    by_module = defaultdict(list)
+    for dialogue, _, _, scores in results:
+        by_module[(dialogue["goal"], dialogue["module"])].append(scores)
+    print(f"\n{'module':<34} | {'turns':>5} | " + " | ".join(f"{rule:>15}" for rule in RULES))
+    for goal, modules in CURRICULUM.items():
+        for module in modules:
+            rows = by_module.get((goal, module), [])
+            rates = [sum(1 for s in rows if s[rule][0]) / len(rows) if rows else 0 for rule in RULES]
+            print(f"{module:<34} | {len(rows):5d} | " + " | ".join(f"{rate:15.0%}" for rate in rates))
+
+    failures = [(d, turn, text, rule, detail) for d, turn, text, scores in results
+                for rule, (passed, detail) in scores.items() if not passed]
+    if failures:
+        print(f"\nFailures ({len(failures)}, first 10):")
+        for d, turn, text, rule, detail in failures[:10]:
+            excerpt = " ".join(text.split())[:100]
+            print(f"- {d['module']} / {d['name']} turn {turn + 1}: {rule}: {detail} — \"{excerpt}\"")
+    print(f"\n{len(results)} replies scored in {wall:.1f}s: {stats['replayed']} replayed, {stats['llm_calls']} LLM calls, "
+          f"{stats['missing']} not recorded ({stats['dialogues_missing']} dialogues cut short), "
+          f"{stats['dialogues_failed']} dialogues hit an LLM error")
+
+async def main():
+    if MODE not in ("auto", "offline", "record"):
+        sys.exit(f"Unknown mode {MODE!r}: use auto, offline or record")
+    dialogues = load_dialogues()
+    stats = Counter()
+    if MODE == "offline":
+        # Whatever model the fixture was recorded with: no LLM is configured or called
+        recordings = FixtureRecordings()
+        model = recordings.model
+    else:
+        model = "mock" if logic.MOCK_MODE else logic.LLM_MODEL
+        # Recordings never expire: a reply is only reused for exactly the same prompt
+        recordings = ResponseCache(maxsize=1, ttl=float("inf"), path=RECORDINGS)
+    used = {}
+    logic.set_llm(RecordedLLM(inner=None if MODE == "offline" else logic.get_llm(), recordings=recordings,
+                              model=model, offline=MODE == "offline", stats=stats, used=used))
+    print(f"--- {len(dialogues)} dialogues, prompt {logic.PROMPT_VERSION}, model {model}, {MODE}, {WORKERS} workers ---")
+    results = []
+    slots = asyncio.Semaphore(WORKERS)
+    start = time.perf_counter()
+    await asyncio.gather(*(run_dialogue(d, slots, results, stats) for d in dialogues))
+    order = {id(d): i for i, d in enumerate(dialogues)}
+    results.sort(key=lambda r: (order[id(r[0])], r[1]))
+    report(results, stats, time.perf_counter() - start)
+    logic.set_llm(None)
+    if MODE == "record":
+        write_fixture(model, used)
+        print(f"✅ Recorded {len(used)} replies from {model} in {FIXTURE}")
+    return stats["missing"] == 0 and stats["dialogues_failed"] == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import threading
+from typing import NamedTuple
+from router import QUESTION_SENTENCE, SEARCH_KEYWORDS, content_text
+
+# --- FALLBACK TUTOR ---
+# Keeps a class moving when Gemini is down or too slow (see CircuitBreaker in quota.py).
+# Every CURRICULUM module is a short scripted dialogue in tutor_scripts.json: a few questions,
+# each with the replies it accepts (regexes, case-insensitive) and, for coding steps, what the
+# student's sandbox run must print ("outputs") and contain ("code"). A wrong answer gets the
+# next hint and the same question again; the last correct answer completes the module.
+# Nothing is stored: the step a student is on is read back from the question the tutor's
+# last message ended with, so the LLM can take over again (or hand over) at any turn.
+SCRIPTS_PATH = os.environ.get("TUTOR_SCRIPTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tutor_scripts.json"))
+RUN_MESSAGE = re.compile(r"I ran this code:\n```python\n(.*?)\n```\nOutput:\n```\n(.*?)\n```", re.DOTALL)
+SEARCH_AFTER_TRIES = 3  # wrong answers before the hint also suggests Google keywords
+RUN_NUDGE = "Let's check it for real: write it in the 🐍 Python Sandbox and press ▶️ Run Code, and I'll look at the output with you."
+DONE = "You've completed **{module}** with the practice coach! [MODULE_COMPLETE]"
+
+class Step(NamedTuple):
+    ask: str
+    cue: str        # the question the ask ends with; finding it in a tutor message locates the step
+    answers: tuple  # compiled patterns, any of which accepts a chat reply
+    rejects: tuple  # patterns that mark a chat reply as wrong even if an answer pattern matches
+    outputs: tuple  # patterns the sandbox output must all match
+    code: tuple     # patterns the submitted code must all match
+    hints: tuple
+    praise: str
+    example: str    # a correct reply or program, checked by check_fallback.py
+
+def _patterns(raw, flags=0):
+    return tuple(re.compile(p, flags) for p in raw)
+
+def _step(raw):
+    questions = QUESTION_SENTENCE.findall(raw["ask"])
+    return Step(ask=raw["ask"], cue=questions[-1].strip() if questions else raw["ask"],
+                answers=_patterns(raw.get("answers", []), re.IGNORECASE), rejects=_patterns(raw.get("rejects", []), re.IGNORECASE),
+                outputs=_patterns(raw.get("outputs", []), re.MULTILINE), code=_patterns(raw.get("code", []), re.MULTILINE),
+                hints=tuple(raw["hints"]), praise=raw["praise"], example=raw.get("example", ""))
+
+def load_scripts(path=SCRIPTS_PATH):
+    """{module: (intro, (Step, ...))} with every pattern compiled, read from tutor_scripts.json."""
+    with open(path) as f:
+        modules = json.load(f)["modules"]
+    scripts = {}
+    for module, raw in modules.items():
+        steps = tuple(_step(s) for s in raw["steps"])
+        cues = [s.cue for s in steps]
+        if len(set(cues)) != len(cues):
+            raise ValueError(f"{module}: two steps end with the same question, so they can't be told apart")
+        scripts[module] = (raw["intro"], steps)
+    return scripts
+
+_scripts = None
+_scripts_lock = threading.Lock()
+
+def get_scripts():
+    """The scripts, loaded and compiled on first use and shared afterwards."""
+    global _scripts
+    if _scripts is None:
+        with _scripts_lock:
+            if _scripts is None:
+                _scripts = load_scripts()
+    return _scripts
+
+def _position(messages, steps):
+    """(step index, times it has been asked) from the tutor's latest messages, or (None, 0) at the start."""
+    index, asked = None, 0
+    for message in reversed(messages):
+        if type(message).__name__ != "AIMessage":
+            continue
+        text = content_text(message.content).rstrip()
+        if "[MODULE_COMPLETE]" in text or "Module Complete" in text:
+            break
+        found = next((i for i, step in enumerate(steps) if text.endswith(step.cue)), None)
+        if found is None:
+            continue  # e.g. a router hint in between
+        if index is not None and found != index:
+            break
+        index = found
+        asked += 1
+    return index, asked
+
+def _accepted(step, reply):
+    """True if the reply (chat text or a sandbox run) answers the step, False if not, None if it needs a run."""
+    run = RUN_MESSAGE.search(reply)
+    if run:
+        code, output = run.groups()
+        if step.outputs or step.code:
+            return all(p.search(output) for p in step.outputs) and all(p.search(code) for p in step.code)
+        reply = code
+    elif not step.answers:
+        return None  # a coding step: only a run can pass it
+    if any(p.search(reply) for p in step.rejects):
+        return False
+    return any(p.search(reply) for p in step.answers)
+
+def _search_tip(module):
+    topic = module[module.find("(") + 1:module.rfind(")")] if "(" in module else ""
+    keywords = SEARCH_KEYWORDS.get(topic)
+    if not keywords:
+        return ""
+    return f"\n\n🔎 Still stuck? Real developers google it: try **\"{keywords[0]}\"**."
+
+def scripted_reply(messages, goal=None, module=None):
+    """
+    The practice coach's reply to the conversation so far (LangChain messages, newest last),
+    or None if there is no script for `module`.
+    """
+    script = get_scripts().get(module)
+    if script is None:
+        return None
+    intro, steps = script
+    index, asked = _position(messages, steps)
+    if index is None:
+        return f"{intro}\n\n{steps[0].ask}"
+    step = steps[index]
+    student = next((content_text(m.content) for m in reversed(messages) if type(m).__name__ == "HumanMessage"), "")
+    accepted = _accepted(step, student)
+    if accepted:
+        if index + 1 == len(steps):
+            return f"{step.praise} {DONE.format(module=module)}"
+        return f"{step.praise}\n\n{steps[index + 1].ask}"
+    if accepted is None:
+        return f"{RUN_NUDGE}\n\n{step.ask}"
+    hint = step.hints[min(asked - 1, len(step.hints) - 1)]
+    tip = _search_tip(module) if asked >= SEARCH_AFTER_TRIES else ""
+    return f"{hint}{tip}\n\n{step.ask}"
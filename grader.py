@@ -0,0 +1,156 @@
+import os
+import re
+import ast
+import json
+import time
+import threading
+from collections import Counter
+from typing import NamedTuple
+import metrics
+from sandbox import aexecute_cell
+from router import content_text
+
+# --- LOCAL GRADER ---
+# Grades a "Run Code" click without asking Gemini whether the program is right. Every
+# CURRICULUM module lists its exercises in exercise_checks.json: what the tutor's question
+# mentions ("asked"), what an attempt's code looks like ("attempt"), and checks on the run:
+# "output" must match the program's output, "no_output" must not, "no_code" must not match the
+# code, and "assert" is a Python expression evaluated in the student's own sandbox session after
+# the run (e.g. `isinstance(runs, int)`).
+# A run that passes every check gets the exercise's praise, one that fails a check gets that
+# check's hint; errors, unknown exercises and checks that can't be evaluated go to the tutor.
+# Local replies never complete a module: [MODULE_COMPLETE] stays the tutor's call.
+CHECKS_PATH = os.environ.get("EXERCISE_CHECKS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exercise_checks.json"))
+LOCAL_GRADER = os.environ.get("LOCAL_GRADER", "1") != "0"
+# Runs whose output says something went wrong are left to the router (NameError, SyntaxError) and the tutor
+UNGRADABLE = re.compile(r"^\w+(Error|Exception): |Security Alert|♻️", re.MULTILINE)
+# A run stopped by the CPU or output limit can fail a check (a menu that never exits) but never pass
+CUT_SHORT = re.compile("⏱️|✂️")
+ASSERT_MARKER = "🧪check"
+ASSERT_RESULT = re.compile(rf"^{ASSERT_MARKER} (\d+) (True|False|None)$", re.MULTILINE)
+
+GRADER_STATS = Counter()
+GRADER_SECONDS = metrics.histogram("tutor_grader_seconds", "Time to grade a sandbox run locally, including its assertion cell")
+metrics.gauge("tutor_grader_runs_total", "Sandbox runs by verdict (pass, fail answered locally; llm)",
+              lambda: dict(GRADER_STATS), label="verdict", kind="counter")
+metrics.gauge("tutor_grader_local_ratio", "Share of sandbox runs graded without the LLM",
+              lambda: 1 - GRADER_STATS["llm"] / max(sum(GRADER_STATS.values()), 1))
+metrics.gauge("tutor_grader_llm_calls_saved_total", "Tutor LLM calls saved by grading sandbox runs locally",
+              lambda: GRADER_STATS["pass"] + GRADER_STATS["fail"], kind="counter")
+
+class Check(NamedTuple):
+    kind: str     # "output", "no_output", "no_code" or "assert"
+    test: object  # compiled pattern, or the assertion's source
+    hint: str
+
+class Exercise(NamedTuple):
+    name: str
+    asked: tuple     # patterns, any of which matches the tutor's latest message (none: any message)
+    attempt: tuple   # patterns the code must all match to count as an attempt at this exercise
+    checks: tuple
+    praise: str
+    question: str    # a tutor message "asked" matches, a passing program, and programs each
+    example: str     # check should catch: check_grader.py runs them through the sandbox
+    mistakes: tuple
+
+def _check(raw, module):
+    kind = next(k for k in ("output", "no_output", "no_code", "assert") if k in raw)
+    if kind == "assert":
+        ast.parse(raw[kind], mode="eval")  # a SyntaxError here names the broken check at startup
+        test = raw[kind]
+    else:
+        test = re.compile(raw[kind], re.MULTILINE)
+    if not raw["hint"].rstrip().endswith("?"):
+        raise ValueError(f"{module}: the hint for {raw[kind]!r} should end with a question")
+    return Check(kind, test, raw["hint"])
+
+def load_checks(path=CHECKS_PATH):
+    """{module: (Exercise, ...)} with every pattern compiled and every assertion parsed, read from exercise_checks.json."""
+    with open(path) as f:
+        modules = json.load(f)["modules"]
+    checks = {}
+    for module, exercises in modules.items():
+        checks[module] = tuple(Exercise(
+            name=raw["name"], asked=tuple(re.compile(p, re.IGNORECASE) for p in raw.get("asked", [])),
+            attempt=tuple(re.compile(p, re.MULTILINE) for p in raw["attempt"]),
+            checks=tuple(_check(c, module) for c in raw["checks"]), praise=raw["praise"],
+            question=raw.get("question", ""), example=raw.get("example", ""), mistakes=tuple(raw.get("mistakes", []))) for raw in exercises)
+        for exercise in checks[module]:
+            if not exercise.praise.rstrip().endswith("?"):
+                raise ValueError(f"{module}: the praise for {exercise.name} should end with a question")
+    return checks
+
+_checks = None
+_checks_lock = threading.Lock()
+
+def get_checks():
+    """The exercise checks, loaded and compiled on first use and shared afterwards."""
+    global _checks
+    if _checks is None:
+        with _checks_lock:
+            if _checks is None:
+                _checks = load_checks()
+    return _checks
+
+def attempted(module, code, question):
+    """The module's exercises this code is an attempt at, given the tutor's latest message."""
+    return [e for e in get_checks().get(module, ())
+            if all(p.search(code) for p in e.attempt) and (not e.asked or any(p.search(question) for p in e.asked))]
+
+def assertion_cell(exercises):
+    """One sandbox cell printing every assertion's result (None if it raised), and the checks in print order."""
+    lines, checks = [], []
+    for exercise in exercises:
+        for check in exercise.checks:
+            if check.kind == "assert":
+                lines += ["try:", f"    print('\\n{ASSERT_MARKER} {len(checks)}', bool({check.test}))",
+                          "except Exception:", f"    print('\\n{ASSERT_MARKER} {len(checks)}', None)"]
+                checks.append(check)
+    return "\n".join(lines), checks
+
+def verdict(exercises, code, output, assertions):
+    """("pass", reply), ("fail", reply) or ("llm", None); `assertions` maps assert checks to True, False or None."""
+    results = []
+    for exercise in exercises:
+        result = ("pass", f"✅ {exercise.praise}")
+        for check in exercise.checks:
+            if check.kind == "assert":
+                passed = assertions.get(check)
+            elif check.kind == "no_code":
+                passed = not check.test.search(code)
+            else:
+                passed = bool(check.test.search(output)) == (check.kind == "output")
+            if passed is None:
+                result = ("llm", None)
+                break
+            if not passed:
+                result = ("fail", f"🧪 {check.hint}")
+                break
+        if result[0] == "pass":
+            return ("llm", None) if CUT_SHORT.search(output) else result
+        results.append(result)
+    if results and all(kind == "fail" for kind, _ in results):
+        return results[0]
+    return "llm", None
+
+async def agrade_run(session_key, module, code, output, history):
+    """
+    The local reply to a finished sandbox run, or None when the tutor should judge it.
+    `history` is the chat so far ({"role", "content"} dicts); the assertions run in the
+    session `session_key` the code itself ran in.
+    """
+    if not LOCAL_GRADER:
+        return None
+    start = time.perf_counter()
+    question = next((content_text(m["content"]) for m in reversed(history) if m["role"] == "assistant"), "")
+    exercises = [] if UNGRADABLE.search(output) else attempted(module, code, question)
+    assertions = {}
+    cell, checks = assertion_cell(exercises)
+    if cell:
+        results = {int(i): {"True": True, "False": False}.get(value)
+                   for i, value in ASSERT_RESULT.findall(await aexecute_cell(session_key, cell))}
+        assertions = {check: results.get(i) for i, check in enumerate(checks)}
+    kind, reply = verdict(exercises, code, output, assertions) if exercises else ("llm", None)
+    GRADER_STATS[kind] += 1
+    GRADER_SECONDS.observe(time.perf_counter() - start)
+    return reply
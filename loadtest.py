@@ -0,0 +1,207 @@
+"""
+Offline load test: simulated students work through every CURRICULUM path against the
+full FastAPI + Gradio app, served in-process by uvicorn and driven over HTTP exactly
+like the browser does (queue/join + queue/data).
+
+Gemini is replaced by ScriptedTutorLLM, which marks each module complete after a fixed
+number of student turns, and Google OAuth by a signed session cookie per student.
+Each student loads the page, then for each goal opens the course, runs a snippet in the
+sandbox and chats through all six modules, and goes back to the goal list.
+
+Reports per-handler latency (p50/p95/p99), throughput, DB contention and the
+completions that reached the database.
+Usage: python loadtest.py [students] [turns_per_module] [token_delay_seconds]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+from base64 import b64encode
+from collections import defaultdict
+
+STUDENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+TURNS_PER_MODULE = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+TOKEN_DELAY = float(sys.argv[3]) if len(sys.argv) > 3 else 0.002
+SESSION_SECRET = "loadtest-secret"
+
+os.environ["TUTOR_DB"] = os.path.join(tempfile.mkdtemp(prefix="loadtest_"), "tutor.sqlite")
+os.environ["SESSION_SECRET"] = SESSION_SECRET
+# Measure the app, not the quota guard (override these to load-test the guard itself)
+os.environ.setdefault("LLM_GLOBAL_RPM", "0")
+os.environ.setdefault("LLM_USER_RPM", "0")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+import itsdangerous  # noqa: E402
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage  # noqa: E402
+
+import app  # noqa: E402
+import logic  # noqa: E402
+import database  # noqa: E402
+from curriculum import CURRICULUM, MODULE_GOALS  # noqa: E402
+from sandbox import get_pool  # noqa: E402
+
+# One short program per module position, run in the sandbox before chatting
+SNIPPETS = [
+    "print('Welcome to Chinnaswamy')",
+    "runs = 187\nprint('Score:', runs)",
+    "ball = 6\nprint('SIX!' if ball == 6 else 'Run it')",
+    "for over in range(6):\n    print('Ball', over + 1)",
+    "def commentary(runs):\n    return f'{runs} runs'\nprint(commentary(4))",
+    "items = {'metro': 40, 'dosa': 60}\nprint(sum(items.values()))",
+]
+
+class ScriptedTutorLLM(logic.MockTutorLLM):
+    """
+    Deterministic tutor for any goal and module: asks a question per student turn and
+    adds [MODULE_COMPLETE] once the student has answered `turns_per_module` times.
+    """
+    turns_per_module: int = 2
+
+    def _reply(self, messages):
+        system_text = messages[0].content if messages and isinstance(messages[0], SystemMessage) else ""
+        module = next((m for m in MODULE_GOALS if f"Current Module: {m}" in system_text), "this module")
+        turns = 0
+        for m in reversed(messages):
+            if isinstance(m, AIMessage) and "Module Complete" in logic.content_text(m.content):
+                break
+            if isinstance(m, HumanMessage):
+                turns += 1
+        if turns > self.turns_per_module:
+            return f"Shabash! You have cracked {module}. On to the next challenge! [MODULE_COMPLETE]"
+        return f"Good try on {module}. What do you think happens if you change one value and run it again?"
+
+class Student:
+    """One browser session: a signed OAuth session cookie and a Gradio session hash."""
+
+    def __init__(self, base_url, index, fns, stats):
+        self.name = f"student{index}@loadtest.local"
+        cookie = itsdangerous.TimestampSigner(SESSION_SECRET).sign(b64encode(json.dumps({"user": self.name}).encode())).decode()
+        self.client = httpx.AsyncClient(base_url=base_url, cookies={"session": cookie}, timeout=120)
+        self.session_hash = f"loadtest{index}"
+        self.fns = fns
+        self.stats = stats
+        self.history = []
+
+    async def call(self, handler, data, fn_index=None):
+        """Trigger an event and wait for it to finish; returns the completed outputs or None on error."""
+        start = time.perf_counter()
+        first = None
+        output = None
+        try:
+            r = await self.client.post("/gradio_api/queue/join", json={
+                "data": data, "fn_index": self.fns[handler] if fn_index is None else fn_index,
+                "session_hash": self.session_hash, "event_data": None, "trigger_id": None})
+            r.raise_for_status()
+            event_id = r.json()["event_id"]
+            async with self.client.stream("GET", "/gradio_api/queue/data", params={"session_hash": self.session_hash}) as resp:
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    message = json.loads(line[5:])
+                    if message.get("event_id") != event_id:
+                        continue
+                    if message["msg"] == "process_generating" and first is None:
+                        first = time.perf_counter() - start
+                    if message["msg"] == "process_completed":
+                        if message.get("success"):
+                            output = message["output"]["data"]
+                        break
+        except httpx.HTTPError:
+            pass
+        elapsed = time.perf_counter() - start
+        self.stats[handler].append((elapsed, first if first is not None else elapsed, output is not None))
+        return output
+
+    async def chat(self, handler, data):
+        output = await self.call(handler, data)
+        if output and isinstance(output[0], list):
+            self.history = output[0]
+        return output
+
+    def last_reply(self):
+        content = self.history[-1]["content"] if self.history else ""
+        return logic.content_text(content) if isinstance(content, list) else content
+
+    async def run_course(self, goal, start_fns):
+        output = await self.call("start_course", [None], fn_index=start_fns[goal])
+        self.history = output[-1] if output else []
+        for position, module in enumerate(CURRICULUM[goal]):
+            await self.chat("run_code_and_chat", [SNIPPETS[position]])
+            for _ in range(TURNS_PER_MODULE * 2 + 2):
+                if "Module Complete" in self.last_reply():
+                    break
+                await self.chat("submit_message", [f"I think {module} needs a variable"])
+        await self.call("go_back", [])
+
+    async def run(self, start_fns):
+        await self.call("check_user", [])
+        for goal in CURRICULUM:
+            await self.run_course(goal, start_fns)
+        await self.client.aclose()
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def main():
+    logic.set_llm(ScriptedTutorLLM(turns_per_module=TURNS_PER_MODULE, token_delay=TOKEN_DELAY))
+    logic.OPENER_CACHE.clear()
+    get_pool()
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    fns = {}
+    start_fns = {}
+    for fn in app.demo.fns.values():
+        if fn.fn is None:
+            continue
+        fns[fn.fn.__name__] = fn._id
+        if fn.fn.__name__ == "start_course":
+            start_fns[fn.inputs[0].value] = fn._id  # one event per goal button, goal held in a gr.State
+
+    stats = defaultdict(list)
+    database.DB_STATS.clear()
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"--- {STUDENTS} students x {len(CURRICULUM)} goals, {TURNS_PER_MODULE} turns/module, token delay {TOKEN_DELAY}s ---")
+    start = time.perf_counter()
+    await asyncio.gather(*(Student(base_url, i, fns, stats).run(start_fns) for i in range(STUDENTS)))
+    wall = time.perf_counter() - start
+    server.should_exit = True
+
+    total = sum(len(v) for v in stats.values())
+    print(f"{'handler':<18} | {'calls':>6} | {'errors':>6} | {'calls/s':>7} | {'first ms':>8} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7}")
+    for handler, results in sorted(stats.items()):
+        latencies = [r[0] * 1000 for r in results]
+        firsts = [r[1] * 1000 for r in results]
+        errors = sum(1 for r in results if not r[2])
+        print(f"{handler:<18} | {len(results):6d} | {errors:6d} | {len(results) / wall:7.1f} | {percentile(firsts, 0.5):8.1f} | "
+              f"{percentile(latencies, 0.5):7.1f} | {percentile(latencies, 0.95):7.1f} | {percentile(latencies, 0.99):7.1f}")
+    print(f"total: {total} events in {wall:.1f}s = {total / wall:.1f} events/s")
+
+    db = database.DB_STATS
+    writes = db["write"] or 1
+    print(f"db: {db['read']} reads, {db['write']} writes, {db['read_waits']} reads waited for a connection, "
+          f"{db['write_wait_ms'] / writes:.2f} ms avg write queue wait, {db['locked']} locked errors, "
+          f"progress cache {db['hit']} hits / {db['miss']} misses")
+    with database.readers.connection() as conn:
+        saved = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+    expected = STUDENTS * sum(len(modules) for modules in CURRICULUM.values())
+    print(f"completions saved: {saved}/{expected}")
+    logic.set_llm(None)
+
+if __name__ == "__main__":
+    asyncio.run(main())
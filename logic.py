@@ -1,26 +1,179 @@
+from __future__ import annotations  # AgentState only exists once the graph is built
+
 import os
+import re
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque, Counter
+import httpx
 from typing import TypedDict, Annotated, List
-from langgraph.graph import StateGraph, START, END
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-import operator
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, AIMessage, RemoveMessage
 from dotenv import load_dotenv
+from response_cache import cache_from_env
+from quota import QueueFull, Coalescer, guard_from_env, breaker_from_env
+from router import classify_turn, content_text
+from fallback_tutor import scripted_reply
+import metrics
 
 load_dotenv()
 
-# State definition
-class AgentState(TypedDict):
-    messages: Annotated[list[BaseMessage], operator.add]
-    module_name: str
-    goal: str
+# Local mock mode: MOCK_LLM=1 swaps Gemini for the scripted MOCK_RESPONSES below.
+# MOCK_TOKEN_DELAY (seconds per token) simulates generation speed for benchmarks.
+MOCK_MODE = os.environ.get("MOCK_LLM", "").lower() in ("1", "true", "yes")
+MOCK_TOKEN_DELAY = float(os.environ.get("MOCK_TOKEN_DELAY", "0"))
+
+# Shared LLM client settings. LLM_BASE_URL can point at a local fake Gemini server.
+LLM_MODEL = os.environ.get("LLM_MODEL", "gemini-flash-latest")
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL")
+LLM_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", 100)),
+    max_keepalive_connections=int(os.environ.get("LLM_MAX_KEEPALIVE", 20)),
+    keepalive_expiry=float(os.environ.get("LLM_KEEPALIVE_SECONDS", 60)),
+)
+
+# MOCK DATA FOR TESTING WHEN BLOCKED
+MOCK_RESPONSES = {
+    "Cricket Game": [
+        "Namaskara! I am your coach. Let's build that Cricket Game! To start, how do we tell the computer to show a message like 'Welcome to Chinnaswamy' on the screen?",
+        "Exactly! We use `print()`. Now, if you want to print 'Chinnaswamy', do you put it inside quotes like 'this' or just write it normally?",
+        "Shabash! Quotes it is. You have mastered the print function! Now we can move to storing the score. [MODULE_COMPLETE]"
+    ]
+}
+
+POWER_CUT_MESSAGE = (
+    "Oh! Our digital stadium is having a power cut (Quota Exceeded). "
+    "Even the floodlights at Chinnaswamy need a break! Please try again later. ☕"
+)
+
+BUSY_MESSAGE = (
+    "🚦 The whole class is asking questions at once and the line for the coach is full! "
+    "Take a sip of filter coffee and send your message again in a minute."
+)
+
+def get_mock_response(goal, history_len):
+    """Pick a logical mock response based on history length."""
+    if goal in MOCK_RESPONSES:
+        mock_index = min(history_len // 2, len(MOCK_RESPONSES[goal]) - 1)
+        return MOCK_RESPONSES[goal][mock_index]
+    return POWER_CUT_MESSAGE
+
+# --- LAZY LOADING ---
+# LangGraph, the Gemini SDK and langchain's model classes take most of a second to import,
+# so they load with the first turn (or warm_up() after startup), not when the server imports
+# this module: the graph is compiled by get_agent() and the client built by get_llm().
+AgentState = None  # state schema, defined by build_agent() because its reducer comes from LangGraph
+_agent = None
+_agent_lock = threading.Lock()
+
+def __getattr__(name):
+    # socratic_agent and MockTutorLLM used to be defined at import; scripts still import them by name
+    if name == "socratic_agent":
+        return get_agent()
+    if name == "MockTutorLLM":
+        from mock_llm import MockTutorLLM
+        return MockTutorLLM
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- SHARED LLM CLIENT ---
+# Built once per model name and reused by every turn, so its pooled keep-alive
+# connections survive between messages instead of a new client + TLS handshake each time.
+_llm_clients = {}
+_llm_override = None
+_llm_lock = threading.Lock()
+
+# Per-call latency split into (setup, generation) seconds; setup is getting the client
+LLM_TIMINGS = deque(maxlen=1000)
+
+# --- METRICS ---
+LLM_SECONDS = metrics.histogram("tutor_llm_seconds", "Duration of one LLM call by outcome (ok, error, quota)", ("outcome",))
+LLM_TOKENS = metrics.counter("tutor_llm_tokens_total", "LLM tokens by kind (prompt, completion); estimated when the API doesn't report usage", ("kind",))
+TURN_SECONDS = metrics.histogram("tutor_turn_seconds", "Tutor graph run (memory + LLM) until the last token, by kind (chat, opener)", ("kind",))
+FIRST_TOKEN_SECONDS = metrics.histogram("tutor_first_token_seconds", "Time from the start of a chat turn to its first reply token")
+QUEUE_WAIT_SECONDS = metrics.histogram("tutor_queue_wait_seconds", "Time a chat turn waited for its turn under the quota guard")
+
+def record_llm_call(prompt, response, start, ready, token=None):
+    done = time.perf_counter()
+    LLM_TIMINGS.append((ready - start, done - ready))
+    BREAKER.record(done - start, ok=True, token=token)
+    LLM_SECONDS.observe(done - start, outcome="ok")
+    usage = getattr(response, "usage_metadata", None) or {}
+    LLM_TOKENS.inc(usage.get("input_tokens") or sum(estimate_tokens(content_text(m.content)) for m in prompt), kind="prompt")
+    LLM_TOKENS.inc(usage.get("output_tokens") or estimate_tokens(content_text(response.content)), kind="completion")
+
+def record_llm_error(error, start, token=None):
+    elapsed = time.perf_counter() - start
+    LLM_SECONDS.observe(elapsed, outcome="quota" if is_quota_error(error) else "error")
+    BREAKER.record(elapsed, ok=False, token=token)
+
+# --- QUOTA GUARD ---
+# Every LLM call waits its turn under global and per-student rate limits (see quota.py).
+# Quota errors pause the guard and retry instead of falling back to canned replies, so the
+# client's own retries are kept low: the guard does the waiting.
+QUOTA = guard_from_env()
+LLM_CLIENT_RETRIES = int(os.environ.get("LLM_CLIENT_RETRIES", 1))
+LLM_QUOTA_RETRIES = int(os.environ.get("LLM_QUOTA_RETRIES", 3))
+LLM_QUOTA_BACKOFF = float(os.environ.get("LLM_QUOTA_BACKOFF", 5))
+
+metrics.gauge("tutor_quota_events_total", "Quota guard events (admitted, queued, rejected, throttled, coalesced)",
+              lambda: dict(QUOTA.stats), label="kind", kind="counter")
+metrics.gauge("tutor_quota_queue_length", "Chat turns currently waiting under the quota guard", lambda: QUOTA.queue_length)
+
+# --- CIRCUIT BREAKER ---
+# When too many recent Gemini calls fail or crawl (quota.CircuitBreaker), turns skip the LLM and
+# the quota queue and get the scripted practice coach (fallback_tutor.py) at local latency.
+# After LLM_BREAKER_COOLDOWN seconds one real call probes whether Gemini is back.
+BREAKER = breaker_from_env()
+BREAKER_STATES = {"closed": 0, "half_open": 0.5, "open": 1}
+FALLBACK_REPLIES = metrics.counter("tutor_fallback_replies_total", "Replies from the scripted fallback tutor, by reason (breaker_open, llm_error)", ("reason",))
+metrics.gauge("tutor_llm_breaker_state", "LLM circuit breaker: 0 closed, 0.5 probing, 1 open (scripted tutor)",
+              lambda: BREAKER_STATES[BREAKER.state])
+metrics.gauge("tutor_llm_breaker_events_total", "Circuit breaker transitions (opened, probes, closed, reopened)",
+              lambda: dict(BREAKER.stats), label="kind", kind="counter")
+
+def is_quota_error(error):
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+def quota_retry_delay(error):
+    """Seconds to pause after a quota error: the API's own retry hint if it gave one."""
+    match = re.search(r"retry[_ ]?(?:delay|in)?\W{0,10}(\d+(?:\.\d+)?)\s*s", str(error), re.IGNORECASE)
+    return min(float(match.group(1)), 60.0) if match else LLM_QUOTA_BACKOFF
+
+def build_llm(model):
+    if MOCK_MODE:
+        from mock_llm import MockTutorLLM
+        return MockTutorLLM(token_delay=MOCK_TOKEN_DELAY)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    kwargs = {"base_url": LLM_BASE_URL} if LLM_BASE_URL else {}
+    return ChatGoogleGenerativeAI(model=model, client_args={"limits": LLM_POOL_LIMITS}, max_retries=LLM_CLIENT_RETRIES, **kwargs)
+
+def get_llm(model=None):
+    """Return the shared chat client for `model` (default LLM_MODEL)."""
+    if _llm_override is not None:
+        return _llm_override
+    model = model or LLM_MODEL
+    llm = _llm_clients.get(model)
+    if llm is None:
+        with _llm_lock:
+            llm = _llm_clients.get(model)
+            if llm is None:
+                llm = _llm_clients[model] = build_llm(model)
+    return llm
+
+def set_llm(llm=None):
+    """Swap in another backend (e.g. MockTutorLLM in tests). None drops cached clients so they are rebuilt."""
+    global _llm_override
+    _llm_override = llm
+    _llm_clients.clear()
 
 # The Socratic Teacher Logic
-def call_model(state: AgentState):
-    llm = ChatGoogleGenerativeAI(model="gemini-flash-latest")
-    
+
+def tutor_instructions(state: AgentState):
     current_goal = state.get('goal', 'General Python Learning')
     
-    system_prompt = SystemMessage(content=(
+    return (
         f"You are a Socratic Python Tutor for an NGO in Bangalore. "
         f"The student is working towards this goal: {current_goal}. "
         f"The current module is: {state['module_name']}. "
@@ -32,51 +185,443 @@ def call_model(state: AgentState):
         "5. IMPORTANT: When the student has clearly mastered the CURRENT concept/module, append the tag '[MODULE_COMPLETE]' to the end of your message.\n"
         "6. ENCOURAGE SELF-SUFFICIENCY: If a student is stuck on a technical error or syntax, do not just give the answer. Encourage them to search on Google. "
         "Teach them WHAT to search for (e.g., 'How to print a variable in Python'). Give them the specific 'Keywords' to use."
-    ))
+    )
+
+def build_prompt(state: AgentState):
+    instructions = tutor_instructions(state)
+    if state.get("summary"):
+        instructions += f"\n\nEARLIER IN THIS SESSION (summary of older turns):\n{state['summary']}"
+    return [SystemMessage(content=instructions)] + state["messages"]
+
+# --- CONVERSATION MEMORY ---
+# Keep the last MEMORY_WINDOW_TURNS turns verbatim, fold older ones into a short running
+# summary and keep every request under MEMORY_TOKEN_BUDGET. MEMORY_WINDOW_TURNS=0 sends everything.
+# Folded turns are condensed by the LLM, MEMORY_FOLD_TURNS at a time, into notes that keep the
+# facts of the whole session. Notes are cached under the student, goal and the last messages they
+# cover, so they outlive those messages leaving the restored transcript page, and each call only
+# condenses what was folded since. Turns not condensed yet (or when the LLM is unavailable) are
+# summarized one line per message.
+MEMORY_WINDOW_TURNS = int(os.environ.get("MEMORY_WINDOW_TURNS", 6))
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", 4000))
+MEMORY_FOLD_TURNS = int(os.environ.get("MEMORY_FOLD_TURNS", 4))
+SUMMARY_CACHE = cache_from_env("SUMMARY", maxsize=4096)
+SUMMARY_LINE_CHARS = 160
+SUMMARY_MESSAGE_CHARS = 1500  # of each folded message, when the LLM condenses it
+SUMMARY_INSTRUCTIONS = (
+    "You keep the notes for a Python tutoring session. Merge the notes so far and the new messages "
+    "into updated notes of at most {words} words: what the student is building, the names, values and "
+    "variables they chose, what they have understood and what they still get wrong. Keep every concrete "
+    "fact; drop greetings and the tutor's questions. Reply with the notes only."
+)
+MEMORY_STATS = Counter()
+metrics.gauge("tutor_memory_summaries_total", "Folded-turn summaries by source (cached, condensed by the LLM, lines, failed)",
+              lambda: dict(MEMORY_STATS), label="source", kind="counter")
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def summarize_message(message):
+    text = " ".join(content_text(message.content).split())
+    who = "Student" if isinstance(message, HumanMessage) else "Tutor"
+    return f"- {who}: {text[:SUMMARY_LINE_CHARS]}{'…' if len(text) > SUMMARY_LINE_CHARS else ''}"
+
+def _fold(state):
+    """(message updates, folded messages, summary budget): the window trimmed to the budget, and what fell out of it."""
+    messages = state["messages"]
+    summary_budget = MEMORY_TOKEN_BUDGET // 4
+    window_budget = MEMORY_TOKEN_BUDGET - summary_budget - estimate_tokens(tutor_instructions(state))
     
+    window = messages[-2 * MEMORY_WINDOW_TURNS:]
+    sizes = [estimate_tokens(content_text(m.content)) for m in window]
+    while len(window) > 1 and sum(sizes) > window_budget:
+        window, sizes = window[1:], sizes[1:]
+    folded = messages[:len(messages) - len(window)]
+    
+    updates = [RemoveMessage(id=m.id) for m in folded]
+    # A single huge message (e.g. a pasted traceback) is cut down to what the budget allows
+    if sizes[-1] > window_budget:
+        text = content_text(window[-1].content)
+        updates.append(window[-1].model_copy(update={"content": text[:max(window_budget, 0) * 4] + "\n…[truncated]"}))
+    return updates, folded, summary_budget
+
+def _summary_key(state, messages):
+    digest = hashlib.sha256("\n".join(f"{type(m).__name__}:{content_text(m.content)}" for m in messages).encode()).hexdigest()
+    return [state.get("student", ""), state.get("goal", ""), digest]
+
+def _cached_notes(state, folded):
+    """(notes, n): the newest cached notes covering folded[:n] (and whatever came before), or (state's summary, 0)."""
+    span = 2 * MEMORY_FOLD_TURNS
+    for end in range(len(folded), span - 1, -1):
+        notes = SUMMARY_CACHE.get(_summary_key(state, folded[end - span:end]))
+        if notes is not None:
+            return notes, end
+    return state.get("summary") or "", 0
+
+def summary_prompt(notes, messages, budget):
+    new = "\n".join(f"- {'Student' if isinstance(m, HumanMessage) else 'Tutor'}: {content_text(m.content)[:SUMMARY_MESSAGE_CHARS]}"
+                    for m in messages)
+    return [SystemMessage(content=SUMMARY_INSTRUCTIONS.format(words=budget * 3)),
+            HumanMessage(content=f"NOTES SO FAR:\n{notes or '(none yet)'}\n\nNEW MESSAGES:\n{new}")]
+
+def _plan_notes(state, folded):
+    """(notes, messages to condense now or None, the rest): cached notes plus what they don't cover yet."""
+    notes, covered = _cached_notes(state, folded)
+    pending = folded[covered:]
+    if covered:
+        MEMORY_STATS["cached"] += 1
+    if len(pending) >= 2 * MEMORY_FOLD_TURNS and BREAKER.state == "closed":
+        return notes, pending, []
+    return notes, None, pending
+
+def _memory_update(state, updates, folded, budget, notes, rest):
+    """The node's result: the running notes, then one line per folded message they don't cover yet."""
+    if rest:
+        MEMORY_STATS["lines"] += 1
+    lines = [summarize_message(m) for m in rest]
+    # The newest lines give way first: they are still mostly in the window's recent context
+    while lines and estimate_tokens("\n".join([notes] + lines)) > budget:
+        lines.pop()
+    summary = "\n".join(([notes] if notes else []) + lines)[:budget * 4]
+    return {"messages": updates, "summary": summary}
+
+def _store_notes(state, folded, text):
+    notes = " ".join(content_text(text).split()) if text else ""
+    if notes:
+        MEMORY_STATS["condensed"] += 1
+        SUMMARY_CACHE.put(_summary_key(state, folded[-2 * MEMORY_FOLD_TURNS:]), notes)
+    return notes
+
+def _condense_failed(error, start, messages):
+    """A failed summarizer call counts against the breaker like any other; its messages stay as lines."""
+    record_llm_error(error, start)
+    if is_quota_error(error):
+        QUOTA.backoff(quota_retry_delay(error))
+    MEMORY_STATS["failed"] += 1
+    print(f"⚠️ Folded turns not condensed: {error}")
+    return messages
+
+def manage_memory(state: AgentState):
+    """Shrink the conversation to a recent window plus running notes before the teacher sees it."""
+    if MEMORY_WINDOW_TURNS <= 0 or not state["messages"]:
+        return {}
+    updates, folded, budget = _fold(state)
+    if not folded:
+        return {"messages": updates}
+    notes, condense, rest = _plan_notes(state, folded)
+    if condense:
+        prompt, start = summary_prompt(notes, condense, budget), time.perf_counter()
+        try:
+            response = get_llm().invoke(prompt)
+            record_llm_call(prompt, response, start, start)
+            notes = _store_notes(state, folded, response.content) or notes
+        except Exception as e:
+            rest = _condense_failed(e, start, condense)
+    return _memory_update(state, updates, folded, budget, notes, rest)
+
+async def amanage_memory(state: AgentState):
+    """Async twin of manage_memory: the condensing call doesn't block the event loop."""
+    if MEMORY_WINDOW_TURNS <= 0 or not state["messages"]:
+        return {}
+    updates, folded, budget = _fold(state)
+    if not folded:
+        return {"messages": updates}
+    notes, condense, rest = _plan_notes(state, folded)
+    if condense:
+        prompt, start = summary_prompt(notes, condense, budget), time.perf_counter()
+        try:
+            response = await get_llm().ainvoke(prompt)
+            record_llm_call(prompt, response, start, start)
+            notes = _store_notes(state, folded, response.content) or notes
+        except Exception as e:
+            rest = _condense_failed(e, start, condense)
+    return _memory_update(state, updates, folded, budget, notes, rest)
+
+def fallback_text(state: AgentState):
+    """The scripted practice coach's reply; the canned mock replies for a module without a script."""
+    text = scripted_reply(state["messages"], state.get("goal"), state.get("module_name"))
+    return text if text is not None else get_mock_response(state.get('goal', 'Cricket Game'), len(state['messages']))
+
+def fallback_reply(state: AgentState, error=None):
+    if error is not None:
+        print(f"\n❌ [GEMINI API ERROR]: {error}\n")
+    FALLBACK_REPLIES.inc(reason="llm_error" if error is not None else "breaker_open")
+    return {"messages": [AIMessage(content=fallback_text(state), response_metadata={"fallback": True})]}
+
+def call_model(state: AgentState):
+    token = BREAKER.allow()
+    if not token:
+        return fallback_reply(state)
+    start = time.perf_counter()
     try:
-        response = llm.invoke([system_prompt] + state["messages"])
-        
-        # Ensure content is a string (handle potential list of content blocks)
-        if isinstance(response.content, list):
-            text_content = "".join([part["text"] for part in response.content if part["type"] == "text"])
-            response.content = text_content
-            
+        with metrics.span("tutor.llm", goal=state.get("goal", ""), module=state.get("module_name", "")):
+            llm = get_llm()
+            ready = time.perf_counter()
+            prompt = build_prompt(state)
+            response = llm.invoke(prompt)
+        record_llm_call(prompt, response, start, ready, token)
+        response.content = content_text(response.content)
         return {"messages": [response]}
     except Exception as e:
-        error_msg = str(e)
-        print(f"\n❌ [GEMINI API ERROR]: {error_msg}\n")
-        
-        # MOCK DATA FOR TESTING WHEN BLOCKED
-        MOCK_RESPONSES = {
-            "Cricket Game": [
-                "Namaskara! I am your coach. Let's build that Cricket Game! To start, how do we tell the computer to show a message like 'Welcome to Chinnaswamy' on the screen?",
-                "Exactly! We use `print()`. Now, if you want to print 'Chinnaswamy', do you put it inside quotes like 'this' or just write it normally?",
-                "Shabash! Quotes it is. You have mastered the print function! Now we can move to storing the score. [MODULE_COMPLETE]"
-            ]
-        }
-        
-        # Try to find a logical mock response based on history length
-        goal = state.get('goal', 'Cricket Game')
-        history_len = len(state['messages'])
-        
-        if goal in MOCK_RESPONSES:
-            mock_index = min(history_len // 2, len(MOCK_RESPONSES[goal]) - 1)
-            fallback_text = MOCK_RESPONSES[goal][mock_index]
-        else:
-            fallback_text = (
-                "Oh! Our digital stadium is having a power cut (Quota Exceeded). "
-                "Even the floodlights at Chinnaswamy need a break! Please try again later. ☕"
-            )
-            
-        from langchain_core.messages import AIMessage
-        return {"messages": [AIMessage(content=fallback_text)]}
-
-# Build the Graph
-workflow = StateGraph(AgentState)
-workflow.add_node("teacher", call_model)
-workflow.add_edge(START, "teacher")
-workflow.add_edge("teacher", END)
-
-# Compile the agent
-socratic_agent = workflow.compile()
\ No newline at end of file
+        record_llm_error(e, start, token)
+        if is_quota_error(e):
+            QUOTA.backoff(quota_retry_delay(e))
+        return fallback_reply(state, e)
+
+async def acall_model(state: AgentState):
+    """Async twin of call_model so the event loop never blocks on the Gemini HTTP call."""
+    token = BREAKER.allow()
+    if not token:
+        return fallback_reply(state)
+    for attempt in range(LLM_QUOTA_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            with metrics.span("tutor.llm", goal=state.get("goal", ""), module=state.get("module_name", ""), attempt=attempt):
+                llm = get_llm()
+                ready = time.perf_counter()
+                prompt = build_prompt(state)
+                response = await llm.ainvoke(prompt)
+            record_llm_call(prompt, response, start, ready, token)
+            response.content = content_text(response.content)
+            return {"messages": [response]}
+        except Exception as e:
+            record_llm_error(e, start, token)
+            # Once the breaker has opened, the scripted tutor beats waiting out the quota
+            if not is_quota_error(e) or attempt == LLM_QUOTA_RETRIES or BREAKER.state != "closed":
+                return fallback_reply(state, e)
+            # Over quota: pause everyone, then take this request's turn again
+            QUOTA.backoff(quota_retry_delay(e))
+            try:
+                async for _ in QUOTA.wait_turn():
+                    pass
+            except QueueFull:
+                return fallback_reply(state, e)
+
+# --- LOCAL ROUTER ---
+# Acknowledgements, NameError/SyntaxError hints and search-keyword requests are answered
+# from templates (router.py) before the LLM; everything else goes on to memory + teacher.
+LOCAL_ROUTER = os.environ.get("LOCAL_ROUTER", "1") != "0"
+# Assumed LLM turn time until LLM_TIMINGS has samples, for the latency-saved estimate
+ROUTER_LLM_ESTIMATE = float(os.environ.get("ROUTER_LLM_ESTIMATE", 2.0))
+ROUTER_STATS = Counter()
+ROUTER_SECONDS = metrics.histogram("tutor_router_seconds", "Time to classify a chat turn and, if local, answer it")
+ROUTER_SAVED_SECONDS = metrics.counter("tutor_router_saved_seconds_total", "Estimated LLM latency saved by answering turns locally")
+metrics.gauge("tutor_router_turns_total", "Chat turns by route (ack, name_error, syntax_error, search answered locally; llm)",
+              lambda: dict(ROUTER_STATS), label="route", kind="counter")
+metrics.gauge("tutor_router_local_ratio", "Share of chat turns answered without the LLM",
+              lambda: 1 - ROUTER_STATS["llm"] / max(sum(ROUTER_STATS.values()), 1))
+
+def typical_llm_seconds():
+    if not LLM_TIMINGS:
+        return ROUTER_LLM_ESTIMATE
+    return sum(setup + generation for setup, generation in LLM_TIMINGS) / len(LLM_TIMINGS)
+
+def route_turn(state: AgentState):
+    """Graph node: a template reply for trivial turns, otherwise route "llm"."""
+    if state.get("route") == "llm" or not LOCAL_ROUTER:
+        return {"route": "llm"}  # already classified (aguarded_reply) or switched off
+    start = time.perf_counter()
+    route, text = classify_turn(state["messages"], state.get("goal"), state.get("module_name"))
+    elapsed = time.perf_counter() - start
+    ROUTER_STATS[route] += 1
+    ROUTER_SECONDS.observe(elapsed)
+    if route == "llm":
+        return {"route": route}
+    ROUTER_SAVED_SECONDS.inc(max(typical_llm_seconds() - elapsed, 0))
+    return {"route": route, "messages": [AIMessage(content=text, response_metadata={"route": route})]}
+
+def build_agent():
+    """Compile the tutor graph: START -> router -> (memory -> teacher) -> END."""
+    global AgentState
+    from langgraph.graph import StateGraph, START, END
+    from langgraph.graph.message import add_messages
+    from langchain_core.runnables import RunnableLambda
+
+    AgentState = TypedDict("AgentState", {"messages": Annotated[list[BaseMessage], add_messages],
+                                          "module_name": str, "goal": str, "summary": str, "route": str, "student": str})
+    workflow = StateGraph(AgentState)
+    workflow.add_node("router", route_turn)
+    workflow.add_node("memory", RunnableLambda(manage_memory, afunc=amanage_memory))
+    workflow.add_node("teacher", RunnableLambda(call_model, afunc=acall_model))
+    workflow.add_edge(START, "router")
+    workflow.add_conditional_edges("router", lambda state: "memory" if state["route"] == "llm" else END, ["memory", END])
+    workflow.add_edge("memory", "teacher")
+    workflow.add_edge("teacher", END)
+    return workflow.compile()
+
+def get_agent():
+    """The compiled tutor graph, built on first use and shared by every turn."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = build_agent()
+    return _agent
+
+# Changes whenever the wording of the tutor instructions changes, so cached replies go stale with it
+PROMPT_VERSION = hashlib.sha256(tutor_instructions({"goal": "{goal}", "module_name": "{module}"}).encode()).hexdigest()[:12]
+
+# --- OPENING MESSAGE CACHE ---
+# The first tutor message of a (goal, module) doesn't depend on the student, so it is
+# generated once (or OPENER_CACHE_VARIANTS times) and then served without an API call.
+OPENER_CACHE = cache_from_env("OPENER")
+metrics.gauge("tutor_opener_cache_total", "Course opener cache lookups by result",
+              lambda: {"hit": OPENER_CACHE.hits, "miss": OPENER_CACHE.misses}, label="result", kind="counter")
+_opener_inflight = {}
+
+async def aopening_message(goal, module):
+    """The tutor's first message for a module; raises QueueFull when the line for the LLM is full."""
+    key = [goal, module, PROMPT_VERSION]
+    text = OPENER_CACHE.get(key)
+    if text is not None:
+        return text
+    # A whole class opening the same course at once shares one LLM call
+    if BREAKER.state == "open":
+        FALLBACK_REPLIES.inc(reason="breaker_open")
+        return fallback_text({"messages": [], "goal": goal, "module_name": module})  # not cached
+    flight_key = (goal, module)
+    if flight_key in _opener_inflight:
+        return await asyncio.shield(_opener_inflight[flight_key])
+    future = asyncio.get_running_loop().create_future()
+    _opener_inflight[flight_key] = future
+    try:
+        async for _ in QUOTA.wait_turn():
+            pass
+        with TURN_SECONDS.time(kind="opener"), metrics.span("tutor.turn", goal=goal, module=module, kind="opener"):
+            result = await get_agent().ainvoke({"messages": [HumanMessage(content=f"Starting {goal}, module {module}")], "module_name": module, "goal": goal, "route": "llm"})
+        reply = result["messages"][-1]
+        if not reply.response_metadata.get("fallback"):
+            OPENER_CACHE.put(key, reply.content)
+        future.set_result(reply.content)
+        return reply.content
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # retrieved: nobody may have joined, and asyncio would log it as lost
+        raise
+    finally:
+        if not future.done():
+            # This request was cancelled (e.g. the tab closed); whoever joined it still gets an opener
+            future.set_result(fallback_text({"messages": [], "goal": goal, "module_name": module}))
+        _opener_inflight.pop(flight_key, None)
+
+REPLY_NODES = ("router", "teacher")
+
+def stream_reply(inputs):
+    """Run the tutor graph and yield the reply text (router template or teacher) as it is generated."""
+    for chunk, metadata in get_agent().stream(inputs, stream_mode="messages"):
+        if metadata.get("langgraph_node") not in REPLY_NODES:
+            continue
+        text = content_text(chunk.content)
+        if text:
+            yield text
+
+async def astream_reply(inputs):
+    """Async version of stream_reply, driven by the graph's astream."""
+    turn = metrics.start_span("tutor.turn", goal=inputs.get("goal", ""), module=inputs.get("module_name", ""), kind="chat")
+    start = time.perf_counter()
+    first = True
+    try:
+        async for chunk, metadata in get_agent().astream(inputs, stream_mode="messages"):
+            if metadata.get("langgraph_node") not in REPLY_NODES:
+                continue
+            text = content_text(chunk.content)
+            if text:
+                if first:
+                    FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                    first = False
+                yield text
+    finally:
+        TURN_SECONDS.observe(time.perf_counter() - start, kind="chat")
+        if turn is not None:
+            turn.end()
+
+# Double submits of the same message share one reply (keyed by user + request contents),
+# also when the second arrives up to DUPLICATE_WINDOW seconds after a quick reply finished
+DUPLICATE_WINDOW = float(os.environ.get("DUPLICATE_WINDOW", 2))
+_reply_flights = Coalescer(QUOTA.stats, linger=DUPLICATE_WINDOW)
+
+def request_fingerprint(inputs):
+    text = "\n".join(content_text(m.content) for m in inputs["messages"])
+    return hashlib.sha256(f"{inputs.get('goal')}|{inputs.get('module_name')}|{text}".encode()).hexdigest()
+
+class TurnReservation:
+    """
+    Starts waiting for a student's quota turn `delay` seconds from now, ahead of the reply that
+    will need it, e.g. while their program is still running. Passed to aguarded_reply, which
+    uses it once it has started waiting and cancels it otherwise.
+    """
+
+    def __init__(self, user, delay=0):
+        self.started = False
+        self.task = asyncio.ensure_future(self._wait(user, delay))
+
+    async def _wait(self, user, delay):
+        await asyncio.sleep(delay)
+        self.started = True
+        try:
+            async for _ in QUOTA.wait_turn(user):
+                pass
+        except QueueFull:
+            return False
+        return True
+
+    def cancel(self):
+        self.task.cancel()
+
+async def aguarded_reply(inputs, user, reservation=None, local_reply=None):
+    """
+    astream_reply behind the quota guard. Yields ("queued", position) while the student
+    waits for a turn, then ("text", chunk) as the reply streams in. Turns the local
+    router can answer, and runs the grader already answered (`local_reply`), skip the
+    queue altogether. A request identical to one in flight (Enter and Send both fired)
+    first gets ("duplicate", None) and then replays that reply: only the first one saves it.
+    """
+    key = (user, request_fingerprint(inputs))
+    duplicate = _reply_flights.in_flight(key)
+
+    def skip_queue():
+        if reservation is not None:
+            reservation.cancel()
+
+    async def produce():
+        text = local_reply
+        if text is None:
+            routed = route_turn(inputs)
+            if routed["route"] != "llm":
+                text = routed["messages"][0].content
+        if text is not None:
+            skip_queue()
+            yield ("text", text)
+            return
+        if BREAKER.state == "open":
+            # Gemini is failing: no queue, no LLM, the scripted tutor answers straight away
+            skip_queue()
+            FALLBACK_REPLIES.inc(reason="breaker_open")
+            yield ("text", fallback_text(inputs))
+            return
+        start = time.perf_counter()
+        try:
+            if reservation is not None and reservation.started:
+                if not await reservation.task:
+                    raise QueueFull("reserved turn was rejected")
+            else:
+                if reservation is not None:
+                    reservation.cancel()  # still in its delay: wait for a turn the usual way
+                async for position in QUOTA.wait_turn(user):
+                    yield ("queued", position)
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start)
+        except QueueFull:
+            yield ("text", BUSY_MESSAGE)
+            return
+        async for text in astream_reply({**inputs, "route": "llm", "student": user}):
+            yield ("text", text)
+
+    try:
+        if duplicate:
+            skip_queue()
+            yield ("duplicate", None)
+        async for event in _reply_flights.stream(key, produce):
+            yield event
+    finally:
+        if reservation is not None:
+            reservation.cancel()  # unused if this request joined an identical one in flight
@@ -0,0 +1,193 @@
+import time
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+# --- METRICS ---
+# A small in-process registry rendered in the Prometheus text format at /metrics.
+# Counters and histograms take label values as keyword arguments; gauges read a callback
+# at scrape time so existing stats (DB_STATS, QUOTA.stats, ...) don't need double-counting.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REGISTRY = []
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _label_text(self.labels, key), value) for key, value in self._values.items()]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, row in self._values.items():
+                for bound, count in zip(self.buckets, row):
+                    out.append((f"{self.name}_bucket", _label_text(self.labels, key, [("le", bound)]), count))
+                out.append((f"{self.name}_bucket", _label_text(self.labels, key, [("le", "+Inf")]), row[-1]))
+                out.append((f"{self.name}_sum", _label_text(self.labels, key), row[-2]))
+                out.append((f"{self.name}_count", _label_text(self.labels, key), row[-1]))
+        return out
+
+class CallbackMetric:
+    """Reads its value at scrape time: `read()` returns a number, or {label value: number} for one label."""
+
+    def __init__(self, name, help, read, label=None, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        if self.label is None:
+            return [] if value is None else [(self.name, "", value)]
+        return [(self.name, _label_text((self.label,), (key,)), v) for key, v in sorted(value.items())]
+
+def counter(name, help, labels=()):
+    REGISTRY.append(Counter(name, help, labels))
+    return REGISTRY[-1]
+
+def histogram(name, help, labels=(), buckets=BUCKETS):
+    REGISTRY.append(Histogram(name, help, labels, buckets))
+    return REGISTRY[-1]
+
+def gauge(name, help, read, label=None, kind="gauge"):
+    REGISTRY.append(CallbackMetric(name, help, read, label, kind))
+    return REGISTRY[-1]
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value:g}" if isinstance(value, float) else f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+def timed(hist, label="fn", errors=None):
+    """Decorator: observe each call's duration in `hist`, labelled with the function's name.
+    Works for plain functions, coroutines and async generators (timed until exhausted)."""
+    def decorate(fn):
+        labels = {label: fn.__name__}
+
+        def failed():
+            if errors is not None:
+                errors.inc(**labels)
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with hist.time(**labels):
+                    try:
+                        async for item in fn(*args, **kwargs):
+                            yield item
+                    except Exception:
+                        failed()
+                        raise
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with hist.time(**labels):
+                    try:
+                        return await fn(*args, **kwargs)
+                    except Exception:
+                        failed()
+                        raise
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with hist.time(**labels):
+                    try:
+                        return fn(*args, **kwargs)
+                    except Exception:
+                        failed()
+                        raise
+        return wrapper
+    return decorate
+
+# --- TRACING (optional) ---
+# With opentelemetry-api installed (and an SDK/exporter configured by the deployment),
+# tutoring turns, LLM calls and sandbox runs are also recorded as spans. Imported lazily
+# so sandbox worker processes never pay for it.
+_tracer = None
+_tracer_loaded = False
+
+def get_tracer():
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("ai-python-tutor")
+        except ImportError:
+            _tracer = None
+        _tracer_loaded = True
+    return _tracer
+
+@contextmanager
+def span(name, **attributes):
+    """Current-context span for code that doesn't yield across it; a no-op without OpenTelemetry."""
+    tracer = get_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+def start_span(name, **attributes):
+    """Detached span for async generators (call .end() when done); None without OpenTelemetry."""
+    tracer = get_tracer()
+    return tracer.start_span(name, attributes=attributes) if tracer else None
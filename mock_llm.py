@@ -0,0 +1,59 @@
+import re
+import time
+import asyncio
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import SystemMessage, AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from logic import MOCK_RESPONSES, SUMMARY_INSTRUCTIONS, get_mock_response
+
+# Kept out of logic.py so the web server only imports langchain's model classes when it
+# actually builds an LLM client (see build_llm).
+class MockTutorLLM(BaseChatModel):
+    """Offline stand-in for Gemini that replays MOCK_RESPONSES word by word."""
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "mock-tutor"
+
+    def _reply(self, messages):
+        system_text = messages[0].content if messages and isinstance(messages[0], SystemMessage) else ""
+        if system_text.startswith(SUMMARY_INSTRUCTIONS[:40]):
+            return self._notes(messages[-1].content)
+        goal = next((g for g in MOCK_RESPONSES if g in system_text), None)
+        history_len = len([m for m in messages if not isinstance(m, SystemMessage)])
+        return get_mock_response(goal, history_len)
+
+    @staticmethod
+    def _notes(request):
+        """Condensed notes without a model: the notes so far plus what the student said."""
+        notes, _, new = request.partition("\n\nNEW MESSAGES:\n")
+        notes = notes.removeprefix("NOTES SO FAR:\n").replace("(none yet)", "")
+        said = [line.removeprefix("- Student: ")[:120] for line in new.splitlines() if line.startswith("- Student: ")]
+        return " ".join([notes] + [f"Student: {text}" for text in said]).strip()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(self.token_delay * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in re.split(r"(?<=\s)", self._reply(messages)):
+            time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        await asyncio.sleep(self.token_delay * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for token in re.split(r"(?<=\s)", self._reply(messages)):
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,149 @@
+"""
+Multi-worker check: starts two separate uvicorn processes of the app on one shared database
+(the way several workers or nodes sit behind a load balancer) and sends one student's
+events to alternating workers in the middle of a module.
+
+Passes if every reply builds on the full chat so far, whichever worker served it,
+sandbox variables set on one worker are there on the next, finishing a module on
+one worker moves the student on for all of them, and reopening the course restores the chat. Uses the offline mock tutor (MOCK_LLM=1).
+Set DATABASE_URL to run the same check against Postgres instead of a temporary SQLite file.
+Usage: python multiworker_check.py [workers]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import subprocess
+from base64 import b64encode
+
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+SESSION_SECRET = "multiworker-secret"
+STUDENT = "switcher@multiworker.local"
+GOAL = "Cricket Game"
+
+os.environ.setdefault("TUTOR_DB", os.path.join(tempfile.mkdtemp(prefix="multiworker_"), "tutor.sqlite"))
+os.environ["SESSION_SECRET"] = SESSION_SECRET
+os.environ["MOCK_LLM"] = "1"
+os.environ.setdefault("LLM_GLOBAL_RPM", "0")
+os.environ.setdefault("LLM_USER_RPM", "0")
+
+import httpx  # noqa: E402
+import itsdangerous  # noqa: E402
+
+import app  # noqa: E402  (same Blocks as the workers, for the event ids)
+import database  # noqa: E402
+from curriculum import CURRICULUM  # noqa: E402
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_worker(port):
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--log-level", "warning"], cwd=os.path.dirname(os.path.abspath(__file__)), env=os.environ.copy())
+
+async def wait_until_up(client, timeout=90):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/config")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"worker at {client.base_url} did not start")
+
+async def call(client, fn_index, data, session_hash):
+    """Trigger an event on one worker and return its completed outputs (None on error)."""
+    r = await client.post("/gradio_api/queue/join", json={"data": data, "fn_index": fn_index, "session_hash": session_hash,
+                                                          "event_data": None, "trigger_id": None})
+    r.raise_for_status()
+    event_id = r.json()["event_id"]
+    async with client.stream("GET", "/gradio_api/queue/data", params={"session_hash": session_hash}) as resp:
+        async for line in resp.aiter_lines():
+            if line.startswith("data:"):
+                message = json.loads(line[5:])
+                if message.get("event_id") == event_id and message["msg"] == "process_completed":
+                    return message["output"]["data"] if message.get("success") else None
+    return None
+
+def text(content):
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict)) if isinstance(content, list) else content
+
+failures = []
+
+def check(ok, label):
+    print(f"{'✅' if ok else '❌'} {label}")
+    if not ok:
+        failures.append(label)
+
+async def main():
+    fns = {}
+    start_fns = {}
+    for fn in app.demo.fns.values():
+        if fn.fn is not None:
+            fns[fn.fn.__name__] = fn._id
+            if fn.fn.__name__ == "start_course":
+                start_fns[fn.inputs[0].value] = fn._id
+
+    ports = [free_port() for _ in range(WORKERS)]
+    processes = [start_worker(port) for port in ports]
+    cookie = itsdangerous.TimestampSigner(SESSION_SECRET).sign(b64encode(json.dumps({"user": STUDENT}).encode())).decode()
+    # One browser tab (one session hash) whose requests the load balancer spreads over the workers
+    clients = [httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", cookies={"session": cookie}, timeout=60) for port in ports]
+    session_hash = "multiworker"
+    try:
+        await asyncio.gather(*(wait_until_up(c) for c in clients))
+        print(f"--- {WORKERS} workers on ports {', '.join(map(str, ports))}, one student switching between them ---")
+        await call(clients[0], fns["check_user"], [], session_hash)
+        output = await call(clients[0], start_fns[GOAL], [None], session_hash)
+        history = output[-1] if output else []
+        check(len(history) == 1, f"worker 0 opened {GOAL}")
+
+        # The mock tutor finishes a module on its third reply and every reply after that,
+        # so this crosses module boundaries while the student hops between workers
+        modules = CURRICULUM[GOAL]
+        completed = 0
+        events = [("run_code_and_chat", "runs = 4"), ("run_code_and_chat", "print(runs * 6)"),
+                  ("submit_message", "Quotes!"), ("submit_message", "What's next?")]
+        for turn, (handler, value) in enumerate(events):
+            worker = turn % WORKERS
+            output = await call(clients[worker], fns[handler], [value], session_hash)
+            new_history = output[0] if output else []
+            kept = len(new_history) == len(history) + 2 and new_history[:len(history)] == history
+            check(kept, f"{handler} on worker {worker} continued the chat ({len(history)} -> {len(new_history)} messages)")
+            if handler == "run_code_and_chat" and value.startswith("print"):
+                check(output is not None and output[-1].strip() == "24",
+                      f"variable set on worker {(turn - 1) % WORKERS} is there on worker {worker}: {output and output[-1]!r}")
+            history = new_history
+            if history and "Module Complete" in text(history[-1]["content"]):
+                completed += 1
+            conversation = database.load_conversation(STUDENT)
+            module = modules[min(completed, len(modules) - 1)]
+            check(conversation is not None and conversation["module"] == module, f"  stored module is {module}")
+            check(conversation is not None and len(conversation["history"]) == len(history), f"  stored chat has all {len(history)} messages")
+
+        # Reopening the course on another worker restores the chat instead of asking the tutor again
+        worker = len(events) % WORKERS
+        output = await call(clients[worker], start_fns[GOAL], [None], session_hash)
+        check(output is not None and output[-1] == history, f"worker {worker} restored all {len(history)} messages when the course was reopened")
+
+        progress = database.get_user_progress(STUDENT)
+        finished = modules[:completed]
+        check(completed > 0 and progress is not None and all(m in progress["completed"] for m in finished),
+              f"{completed} completed module(s) saved: {', '.join(finished)}")
+    finally:
+        for client in clients:
+            await client.aclose()
+        for process in processes:
+            process.terminate()
+            process.wait()
+    print("PASS" if not failures else f"FAIL: {len(failures)} check(s) failed")
+    return not failures
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
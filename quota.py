@@ -0,0 +1,264 @@
+import os
+import time
+import asyncio
+import threading
+from collections import Counter, OrderedDict, deque
+
+class QueueFull(Exception):
+    """Raised when too many requests are already waiting for the LLM."""
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, in bursts of up to `burst`. A rate of 0 means unlimited."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        if self.rate:
+            self.wait_time(now)
+            self.tokens -= 1
+
+class QuotaGuard:
+    """
+    Admits LLM calls in arrival order under a global token bucket (the API quota) and a
+    per-user one (double-clicks, scripts). Waiting callers see their place in the queue;
+    once `max_queue` are waiting, new calls get QueueFull instead of piling up.
+    """
+
+    def __init__(self, global_rpm=300, global_burst=20, user_rpm=10, user_burst=3, max_queue=200, max_users=10000):
+        self.global_bucket = TokenBucket(global_rpm / 60, global_burst)
+        self.user_rpm = user_rpm
+        self.user_burst = user_burst
+        self.max_queue = max_queue
+        self.max_users = max_users
+        self.paused_until = 0.0
+        self.stats = Counter()
+        self._users = OrderedDict()  # user -> TokenBucket, least recently used first
+        self._waiting = deque()
+
+    def _user_bucket(self, user):
+        bucket = self._users.get(user)
+        if bucket is None:
+            bucket = self._users[user] = TokenBucket(self.user_rpm / 60, self.user_burst)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user)
+        return bucket
+
+    def _user_wait(self, user, now):
+        return 0.0 if user is None else self._user_bucket(user).wait_time(now)
+
+    def _global_wait(self, now):
+        return max(self.paused_until - now, self.global_bucket.wait_time(now))
+
+    def _admit(self, user, now):
+        self.global_bucket.take(now)
+        if user is not None:
+            self._user_bucket(user).take(now)
+        self.stats["admitted"] += 1
+
+    def _next_eligible(self, now):
+        # A rate-limited student doesn't hold up the students queued behind them
+        for ticket in self._waiting:
+            if self._user_wait(ticket[0], now) <= 0:
+                return ticket
+        return None
+
+    @property
+    def queue_length(self):
+        return len(self._waiting)
+
+    async def wait_turn(self, user=None):
+        """Async generator: yields the caller's 1-based queue position while it waits and ends once admitted."""
+        now = time.monotonic()
+        if not self._waiting and self._global_wait(now) <= 0 and self._user_wait(user, now) <= 0:
+            self._admit(user, now)
+            return
+        if len(self._waiting) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{len(self._waiting)} requests already waiting")
+        ticket = (user, object())
+        self._waiting.append(ticket)
+        self.stats["queued"] += 1
+        last_position = None
+        try:
+            while True:
+                now = time.monotonic()
+                if self._next_eligible(now) is ticket and self._global_wait(now) <= 0:
+                    self._waiting.remove(ticket)
+                    self._admit(user, now)
+                    return
+                position = self._waiting.index(ticket) + 1
+                if position != last_position:
+                    last_position = position
+                    yield position
+                # Wake at least once a second so the position shown stays current
+                delay = max(self._global_wait(now), self._user_wait(user, now))
+                await asyncio.sleep(min(max(delay, 0.01), 1.0))
+        finally:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+
+    def backoff(self, seconds):
+        """The API said we're over quota: admit nothing for `seconds`."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.stats["throttled"] += 1
+
+class Coalescer:
+    """
+    Lets identical requests that overlap share one in-flight async stream, e.g. Enter and the
+    Send button both firing for the same message. Every caller sees every item from the start.
+    A finished stream is kept for `linger` seconds, so a duplicate arriving just after a quick
+    reply still shares it. in_flight() tells a caller it would join an existing stream.
+    """
+
+    def __init__(self, stats=None, linger=0):
+        self.stats = stats if stats is not None else Counter()
+        self.linger = linger
+        self._flights = {}
+
+    def in_flight(self, key):
+        return key in self._flights
+
+    async def stream(self, key, factory):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = {"items": [], "done": False, "error": None, "changed": asyncio.Event()}
+            # The stream runs in its own task, so it outlives whichever caller started it
+            flight["task"] = asyncio.create_task(self._pump(key, flight, factory))
+        else:
+            self.stats["coalesced"] += 1
+        seen = 0
+        while True:
+            changed = flight["changed"]
+            while seen < len(flight["items"]):
+                yield flight["items"][seen]
+                seen += 1
+            if flight["done"]:
+                if flight["error"] is not None:
+                    raise flight["error"]
+                return
+            await changed.wait()
+
+    async def _pump(self, key, flight, factory):
+        try:
+            async for item in factory():
+                flight["items"].append(item)
+                self._notify(flight)
+        except Exception as e:
+            flight["error"] = e
+        finally:
+            flight["done"] = True
+            self._notify(flight)
+            if self.linger:
+                asyncio.get_running_loop().call_later(self.linger, self._forget, key, flight)
+            else:
+                self._forget(key, flight)
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @staticmethod
+    def _notify(flight):
+        changed, flight["changed"] = flight["changed"], asyncio.Event()
+        changed.set()
+
+class CircuitBreaker:
+    """
+    Watches the last `window` LLM calls. Once at least `min_calls` have been seen and
+    `max_failure_ratio` of them failed (raised, or took longer than `slow_seconds`), it opens:
+    callers skip the LLM for `cooldown` seconds. Then a single probe call is allowed through;
+    if it succeeds the breaker closes, if it fails it stays open for another cooldown.
+    allow() hands out a token that the call passes back to record(), so only the probe's own
+    result decides; late results from calls made before the breaker opened are ignored.
+    """
+
+    def __init__(self, window=20, min_calls=5, max_failure_ratio=0.5, slow_seconds=20, cooldown=30):
+        self.min_calls = min_calls
+        self.max_failure_ratio = max_failure_ratio
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.probe_started = None
+        self._probe = None
+        self.stats = Counter()
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()  # sync call_model records from worker threads
+
+    @property
+    def state(self):
+        """"closed", "open" (LLM skipped) or "half_open" (cooldown over, waiting for a probe)."""
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown else "half_open"
+
+    def allow(self):
+        """
+        May this call use the LLM? A falsy result means no; otherwise pass the result to
+        record() as `token`. In half-open state only one caller at a time gets a token: the probe.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            now = time.monotonic()
+            # A probe that never reported back (e.g. its request was cancelled) is replaced
+            if state == "half_open" and (self.probe_started is None or now - self.probe_started > self.cooldown):
+                self.probe_started = now
+                self._probe = object()
+                self.stats["probes"] += 1
+                return self._probe
+            return False
+
+    def record(self, seconds, ok=True, token=None):
+        """Report one LLM call: how long it took, whether it succeeded and the token allow() gave it."""
+        failed = not ok or seconds > self.slow_seconds
+        with self._lock:
+            if self.opened_at is not None:
+                if token is None or token is not self._probe:
+                    return  # not the probe: e.g. a call that started before the breaker opened
+                self.probe_started = self._probe = None
+                if failed:
+                    self.opened_at = time.monotonic()
+                    self.stats["reopened"] += 1
+                else:
+                    self.opened_at = None
+                    self._outcomes.clear()
+                    self.stats["closed"] += 1
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls and sum(self._outcomes) >= self.max_failure_ratio * len(self._outcomes):
+                self.opened_at = time.monotonic()
+                self.stats["opened"] += 1
+
+def breaker_from_env():
+    """Build a CircuitBreaker from LLM_BREAKER_WINDOW, _MIN_CALLS, _FAILURE_RATIO, _SLOW_SECONDS and _COOLDOWN."""
+    return CircuitBreaker(
+        window=int(os.environ.get("LLM_BREAKER_WINDOW", 20)),
+        min_calls=int(os.environ.get("LLM_BREAKER_MIN_CALLS", 5)),
+        max_failure_ratio=float(os.environ.get("LLM_BREAKER_FAILURE_RATIO", 0.5)),
+        slow_seconds=float(os.environ.get("LLM_BREAKER_SLOW_SECONDS", 20)),
+        cooldown=float(os.environ.get("LLM_BREAKER_COOLDOWN", 30)),
+    )
+
+def guard_from_env():
+    """Build a QuotaGuard from LLM_GLOBAL_RPM / _BURST, LLM_USER_RPM / _BURST and LLM_QUEUE_MAX."""
+    return QuotaGuard(
+        global_rpm=float(os.environ.get("LLM_GLOBAL_RPM", 300)),
+        global_burst=int(os.environ.get("LLM_GLOBAL_BURST", 20)),
+        user_rpm=float(os.environ.get("LLM_USER_RPM", 10)),
+        user_burst=int(os.environ.get("LLM_USER_BURST", 3)),
+        max_queue=int(os.environ.get("LLM_QUEUE_MAX", 200)),
+    )
@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    TTL + LRU cache for tutor replies that don't depend on the student (e.g. course openers).
+    Each key holds a pool of up to `variants` replies; get() only hits once the pool is full,
+    so the first few requests for a key still go to the LLM and add variety.
+    With `path`, entries are also kept in a small SQLite file so they survive restarts.
+    """
+
+    def __init__(self, maxsize=128, ttl=24 * 3600, variants=1, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created, [texts])
+        self._lock = threading.Lock()
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute('''CREATE TABLE IF NOT EXISTS response_cache
+                                  (cache_key TEXT PRIMARY KEY, created REAL, texts TEXT)''')
+            self._disk.commit()
+
+    def _load(self, skey):
+        row = self._disk.execute("SELECT created, texts FROM response_cache WHERE cache_key=?", (skey,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _store(self, skey, entry):
+        self._disk.execute("INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?)", (skey, entry[0], json.dumps(entry[1])))
+        self._disk.commit()
+
+    def get(self, key):
+        skey = json.dumps(key)
+        with self._lock:
+            entry = self._entries.get(skey)
+            if entry is None and self._disk:
+                entry = self._load(skey)
+            if entry and time.time() - entry[0] > self.ttl:
+                self._entries.pop(skey, None)
+                if self._disk:
+                    self._disk.execute("DELETE FROM response_cache WHERE cache_key=?", (skey,))
+                    self._disk.commit()
+                entry = None
+            if entry is None or len(entry[1]) < self.variants:
+                self.misses += 1
+                return None
+            self._entries[skey] = entry
+            self._entries.move_to_end(skey)
+            self._evict()
+            self.hits += 1
+            return random.choice(entry[1])
+
+    def put(self, key, text):
+        skey = json.dumps(key)
+        with self._lock:
+            entry = self._entries.get(skey) or (self._disk and self._load(skey)) or (time.time(), [])
+            if len(entry[1]) < self.variants:
+                entry[1].append(text)
+            self._entries[skey] = entry
+            self._entries.move_to_end(skey)
+            self._evict()
+            if self._disk:
+                self._store(skey, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk:
+                self._disk.execute("DELETE FROM response_cache")
+                self._disk.commit()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+def cache_from_env(prefix, maxsize=128):
+    """Build a ResponseCache from PREFIX_CACHE_SIZE / _TTL / _VARIANTS / _PATH environment variables."""
+    return ResponseCache(
+        maxsize=int(os.environ.get(f"{prefix}_CACHE_SIZE", maxsize)),
+        ttl=float(os.environ.get(f"{prefix}_CACHE_TTL", 24 * 3600)),
+        variants=int(os.environ.get(f"{prefix}_CACHE_VARIANTS", 1)),
+        path=os.environ.get(f"{prefix}_CACHE_PATH"),
+    )
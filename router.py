@@ -0,0 +1,140 @@
+import re
+import ast
+import difflib
+
+# --- LOCAL ROUTER ---
+# Turns that don't need Gemini: acknowledgements ("ok", "next"), the everyday sandbox errors
+# (NameError, SyntaxError) and "what should I search for?" (rule 6 of the tutor prompt).
+# classify_turn() answers those from templates in well under a millisecond; anything it isn't
+# sure about goes to the LLM. Replies stay Socratic: every template ends in a question.
+ACK_WORDS = {"ok", "okay", "k", "kk", "yes", "yeah", "yep", "ya", "sure", "next", "got", "it", "thanks", "thank",
+             "you", "cool", "done", "alright", "fine", "understood", "go", "on", "continue", "nice", "great"}
+YES_WORDS = {"yes", "yeah", "yep", "ya", "sure"}
+# A "yes" to one of these is an answer, not an acknowledgement
+YES_NO_QUESTION = re.compile(r"^(do|does|did|is|are|was|were|can|could|should|would|will|have|has)\b", re.IGNORECASE)
+QUESTION_SENTENCE = re.compile(r"[^.!?\n]*\?")
+ACK_REPLIES = ("👍 Great! So tell me: {question}", "Super! Over to you: {question}", "Nice. Let's keep going: {question}")
+
+# "How do I search a list?" is a coding question, so plain "search" alone doesn't count
+SEARCH_REQUEST = re.compile(r"\b(google|keywords?|search (terms?|online)|what (should|do|can) i search|look (it|this|that) up)\b", re.IGNORECASE)
+SEARCH_MAX_WORDS = 20
+# Keywords per module topic, the part of the module name in brackets
+SEARCH_KEYWORDS = {
+    "I/O": ["python print function", "python input function example"],
+    "Variables": ["python variables for beginners", "python update variable value"],
+    "Conditionals": ["python if else statement", "python comparison operators"],
+    "Loops": ["python for loop range", "python loop over list"],
+    "Functions": ["python def function return", "python function parameters"],
+    "Git": ["git commit tutorial beginner", "git add commit push"],
+    "Strings": ["python f-string", "python string methods upper lower"],
+    "Lists": ["python list append", "python list index"],
+    "Dictionaries": ["python dictionary get value by key", "python dictionary example"],
+    "File I/O": ["python write to file with open", "python read file line by line"],
+    "Infra": ["github pages deploy static site", "python requirements.txt pip install"],
+    "Data Types": ["python int float str types", "python type conversion"],
+    "CSV": ["python csv module read write", "python csv reader example"],
+    "Flow": ["python while loop menu", "python if elif else"],
+    "Logic": ["python sum of list", "python and or not operators"],
+    "Final": ["how to write a good README", "github profile portfolio"],
+}
+
+RUN_CODE = re.compile(r"```python\n(.*?)\n```", re.DOTALL)
+NAME_ERROR = re.compile(r"NameError: name '(\w+)' is not defined")
+SYNTAX_ERROR = re.compile(r"^(SyntaxError|IndentationError|TabError): (.+)$", re.MULTILINE)
+OTHER_ERROR = re.compile(r"^\w+(Error|Exception): ", re.MULTILINE)
+ERROR_LINE = re.compile(r'File "<string>", line (\d+)')
+SYNTAX_HINTS = [
+    (("was never closed", "unexpected EOF"),
+     "🔍 Python found a bracket on line {line} that never gets its partner. Count the `(`, `[` and `{{` on that line: does each one have a matching closing bracket?"),
+    (("unterminated string", "EOL while scanning"),
+     "🔍 Some text on line {line} starts with a quote but never ends. Where does that string begin, and where should its closing quote go?"),
+    (("expected ':'",),
+     "🔍 Lines that start a block (`if`, `for`, `while`, `def`) end with a special symbol. What is missing at the end of line {line}?"),
+    (("indent",),
+     "🔍 Python is fussy about the spaces at the start of a line, and line {line} surprised it. Which lines belong inside your block, and are they all lined up the same way?"),
+    (("",),
+     "🔍 Python couldn't understand line {line}. Read it slowly, one symbol at a time: is there a quote, bracket or colon that looks out of place?"),
+]
+
+def content_text(content):
+    """A message's content as a string, joining the text parts of a list of content blocks."""
+    if isinstance(content, list):
+        return "".join([part if isinstance(part, str) else part.get("text", "")
+                        for part in content if isinstance(part, str) or part.get("type") == "text"])
+    return content or ""
+
+def _last_question(tutor_text):
+    questions = QUESTION_SENTENCE.findall(tutor_text.replace("[MODULE_COMPLETE]", ""))
+    return questions[-1].strip() if questions else None
+
+def _acknowledgement(words, previous):
+    """Re-ask the tutor's open question; None when only the LLM can move the lesson on."""
+    if not words or len(words) > 4 or not set(words) <= ACK_WORDS or previous is None:
+        return None
+    if "MODULE_COMPLETE" in previous or "Module Complete" in previous:
+        return None  # on to a new module: the teacher introduces it
+    question = _last_question(previous)
+    if question is None or (set(words) & YES_WORDS and YES_NO_QUESTION.match(question)):
+        return None
+    return ACK_REPLIES[len(previous) % len(ACK_REPLIES)].format(question=question)
+
+def _assigned_names(code):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    names = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)}
+    names |= {node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)}
+    return sorted(names)
+
+def _error_hint(text):
+    """Template reply for a NameError or SyntaxError in a sandbox run or pasted traceback."""
+    syntax = SYNTAX_ERROR.search(text)
+    name = NAME_ERROR.search(text)
+    if not (syntax or name) or len(OTHER_ERROR.findall(text)) > 1:
+        return None, None
+    lines = ERROR_LINE.findall(text)
+    line = lines[-1] if lines else "?"
+    if syntax:
+        kind, message = syntax.groups()
+        hint = next(template for needles, template in SYNTAX_HINTS if any(n in message for n in needles))
+        search = f"python {kind} {message.strip()}"
+        return "syntax_error", f"{hint.format(line=line)}\n\nStill stuck? Search Google for **\"{search}\"**, that's what real developers do!"
+    missing = name.group(1)
+    code = RUN_CODE.search(text)
+    similar = difflib.get_close_matches(missing, _assigned_names(code.group(1)) if code else [], n=1)
+    if similar:
+        hint = (f"🔍 Python doesn't know `{missing}` (line {line}), but you did create `{similar[0]}`. "
+                "Compare the two names letter by letter: are they spelled exactly the same?")
+    else:
+        hint = (f"🔍 Python doesn't know anything called `{missing}` yet (line {line}). It reads your code from top to bottom: "
+                f"where do you give `{missing}` a value before using it, or did you mean it as text, in quotes?")
+    return "name_error", f"{hint}\n\nStill stuck? Search Google for **\"python NameError name is not defined\"**."
+
+def _search_keywords(text, module):
+    if len(text.split()) > SEARCH_MAX_WORDS or not SEARCH_REQUEST.search(text):
+        return None
+    topic = module[module.find("(") + 1:module.rfind(")")] if module and "(" in module else ""
+    keywords = SEARCH_KEYWORDS.get(topic)
+    if not keywords:
+        return None
+    listed = "\n".join(f"- **\"{k}\"**" for k in keywords)
+    return (f"🔎 Great instinct! Finding answers is a developer superpower. Try these on Google:\n{listed}\n\n"
+            "Open one result and tell me: what is one new thing you learned from it?")
+
+def classify_turn(messages, goal=None, module=None):
+    """(route, reply): route is "ack", "name_error", "syntax_error", "search" with a template reply, or "llm" with None."""
+    if not messages or type(messages[-1]).__name__ != "HumanMessage":
+        return "llm", None
+    text = content_text(messages[-1].content).strip()
+    previous = next((content_text(m.content) for m in reversed(messages[:-1]) if type(m).__name__ == "AIMessage"), None)
+    reply = _acknowledgement(re.sub(r"[^a-z ]", "", text.lower()).split(), previous)
+    if reply:
+        return "ack", reply
+    route, reply = _error_hint(text)
+    if reply:
+        return route, reply
+    reply = _search_keywords(text, module)
+    if reply:
+        return "search", reply
+    return "llm", None
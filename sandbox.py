@@ -1,33 +1,652 @@
-import sys
 import io
-import contextlib
+import os
+import ast
+import json
+import base64
+import sys
+import time
+import queue
+import signal
+import socket
+import asyncio
+import types
+import marshal
+import builtins
+import functools
+import importlib
+import resource
+import tempfile
+import threading
 import traceback
+import subprocess
+from multiprocessing.connection import Connection
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+if __name__ == "__main__":
+    # Workers run this file isolated (python -I), which leaves its own directory off sys.path
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import metrics
+from metrics import timed
 
-def execute_code_safely(code):
+# --- METRICS ---
+SANDBOX_SECONDS = metrics.histogram("tutor_sandbox_seconds", "Duration of sandbox calls (validation + run), by function", ("fn",))
+SANDBOX_WAIT_SECONDS = metrics.histogram("tutor_sandbox_wait_seconds", "Time a run waited for an idle worker")
+SANDBOX_RESULTS = metrics.counter("tutor_sandbox_results_total", "Sandbox runs by outcome (ok, rejected, timeout, crash, cancelled, busy)", ("outcome",))
+
+# --- LIMITS ---
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", 4))
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", 5))           # wall-clock seconds per run
+SANDBOX_CPU_SECONDS = int(os.environ.get("SANDBOX_CPU_SECONDS", 2))      # CPU seconds per run
+SANDBOX_MEMORY_MB = int(os.environ.get("SANDBOX_MEMORY_MB", 256))        # extra address space per worker
+SANDBOX_MAX_OUTPUT = int(os.environ.get("SANDBOX_MAX_OUTPUT", 10_000))   # characters of stdout + stderr
+SANDBOX_STREAM_INTERVAL = float(os.environ.get("SANDBOX_STREAM_INTERVAL", 0.1))  # seconds between streamed output chunks
+SANDBOX_RUNS_PER_WORKER = int(os.environ.get("SANDBOX_RUNS_PER_WORKER", 200))
+SANDBOX_MAX_SESSIONS = int(os.environ.get("SANDBOX_MAX_SESSIONS", 50))     # live REPL sessions on this node
+SANDBOX_SESSION_IDLE = float(os.environ.get("SANDBOX_SESSION_IDLE", 900))  # seconds before an idle session is evicted
+SANDBOX_CANCEL_POLL = 0.05  # how quickly a cancelled run is stopped
+SANDBOX_BUSY_MESSAGE = "🚦 Every sandbox on this server is busy running someone's code. Please click Run again in a moment."
+SANDBOX_COMPILE_CACHE = int(os.environ.get("SANDBOX_COMPILE_CACHE", 1024))  # validated + compiled snippets kept
+# When the app runs as root, workers chroot into this empty directory and drop to this uid/gid
+SANDBOX_ROOT = os.environ.get("SANDBOX_ROOT", os.path.join(tempfile.gettempdir(), "tutor_sandbox_root"))
+SANDBOX_UID = int(os.environ.get("SANDBOX_UID", 65534))  # "nobody"
+
+# Modules students may import; they get a copy without underscore names or nested modules
+# (not `string`: string.Formatter looks attributes up from text, e.g. "0.__class__", out of the AST check's sight)
+ALLOWED_MODULES = {"math", "random", "datetime", "statistics", "collections", "itertools",
+                   "functools", "json", "re", "time", "decimal", "fractions", "calendar"}
+# Imported by allowed modules on first use (datetime.strptime, time.strptime). Workers load them before
+# confinement, and only this import hook can hand them out: the AST check keeps `import` statements to the list above.
+STDLIB_INTERNAL = {"_strptime"}
+BLOCKED_CALLS = {"exec", "eval", "compile", "open", "input", "globals", "locals", "vars", "getattr",
+                 "setattr", "delattr", "breakpoint", "help", "memoryview"}
+# Frame/code introspection reaches the worker's own globals; str.format and Formatter methods read attributes by name
+BLOCKED_ATTRIBUTES = {"gi_frame", "gi_code", "cr_frame", "cr_code", "ag_frame", "ag_code", "f_back",
+                      "f_globals", "f_locals", "f_builtins", "f_code", "tb_frame", "tb_next", "co_code",
+                      "format", "format_map", "vformat", "get_field", "parse"}
+
+# Builtins a beginner actually needs; nothing that touches files, imports or the interpreter
+SAFE_BUILTINS = {name: getattr(builtins, name) for name in [
+    "print", "range", "len", "int", "float", "str", "bool", "list", "dict", "set", "tuple",
+    "enumerate", "zip", "sorted", "reversed", "sum", "min", "max", "abs", "round", "isinstance",
+    "type", "map", "filter", "any", "all", "chr", "ord", "repr", "format", "divmod", "pow",
+    "Exception", "ValueError", "TypeError", "KeyError", "IndexError", "ZeroDivisionError",
+    "NameError", "StopIteration", "True", "False", "None", "object", "super", "__build_class__",
+] if hasattr(builtins, name)}
+
+# --- IPC ---
+# Workers run student code, so whatever they send back is untrusted: messages in both directions
+# are JSON (never pickle, whose loads can call any function in the web server), size-capped, and
+# checked for shape before use. Worker -> parent: ["ready", ""], ["chunk", text], ["result", text].
+MAX_REPLY_BYTES = 24 * SANDBOX_MAX_OUTPUT + 4096  # stdout + stderr at 12 bytes a JSON-escaped emoji, plus notices
+REPLY_KINDS = {"ready", "chunk", "result"}
+
+class BadReply(Exception):
+    """A worker sent something no honest worker sends."""
+
+def send_message(conn, kind, body):
+    conn.send_bytes(json.dumps([kind, body]).encode())
+
+def recv_reply(conn):
+    """The next (kind, text) from a worker; BadReply for anything else, OSError if it is too long."""
+    try:
+        reply = json.loads(conn.recv_bytes(MAX_REPLY_BYTES))
+    except (ValueError, RecursionError) as e:
+        raise BadReply(f"undecodable reply: {e}") from None
+    if not (isinstance(reply, list) and len(reply) == 2 and reply[0] in REPLY_KINDS and isinstance(reply[1], str)):
+        raise BadReply("unexpected reply shape")
+    return reply
+
+# --- VALIDATION ---
+def find_violation(tree):
+    """Return a student-friendly reason the code is not allowed, or None."""
+    for node in ast.walk(tree):
+        line = getattr(node, "lineno", "?")
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] not in ALLOWED_MODULES:
+                    return f"`import {alias.name}` is not allowed here (line {line}). You can import: {', '.join(sorted(ALLOWED_MODULES))}."
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or (node.module or "").split(".")[0] not in ALLOWED_MODULES:
+                return f"`from {node.module} import ...` is not allowed here (line {line}). You can import: {', '.join(sorted(ALLOWED_MODULES))}."
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in BLOCKED_CALLS:
+            if node.func.id == "input":
+                return f"`input()` can't read from the keyboard in this sandbox (line {line}). Set the value directly instead, e.g. `name = 'Virat'`."
+            if node.func.id == "open":
+                return f"This sandbox does not allow file/system operations (`open` on line {line})."
+            return f"`{node.func.id}()` is not allowed in this sandbox (line {line})."
+        elif isinstance(node, ast.Attribute) and (node.attr.startswith("__") or node.attr in BLOCKED_ATTRIBUTES):
+            hint = " Use an f-string instead." if node.attr in ("format", "format_map") else ""
+            return f"`.{node.attr}` is not allowed in this sandbox (line {line}).{hint}"
+        elif isinstance(node, ast.MatchClass):
+            # `case object(__traceback__=tb)` reads an attribute without any `.name` in the code
+            for attr in node.kwd_attrs:
+                if attr.startswith("__") or attr in BLOCKED_ATTRIBUTES:
+                    return f"`{attr}=` in a `case` pattern is not allowed in this sandbox (line {line})."
+        elif isinstance(node, ast.Name) and node.id.startswith("__"):
+            return f"Names starting with `__` are not allowed in this sandbox (line {line})."
+    return None
+
+@functools.lru_cache(maxsize=SANDBOX_COMPILE_CACHE)
+def prepare_code(code):
+    """
+    Parse, validate and compile a snippet before any worker sees it.
+    Returns (marshalled code object, None) or (None, message). Cached because a class
+    often submits the very same snippet, which then skips parsing and compiling entirely.
+    """
+    try:
+        tree = ast.parse(code, "<string>")
+    except SyntaxError as e:
+        return None, format_output("", "".join(traceback.format_exception_only(type(e), e)))
+    problem = find_violation(tree)
+    if problem:
+        return None, f"Security Alert: {problem}"
+    return marshal.dumps(compile(tree, "<string>", "exec")), None
+
+class CPUTimeExceeded(BaseException):
+    """Raised inside the worker on SIGXCPU; a BaseException so student `except Exception` can't swallow it."""
+
+class OutputLimitExceeded(BaseException):
+    pass
+
+class LimitedOutput(io.StringIO):
+    """stdout/stderr buffer that stops the program once it has printed too much."""
+
+    def write(self, text):
+        if self.tell() + len(text) > SANDBOX_MAX_OUTPUT:
+            super().write(text[:max(SANDBOX_MAX_OUTPUT - self.tell(), 0)])
+            raise OutputLimitExceeded()
+        return super().write(text)
+
+class StreamedOutput(LimitedOutput):
+    """LimitedOutput that also sends new text to the parent as ("chunk", text), driven by a SIGALRM timer."""
+
+    def __init__(self, conn):
+        super().__init__()
+        self.conn = conn
+        self.sent = 0
+        self.sending = False
+
+    def send_new(self, *_):
+        if self.sending:
+            return  # the timer fired during the final flush
+        self.sending = True
+        try:
+            value = self.getvalue()
+            if len(value) > self.sent:
+                send_message(self.conn, "chunk", value[self.sent:])
+                self.sent = len(value)
+        finally:
+            self.sending = False
+
+def format_output(output, error):
+    return output + "\n" + error if error else output
+
+def truncate_output(text, limit):
+    """Keep the start and the end (where errors are) of output longer than `limit` characters."""
+    if len(text) <= limit:
+        return text
+    head = limit // 2
+    tail = limit - head
+    return f"{text[:head]}\n✂️ ... {len(text) - limit} characters cut ...\n{text[-tail:]}"
+
+# --- WORKER PROCESS ---
+def _on_sigxcpu(signum, frame):
+    raise CPUTimeExceeded()
+
+@functools.lru_cache(maxsize=None)
+def _safe_module(name):
+    module = importlib.import_module(name)
+    safe = types.ModuleType(name)
+    for attr in dir(module):
+        value = getattr(module, attr)
+        if not attr.startswith("_") and not isinstance(value, types.ModuleType):
+            setattr(safe, attr, value)
+    return safe
+
+def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if not level and name in STDLIB_INTERNAL:
+        return sys.modules[name]
+    if level or name.split(".")[0] not in ALLOWED_MODULES:
+        raise ImportError(f"import of {name!r} is not allowed in this sandbox")
+    return _safe_module(name.split(".")[0])
+
+SAFE_BUILTINS["__import__"] = _safe_import
+
+def new_namespace():
+    return {"__builtins__": SAFE_BUILTINS, "__name__": "__main__"}
+
+def _is_open(fd):
+    try:
+        os.fstat(fd)
+        return True
+    except OSError:
+        return False
+
+def _confine():
     """
-    Executes Python code and captures stdout/stderr.
-    Includes basic security checks (blocking dangerous imports).
+    OS-level limits, so code that gets past the AST check still can't do much: no new
+    processes, files or sockets, and when started as root, a chroot into an empty directory
+    and an unprivileged uid, so .env, the database and the app's source are out of reach.
     """
-    # 1. Basic Security Check
-    forbidden = ["import os", "import sys", "import subprocess", "open(", "exec(", "eval("]
-    for term in forbidden:
-        if term in code:
-            return "Security Alert: This sandbox does not allow file/system operations."
+    try:
+        listed = [int(fd) for fd in os.listdir("/proc/self/fd")]
+    except OSError:
+        listed = []  # no /proc (macOS)
+    # The listing's own descriptor is closed by now; the gaps below the highest open one get
+    # /dev/null, so a limit of top + 1 leaves no number free for a new file, pipe or socket
+    top = max((fd for fd in listed if _is_open(fd)), default=None)
+    if top is not None:
+        while (fd := os.open(os.devnull, os.O_RDONLY)) < top:
+            pass
+        os.close(fd)
+    if os.geteuid() == 0:
+        os.makedirs(SANDBOX_ROOT, mode=0o555, exist_ok=True)
+        os.chroot(SANDBOX_ROOT)
+        os.chdir("/")
+        os.setgroups([])
+        os.setgid(SANDBOX_UID)
+        os.setuid(SANDBOX_UID)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    if top is not None:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (top + 1, top + 1))
 
-    # 2. Capture Output
-    stdout_capture = io.StringIO()
-    stderr_capture = io.StringIO()
+def _worker_main(conn):
+    """Long-lived worker: applies rlimits once, then runs one snippet per message."""
+    for name in ALLOWED_MODULES:
+        _safe_module(name)  # imported now: once confined, the worker can't read the standard library
+    for name in STDLIB_INTERNAL:
+        importlib.import_module(name)
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * resource.getpagesize()
+        limit = baseline + SANDBOX_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except OSError:
+        pass  # no /proc (macOS): CPU and wall-clock limits still apply
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    _confine()
+    signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    send_message(conn, "ready", "")
+    namespace = new_namespace()
+    while True:
+        try:
+            command, code = json.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return  # parent went away (closed or reset the socket)
+        code = base64.b64decode(code) if code else None
+        if command == "reset":
+            namespace = new_namespace()
+            send_message(conn, "result", "")
+        elif command == "cell":
+            # REPL sessions: variables from earlier cells are still there
+            send_message(conn, "result", _run(code, namespace))
+        elif command == "stream":
+            # A session cell whose stdout is sent to the parent while it runs
+            send_message(conn, "result", _run(code, namespace, conn))
+        else:
+            send_message(conn, "result", _run(code, new_namespace()))
 
+def _run(code, namespace, conn=None):
+    stdout_capture = StreamedOutput(conn) if conn else LimitedOutput()
+    stderr_capture = LimitedOutput()
+    if conn:
+        signal.signal(signal.SIGALRM, stdout_capture.send_new)
+        signal.setitimer(signal.ITIMER_REAL, SANDBOX_STREAM_INTERVAL, SANDBOX_STREAM_INTERVAL)
+    # RLIMIT_CPU counts the worker's whole life, so each run gets a fresh allowance on top of usage so far
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(used.ru_utime + used.ru_stime) + SANDBOX_CPU_SECONDS
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+    sys.stdout, sys.stderr = stdout_capture, stderr_capture
     try:
-        with contextlib.redirect_stdout(stdout_capture), contextlib.redirect_stderr(stderr_capture):
-            # We use a shared local dict to allow variables to persist between lines in the same block
-            # But for now, let's keep it stateless per run for simplicity
-            exec(code, {"__builtins__": {}}) # minimal builtins for safety
-    except Exception:
+        exec(marshal.loads(code), namespace)
+    except CPUTimeExceeded:
+        stderr_capture.write(f"\n⏱️ Time limit exceeded: your program used more than {SANDBOX_CPU_SECONDS}s of CPU. Is there a loop that never ends?")
+    except OutputLimitExceeded:
+        stdout_capture.truncate(SANDBOX_MAX_OUTPUT)
+        return format_output(stdout_capture.getvalue(), f"\n✂️ Output truncated at {SANDBOX_MAX_OUTPUT} characters.")
+    except MemoryError:
+        stderr_capture = io.StringIO(f"MemoryError: your program tried to use more than {SANDBOX_MEMORY_MB} MB.")
+    except BaseException as e:
         # Capture the traceback if it crashes
-        traceback.print_exc(file=stderr_capture)
+        try:
+            stderr_capture.write(_student_traceback(e))
+        except OutputLimitExceeded:
+            pass
+    finally:
+        if conn:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, resource.RLIM_INFINITY))
+    return format_output(stdout_capture.getvalue(), stderr_capture.getvalue())
 
-    output = stdout_capture.getvalue()
-    error = stderr_capture.getvalue()
+def _student_traceback(e):
+    """The traceback Python would print for `e`, without this file's frames (_run, _safe_import, ...)."""
+    report = traceback.TracebackException(type(e), e, e.__traceback__)
+    pending, seen = [report], set()
+    while pending:
+        part = pending.pop()
+        if id(part) in seen:
+            continue
+        seen.add(id(part))
+        part.stack = traceback.StackSummary.from_list([f for f in part.stack if f.filename != __file__])
+        pending += [p for p in (part.__cause__, part.__context__) if p is not None]
+    return "".join(report.format())
 
-    return output + "\n" + error if error else output
+# --- POOL ---
+# Workers only see the sandbox limits, never API keys or other secrets
+SANDBOX_ENV = {k: v for k, v in os.environ.items() if k.startswith("SANDBOX_")}
+
+class Worker:
+    """A fresh interpreter running this file in --worker mode, with none of the web server's modules or memory."""
+
+    def __init__(self):
+        parent_sock, child_sock = socket.socketpair()
+        fd = child_sock.fileno()
+        self.process = subprocess.Popen([sys.executable, "-I", os.path.abspath(__file__), "--worker", str(fd)],
+                                        pass_fds=[fd], env=SANDBOX_ENV, stdin=subprocess.DEVNULL)
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.runs = 0
+        self.ready = False
+
+    def wait_ready(self):
+        if not self.ready:
+            if recv_reply(self.conn)[0] != "ready":
+                raise BadReply("expected ready")
+            self.ready = True
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def call(self, command, code=None, timeout=SANDBOX_TIMEOUT, on_output=None, cancel=None):
+        """
+        Send one command and wait for the reply; kills the worker on timeout, crash or once the
+        `cancel` event is set. Output chunks of a "stream" command are passed to `on_output`.
+        """
+        try:
+            self.wait_ready()
+            send_message(self.conn, command, base64.b64encode(code).decode() if code else None)
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if cancel is not None and cancel.is_set():
+                    SANDBOX_RESULTS.inc(outcome="cancelled")
+                    message = "⏹️ Stopped: you cancelled the run."
+                    break
+                if remaining <= 0:
+                    SANDBOX_RESULTS.inc(outcome="timeout")
+                    message = f"⏱️ Time limit exceeded: your program ran for more than {timeout:g} seconds and was stopped."
+                    break
+                if not self.conn.poll(remaining if cancel is None else min(remaining, SANDBOX_CANCEL_POLL)):
+                    continue
+                kind, text = recv_reply(self.conn)
+                if kind == "chunk":  # while a streamed cell runs
+                    if on_output is not None:
+                        on_output(text)
+                    continue
+                if kind != "result":
+                    raise BadReply(f"unexpected {kind!r}")
+                self.runs += 1
+                if command != "reset":
+                    SANDBOX_RESULTS.inc(outcome="ok")
+                return text
+        except (EOFError, OSError, BadReply):
+            # The worker died (e.g. killed by the kernel for a hard limit), or sent something it shouldn't
+            SANDBOX_RESULTS.inc(outcome="crash")
+            message = "💥 Your program crashed the sandbox and was stopped."
+        self.kill()
+        return message
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        self.conn.close()
+
+class SandboxPool:
+    """Pre-started, warm worker processes; each run borrows one and gets killed on timeout."""
+
+    def __init__(self, size=SANDBOX_WORKERS):
+        self.size = size
+        self._idle = queue.Queue()
+        workers = [Worker() for _ in range(size)]
+        for worker in workers:
+            worker.wait_ready()
+            self._idle.put(worker)
+
+    def run(self, code, timeout=SANDBOX_TIMEOUT):
+        with SANDBOX_WAIT_SECONDS.time():
+            worker = self._idle.get()
+        result = worker.call("exec", code, timeout)
+        if not worker.alive or worker.runs >= SANDBOX_RUNS_PER_WORKER:
+            worker.kill()
+            worker = Worker()
+        self._idle.put(worker)
+        return result
+
+    def checkout(self):
+        """Hand a warm worker over to a REPL session and start a replacement in its place."""
+        worker = self._idle.get()
+        self._idle.put(Worker())
+        return worker
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().kill()
+
+class Session:
+    def __init__(self, worker):
+        self.worker = worker
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.fresh = True  # nothing has run in this worker yet
+        self.closed = False  # evicted or reset: its worker is gone
+
+class SessionManager:
+    """
+    One long-lived interpreter per (user, goal) so variables survive between "Run Code" clicks.
+    Sessions idle for SANDBOX_SESSION_IDLE seconds are evicted, and at most SANDBOX_MAX_SESSIONS
+    stay alive on this node (the least recently used idle one goes first; a session running a
+    cell is never evicted, and when all of them are, the new one is told the sandbox is busy).
+    A student whose session lives on another node (or was evicted) gets their earlier cells
+    replayed into a new one, when the caller can supply them.
+    """
+
+    def __init__(self, pool, max_sessions=SANDBOX_MAX_SESSIONS, idle_timeout=SANDBOX_SESSION_IDLE):
+        self.pool = pool
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()  # key -> Session, least recently used first
+        self._evicted = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sweep_forever, daemon=True).start()
+
+    def run(self, key, code, timeout=SANDBOX_TIMEOUT, replay=None, on_output=None, cancel=None):
+        """
+        Run one cell; `replay` is an optional callable returning the session's earlier cell sources.
+        With `on_output` the cell's stdout is streamed to it, and setting `cancel` stops the run.
+        Returns (output, completed): completed is False when the worker had to be stopped.
+        """
+        notice = ""
+        with self._lock:
+            self._sweep()
+            session = self._sessions.get(key)
+            if session is None:
+                while len(self._sessions) >= self.max_sessions:
+                    if not any(self._evict(k) for k in list(self._sessions)):
+                        SANDBOX_RESULTS.inc(outcome="busy")
+                        return SANDBOX_BUSY_MESSAGE, False
+                session = self._sessions[key] = Session(self.pool.checkout())
+                if key in self._evicted:
+                    self._evicted.discard(key)
+                    notice = "♻️ Your sandbox was idle for a while, so earlier variables were cleared.\n"
+            self._sessions.move_to_end(key)
+        with session.lock:
+            if session.closed:
+                # Evicted or reset between the lookup above and here: start again in a new session
+                return self.run(key, code, timeout, replay, on_output, cancel)
+            if session.fresh:
+                session.fresh = False
+                if replay is not None:
+                    restored = self._replay(session, replay(), timeout)
+                    notice = "" if restored else "♻️ Your earlier cells couldn't be replayed, so earlier variables were cleared.\n"
+            command = "cell" if on_output is None else "stream"
+            result = session.worker.call(command, code, timeout, on_output, cancel)
+            completed = session.worker.alive
+            if not completed:
+                session.worker = self.pool.checkout()
+                if replay is not None:
+                    # The earlier cells go back into the new worker before the next one runs
+                    session.fresh = True
+                    result += "\n♻️ The sandbox was restarted; your earlier cells will be run again before the next one."
+                else:
+                    result += "\n♻️ The sandbox was restarted, so earlier variables were cleared."
+            session.last_used = time.monotonic()
+        return notice + result, completed
+
+    def _replay(self, session, cells, timeout):
+        """Re-run earlier cells quietly to rebuild the student's variables; False if the worker died."""
+        for source in cells:
+            payload, error = prepare_code(source)
+            if error:
+                continue
+            session.worker.call("cell", payload, timeout)
+            if not session.worker.alive:
+                session.worker = self.pool.checkout()
+                return False
+        return True
+
+    def reset(self, key):
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            self._evicted.discard(key)
+        if session:
+            with session.lock:
+                session.closed = True
+                session.worker.kill()
+
+    def _evict(self, key):
+        """Evict the session unless a cell is running in it; True if it was evicted."""
+        session = self._sessions[key]
+        if not session.lock.acquire(blocking=False):
+            return False
+        try:
+            del self._sessions[key]
+            session.closed = True
+            session.worker.kill()
+        finally:
+            session.lock.release()
+        self._evicted.add(key)
+        return True
+
+    def _sweep(self):
+        now = time.monotonic()
+        for key, session in list(self._sessions.items()):
+            if now - session.last_used < self.idle_timeout:
+                break
+            self._evict(key)  # skipped while it runs a cell
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(min(self.idle_timeout, 60))
+            with self._lock:
+                self._sweep()
+
+_pool = None
+_sessions = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SandboxPool()
+    return _pool
+
+def get_sessions():
+    global _sessions
+    if _sessions is None:
+        pool = get_pool()
+        with _pool_lock:
+            if _sessions is None:
+                _sessions = SessionManager(pool)
+    return _sessions
+
+@timed(SANDBOX_SECONDS)
+def execute_code_safely(code):
+    """
+    Executes Python code in a warm worker process and captures stdout/stderr.
+    The code is validated (AST check of imports, calls and attributes) before it runs.
+    """
+    # 1. Security check + compile (cached by source)
+    payload, error = prepare_code(code)
+    if error:
+        SANDBOX_RESULTS.inc(outcome="rejected")
+        return error
+
+    # 2. Run it out of process, under CPU / memory / output / wall-clock limits
+    return get_pool().run(payload)
+
+@timed(SANDBOX_SECONDS)
+def execute_cell(session_key, code, replay=None):
+    """
+    Run only the new cell in the student's persistent REPL session. `replay()` returns the
+    earlier cells' sources; it is only called when this node has no session for the key yet.
+    """
+    payload, error = prepare_code(code)
+    if error:
+        SANDBOX_RESULTS.inc(outcome="rejected")
+        return error
+    return get_sessions().run(session_key, payload, replay=replay)[0]
+
+@timed(SANDBOX_SECONDS)
+def reset_session(session_key):
+    get_sessions().reset(session_key)
+
+# Threads here only wait on worker pipes
+_sandbox_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("SANDBOX_THREADS", 32)), thread_name_prefix="sandbox")
+
+@timed(SANDBOX_SECONDS)
+async def aexecute_code_safely(code):
+    """Run execute_code_safely off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_sandbox_executor, execute_code_safely, code)
+
+@timed(SANDBOX_SECONDS)
+async def aexecute_cell(session_key, code, replay=None):
+    return await asyncio.get_running_loop().run_in_executor(_sandbox_executor, execute_cell, session_key, code, replay)
+
+@timed(SANDBOX_SECONDS)
+async def astream_cell(session_key, code, replay=None):
+    """
+    Run a cell like execute_cell, yielding (output so far, None) while it runs and then
+    (result, completed). completed is False for rejected code and for runs that were stopped
+    (time limit, crash, or this generator being closed or cancelled, e.g. by a Stop button).
+    """
+    payload, error = prepare_code(code)
+    if error:
+        SANDBOX_RESULTS.inc(outcome="rejected")
+        yield error, False
+        return
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    cancel = threading.Event()
+    future = loop.run_in_executor(_sandbox_executor, functools.partial(
+        get_sessions().run, session_key, payload, replay=replay, cancel=cancel,
+        on_output=lambda text: loop.call_soon_threadsafe(chunks.put_nowait, text)))
+    future.add_done_callback(lambda _: chunks.put_nowait(None))
+    output = ""
+    try:
+        while (text := await chunks.get()) is not None:
+            output += text
+            yield output, None
+        yield await future
+    finally:
+        cancel.set()  # no-op once the run has finished
+
+@timed(SANDBOX_SECONDS)
+async def areset_session(session_key):
+    return await asyncio.get_running_loop().run_in_executor(_sandbox_executor, reset_session, session_key)
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--worker"]:
+    _worker_main(Connection(int(sys.argv[2])))
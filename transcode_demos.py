@@ -0,0 +1,56 @@
+"""
+Offline transcode of the welcome-screen demo videos (static/demos/*.mp4) for slow classroom links.
+
+For every original it writes, next to it:
+  <name>.small.mp4  H.264 at [height]p, 24 fps, no audio, CRF [crf], moov atom up front
+                    (faststart) so playback starts before the download ends
+  <name>.jpg        poster frame, the only thing the welcome screen downloads until a
+                    demo is on screen or clicked
+The app serves the small rendition whenever it exists (see assets.demo_sources).
+Needs ffmpeg on PATH. Run it again after replacing an original.
+Usage: python transcode_demos.py [height] [crf]
+"""
+import os
+import sys
+import glob
+import shutil
+import subprocess
+
+from assets import STATIC_DIR, DEMO_DIR, DEMO_RENDITION, DEMO_POSTER
+
+HEIGHT = int(sys.argv[1]) if len(sys.argv) > 1 else 360
+CRF = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+POSTER_AT = "00:00:01"
+
+def ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+def transcode(source):
+    base = source[:-len(".mp4")]
+    rendition, poster = base + DEMO_RENDITION, base + DEMO_POSTER
+    ffmpeg("-i", source, "-vf", f"scale=-2:{HEIGHT},fps=24", "-c:v", "libx264", "-preset", "slow", "-crf", str(CRF),
+           "-profile:v", "main", "-pix_fmt", "yuv420p", "-an", "-movflags", "+faststart", rendition)
+    ffmpeg("-ss", POSTER_AT, "-i", source, "-frames:v", "1", "-vf", f"scale=-2:{HEIGHT}", "-q:v", "5", poster)
+    return rendition, poster
+
+def kb(path):
+    return os.path.getsize(path) / 1024
+
+def main():
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg not found: install it (apt install ffmpeg / brew install ffmpeg) and run again")
+    sources = sorted(p for p in glob.glob(os.path.join(STATIC_DIR, DEMO_DIR, "*.mp4")) if not p.endswith(DEMO_RENDITION))
+    if not sources:
+        sys.exit(f"No demo videos in {os.path.join(STATIC_DIR, DEMO_DIR)}")
+    print(f"--- {len(sources)} demos -> {HEIGHT}p, CRF {CRF} ---")
+    print(f"{'demo':<24} | {'original KB':>11} | {'small KB':>8} | {'poster KB':>9}")
+    before = after = 0
+    for source in sources:
+        rendition, poster = transcode(source)
+        before += kb(source)
+        after += kb(poster)
+        print(f"{os.path.basename(source):<24} | {kb(source):11.0f} | {kb(rendition):8.0f} | {kb(poster):9.1f}")
+    print(f"welcome screen on load: {before:.0f} KB of video before, {after:.0f} KB of posters now")
+
+if __name__ == "__main__":
+    main()
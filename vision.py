@@ -1,32 +1,34 @@
 import gradio as gr
-from database import get_user_progress
+from database import get_user_progress, aget_user_progress
+from curriculum import SKILLS, SKILL_INDEX
+
+NO_SKILL = (0,) * len(SKILLS)
+
+def starter_xp():
+    return {"Logic": 5, "Frontend": 5, "Database": 5}
 
 def calculate_xp(username):
     if not username or username == "guest":
-        return {"Logic": 5, "Frontend": 5, "Database": 5}
-    
-    progress = get_user_progress(username)
+        return starter_xp()
+    return xp_from_progress(get_user_progress(username))
+
+async def acalculate_xp(username):
+    if not username or username == "guest":
+        return starter_xp()
+    return xp_from_progress(await aget_user_progress(username))
+
+def xp_from_progress(progress):
     if not progress or "completed" not in progress:
-        return {"Logic": 5, "Frontend": 5, "Database": 5}
-    
-    completed = progress["completed"]
-    logic = 0
-    frontend = 0
-    db = 0
-    for mod_name in completed.keys():
-        m = mod_name.lower()
-        if any(x in m for x in ["logic", "loop", "condition", "umpire", "auditor"]):
-            logic += 1
-        if any(x in m for x in ["menu", "html", "string", "ui", "stadium"]):
-            frontend += 1
-        if any(x in m for x in ["variable", "list", "dictionary", "csv", "wallet", "ledger"]):
-            db += 1
-            
-    return {
-        "Logic": min(logic * 20, 100), 
-        "Frontend": min(frontend * 20, 100), 
-        "Database": min(db * 20, 100)
-    }
+        return starter_xp()
+    return xp_from_modules(progress["completed"])
+
+def xp_from_modules(modules):
+    """Sum each completed module's declared skill weights (see curriculum.py), capped at 100."""
+    totals = [0] * len(SKILLS)
+    for name in modules:
+        for i, weight in enumerate(SKILL_INDEX.get(name, NO_SKILL)):
+            totals[i] += weight
+    return {skill: min(total, 100) for skill, total in zip(SKILLS, totals)}
 
 def get_xp_html(label, pct, color):
     return f"""